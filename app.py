@@ -1,35 +1,64 @@
 """RAG Simple - Interface Gradio Multi-Contexto para indexação e consulta de documentos."""
 
+import asyncio
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Iterator, List, Optional
 
 import gradio as gr
+import toml
+import uvicorn
 from dotenv import load_dotenv
 
 from src.document_loader import DocumentLoader
 from src.chunker import Chunker
 from src.embeddings import EmbeddingsManager
-from src.vector_store import VectorStore
+from src.vector_store import VectorStore, IngestionSession
+from src.faiss_index import IndexSettings
 from src.rag_chain import RAGChain
 from src.context_manager import ContextManager
+from src.context_pool import ContextPool, PooledContext
+from src.concurrency import ContextLocks
+from src.federated_search import FederatedSearch
+from src.metadata_filter import MetadataFilter
+from src.api import create_api
+from src.ingestion import IngestionPipeline
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
 
-# Estado global
+# Estado compartilhado entre as sessões (índices carregados, pipeline...)
 class AppState:
     def __init__(self):
-        self.vector_store: Optional[VectorStore] = None
-        self.rag_chain: Optional[RAGChain] = None
-        self.document_loader = DocumentLoader()
+        self.document_loader = DocumentLoader.from_config("config.toml")
         self.chunker = Chunker.from_config("config.toml")
         self.embeddings = EmbeddingsManager.from_config("config.toml")
-        self.indexed_files: List[str] = []
-        self.current_context: str = "default"
         self.context_manager = ContextManager()
-        self.current_embeddings_provider: str = "ollama"  # ollama ou openai
+        self.context_pool = ContextPool.from_config("config.toml")
+        # Indexar um contexto bloqueia apenas as consultas desse contexto
+        self.context_locks = ContextLocks()
+        self.current_embeddings_provider: str = "ollama"  # ollama, local ou openai
+        self.ingestion_config: dict = toml.load("config.toml").get("ingestion", {})
+        self.pipeline = IngestionPipeline.from_config(
+            "config.toml",
+            document_loader=self.document_loader,
+            chunker=self.chunker,
+        )
+        self.server_config: dict = toml.load("config.toml").get("server", {})
+        # Busca em vários contextos sobre os índices do pool
+        self.federated = FederatedSearch.from_config(
+            lambda context_name: _indexed_store(context_name),
+            "config.toml",
+            context_locks=self.context_locks,
+        )
+
+
+# Estado de cada sessão do navegador (gr.State)
+class SessionState:
+    def __init__(self, current_context: str = "default"):
+        self.current_context = current_context
 
 
 state = AppState()
@@ -49,7 +78,7 @@ def get_available_contexts() -> List[str]:
     return contexts
 
 
-def create_new_context(context_name: str, description: str = "") -> tuple:
+def create_new_context(context_name: str, description: str, session: SessionState) -> tuple:
     """Cria um novo contexto e o carrega automaticamente."""
     if not context_name or not context_name.strip():
         return "❌ Nome do contexto não pode estar vazio.", gr.update(), gr.update(), gr.update()
@@ -64,12 +93,9 @@ def create_new_context(context_name: str, description: str = "") -> tuple:
         contexts = get_available_contexts()
 
         # Carrega o contexto automaticamente
-        state.current_context = context_name
-        state.vector_store = None
-        state.rag_chain = None
-        state.indexed_files = []
+        session.current_context = context_name
 
-        label = get_current_context_label()
+        label = get_current_context_label(session)
 
         return (
             f"✅ Contexto '{context_name}' criado e carregado!\n\nAgora você pode indexar documentos.",
@@ -81,36 +107,16 @@ def create_new_context(context_name: str, description: str = "") -> tuple:
         return f"❌ Contexto '{context_name}' já existe.", gr.update(), gr.update(), gr.update()
 
 
-def switch_context(context_name: str) -> str:
-    """Muda para um contexto diferente."""
+def switch_context(context_name: str, session: SessionState) -> str:
+    """Muda a sessão para um contexto diferente."""
     if not context_name:
         return "❌ Selecione um contexto."
 
     try:
-        state.current_context = context_name
-
-        # Reseta estado
-        state.vector_store = None
-        state.rag_chain = None
-        state.indexed_files = []
-
-        # Verifica se contexto tem índice
-        if state.context_manager.has_index(context_name):
-            # Carrega índice do contexto
-            state.vector_store = VectorStore(
-                embeddings=state.embeddings.embeddings,
-                context_name=context_name,
-            )
-            state.vector_store.load()
+        session.current_context = context_name
 
-            state.rag_chain = RAGChain.from_config(
-                vector_store=state.vector_store,
-                config_path="config.toml",
-                llm_provider="openai",
-                context_name=context_name,
-            )
-
-            state.indexed_files = state.vector_store.indexed_files or []
+        # Reaproveita o contexto se já estiver em memória
+        _get_context_entry(context_name)
 
         # Monta informações
         metadata = state.context_manager.get_context_metadata(context_name)
@@ -148,7 +154,7 @@ def switch_context(context_name: str) -> str:
         return f"❌ Erro ao carregar contexto: {str(e)}"
 
 
-def delete_context(context_name: str) -> tuple:
+def delete_context(context_name: str, session: SessionState) -> tuple:
     """Deleta um contexto."""
     if not context_name:
         return "❌ Selecione um contexto.", gr.update(), gr.update(), gr.update()
@@ -156,16 +162,19 @@ def delete_context(context_name: str) -> tuple:
     if context_name == "default":
         return "❌ Não é possível deletar o contexto padrão.", gr.update(), gr.update(), gr.update()
 
-    if state.context_manager.delete_context(context_name):
+    # Espera consultas e indexações em andamento no contexto
+    with state.context_locks.get(context_name).write():
+        deleted = state.context_manager.delete_context(context_name)
+        if deleted:
+            state.context_pool.invalidate(context_name)
+
+    if deleted:
         # Reseta se era o contexto atual
-        if state.current_context == context_name:
-            state.current_context = "default"
-            state.vector_store = None
-            state.rag_chain = None
-            state.indexed_files = []
+        if session.current_context == context_name:
+            session.current_context = "default"
 
         contexts = get_available_contexts()
-        label = get_current_context_label()
+        label = get_current_context_label(session)
         return (
             f"🗑️ Contexto '{context_name}' deletado. Contexto atual: default",
             gr.update(choices=contexts, value="default"),
@@ -181,12 +190,12 @@ def clear_context_index(context_name: str) -> str:
     if not context_name:
         return "❌ Selecione um contexto."
 
-    if state.context_manager.clear_context_index(context_name):
-        if state.current_context == context_name:
-            state.vector_store = None
-            state.rag_chain = None
-            state.indexed_files = []
+    with state.context_locks.get(context_name).write():
+        cleared = state.context_manager.clear_context_index(context_name)
+        if cleared:
+            state.context_pool.invalidate(context_name)
 
+    if cleared:
         return f"🗑️ Índice do contexto '{context_name}' limpo!\n\nVocê pode adicionar novos documentos."
     else:
         return f"❌ Erro ao limpar índice do contexto."
@@ -196,74 +205,235 @@ def clear_context_index(context_name: str) -> str:
 # FUNÇÕES DE INDEXAÇÃO
 # ============================================================================
 
-def _process_single_file_in_context(docs: list, file_name: str, context_name: str) -> None:
-    """Processa e indexa um único arquivo no contexto especificado."""
-    # Verifica se há conteúdo nos documentos
-    total_content = sum(len(doc.page_content.strip()) for doc in docs)
-    if total_content < 10:
-        raise ValueError("Sem texto (OCR também falhou)")
+def _new_vector_store(context_name: str) -> VectorStore:
+    """Cria o VectorStore do contexto com o tipo de índice configurado para ele."""
+    return VectorStore.from_config(
+        "config.toml",
+        embeddings_manager=state.embeddings,
+        context_name=context_name,
+        index_settings=IndexSettings.from_config(
+            "config.toml",
+            state.context_manager.get_context_metadata(context_name),
+        ),
+    )
 
-    # Aplica chunking
-    chunks = state.chunker.split(docs)
 
-    if not chunks:
-        raise ValueError("Conteúdo insuficiente (ignorado)")
+def _load_context(context_name: str) -> tuple:
+    """Carrega o índice e o RAG Chain de um contexto do disco (usado pelo ContextPool)."""
+    vector_store = _new_vector_store(context_name)
+    rag_chain = None
 
-    # Inicializa vector store para o contexto
-    if state.vector_store is None or state.vector_store.context_name != context_name:
-        state.vector_store = VectorStore(
-            embeddings=state.embeddings.embeddings,
-            context_name=context_name,
-        )
-    
+    if state.context_manager.has_index(context_name):
+        vector_store.load()
+        rag_chain = _new_rag_chain(vector_store, context_name)
+
+    return vector_store, rag_chain
+
+
+def _embeddings_provider(embeddings_choice: str) -> str:
+    """Provider de embeddings da opção escolhida na interface."""
+    if "ONNX" in embeddings_choice:
+        return "local"
+    return "ollama" if "Ollama" in embeddings_choice else "openai"
+
+
+def _reset_embeddings_provider(provider: str) -> None:
+    """Troca o provider de embeddings, descartando os contextos carregados com o anterior."""
+    state.embeddings = EmbeddingsManager.from_config("config.toml", override_provider=provider)
+    state.current_embeddings_provider = provider
+    # Reseta vector store para usar novo provider
+    state.context_pool.clear()
+
+
+def _get_context_entry(context_name: str) -> PooledContext:
+    """Retorna o contexto do pool, carregando o índice existente se houver."""
     # Verifica se mudou o provider de embeddings
     current_provider = state.embeddings.provider
     if state.current_embeddings_provider != current_provider:
-        # Recria vector store com novo provider
-        state.vector_store = VectorStore(
-            embeddings=state.embeddings.embeddings,
-            context_name=context_name,
-        )
+        state.context_pool.clear()
         state.current_embeddings_provider = current_provider
 
-    # Verifica se índice existe
-    if not state.vector_store.is_initialized and state.context_manager.has_index(context_name):
-        state.vector_store.load()
+    return state.context_pool.get_or_load(context_name, _load_context)
+
+
+def _indexed_store(context_name: str) -> Optional[VectorStore]:
+    """VectorStore do contexto (do pool) ou None se ele não tem documentos indexados."""
+    if not state.context_manager.has_index(context_name):
+        return None
+    return _get_context_entry(context_name).vector_store
+
+
+def _federated_answer(
+    contexts: List[str],
+    question: str,
+    llm_provider: str,
+    metadata_filter: Optional[MetadataFilter] = None,
+) -> dict:
+    """
+    Responde uma pergunta com os documentos de vários contextos (API).
+
+    Args:
+        contexts: Contextos consultados (vazio = os já carregados no pool
+            com documentos indexados, sem carregar outros do disco)
+        question: Pergunta
+        llm_provider: Provedor do LLM
+        metadata_filter: Filtro de metadados aplicado em cada contexto
+
+    Raises:
+        LookupError: Se nenhum contexto tem documentos indexados
+    """
+    # Carregar todos os contextos passaria pelo LRU do pool, despejando os em uso
+    contexts = [
+        name for name in (contexts or state.context_pool.resident)
+        if state.context_manager.has_index(name)
+    ]
+    if not contexts:
+        raise LookupError("Nenhum contexto carregado com documentos indexados (informe os contextos).")
 
-    # Cria ou adiciona ao índice
-    if state.vector_store.is_initialized:
-        state.vector_store.add_documents(chunks)
-        existing_files = state.vector_store.indexed_files or []
-        all_files = list(set(existing_files + [file_name]))
-    else:
-        state.vector_store.create_index(chunks)
-        all_files = [file_name]
+    # Chain sem contexto fixo: o embedding da pergunta usa o modelo do primeiro contexto
+    rag_chain = _new_rag_chain(_indexed_store(contexts[0]), None, llm_provider)
+    return rag_chain.query_contexts(question, state.federated, contexts, metadata_filter=metadata_filter)
 
-    # Salva índice
-    state.vector_store.save(file_names=all_files)
 
-    # Atualiza metadados do contexto
-    total_stats = state.vector_store.get_stats()
-    state.context_manager.update_context_metadata(
-        context_name,
-        all_files,
-        total_stats.get("total_documents", 0),
+def _new_rag_chain(vector_store: VectorStore, context_name: str, llm_provider: str = "openai") -> RAGChain:
+    """Cria o RAG Chain de um contexto."""
+    return RAGChain.from_config(
+        vector_store=vector_store,
+        config_path="config.toml",
+        llm_provider=llm_provider,
+        context_name=context_name,
     )
 
-    # Inicializa RAG Chain se necessário
-    if state.rag_chain is None or state.rag_chain.context_name != context_name:
-        state.rag_chain = RAGChain.from_config(
-            vector_store=state.vector_store,
-            config_path="config.toml",
-            llm_provider="openai",
-            context_name=context_name,
+
+@contextmanager
+def _begin_context_ingestion(context_name: str) -> Iterator[IngestionSession]:
+    """
+    Abre uma sessão de ingestão em lote no contexto especificado.
+
+    A sessão tem escrita exclusiva no contexto: consultas nele esperam o fim
+    da indexação, as dos demais contextos não.
+    """
+    with state.context_locks.get(context_name).write():
+        vector_store = _get_context_entry(context_name).vector_store
+        with _open_ingestion(context_name, vector_store) as ingestion:
+            yield ingestion
+        _finish_context_ingestion(context_name, vector_store)
+
+
+def _open_ingestion(context_name: str, vector_store: VectorStore) -> IngestionSession:
+    """Cria a sessão de ingestão do VectorStore com a configuração [ingestion]."""
+
+    def on_persist(store: VectorStore) -> None:
+        # Atualiza metadados do contexto uma vez por gravação do índice
+        total_stats = store.get_stats()
+        state.context_manager.update_context_metadata(
+            context_name,
+            store.indexed_files,
+            total_stats.get("total_documents", 0),
         )
 
-    state.indexed_files = all_files
+    ingestion_config = state.ingestion_config
+    return vector_store.begin_ingestion(
+        batch_size=ingestion_config.get("batch_size", 256),
+        persist_every_files=ingestion_config.get("persist_every_files", 0),
+        persist_interval_seconds=ingestion_config.get("persist_interval_seconds", 0),
+        on_persist=on_persist,
+    )
+
+
+def _progress_callback(progress: gr.Progress):
+    """Adapta o callback do pipeline de ingestão para a barra de progresso do Gradio."""
+    def callback(done: int, total: int, message: str) -> None:
+        progress((done, total), desc=message, unit="arquivos")
+    return callback
+
+
+def _finish_context_ingestion(context_name: str, vector_store: VectorStore) -> None:
+    """Atualiza o contexto no pool após a ingestão (RAG Chain e tamanho do índice)."""
+    if not vector_store.is_initialized:
+        return
+
+    state.context_pool.put(context_name, vector_store, _new_rag_chain(vector_store, context_name))
 
 
-def index_documents(files, embeddings_choice: str = None) -> str:
-    """Indexa documentos no contexto atual."""
+def _index_files(
+    context_name: str,
+    file_paths: List[Path],
+    progress_callback=None,
+) -> dict:
+    """
+    Indexa arquivos em um contexto (upload pela interface ou pela API).
+
+    Returns:
+        Dicionário com listas "indexed", "unchanged" e "failed" (nome, erro)
+    """
+    failed_files = []
+    unchanged_files = []
+
+    with _begin_context_ingestion(context_name) as ingestion:
+        vector_store = ingestion.vector_store
+        pending = []
+        fingerprints = {}
+
+        for file_path in file_paths:
+            file_name = file_path.name
+
+            try:
+                # Arquivo idêntico ao já indexado: não recarrega nem re-embeda
+                fingerprint = vector_store.fingerprint_file(str(file_path), file_name)
+                if vector_store.is_file_unchanged(file_name, fingerprint):
+                    unchanged_files.append(file_name)
+                    continue
+
+                pending.append(file_path)
+                fingerprints[file_path] = fingerprint
+
+            except Exception as e:
+                failed_files.append((file_name, str(e)))
+
+        result = state.pipeline.run(
+            ingestion,
+            pending,
+            fingerprints=fingerprints,
+            progress_callback=progress_callback,
+        )
+
+    return {
+        "indexed": result["indexed"],
+        "unchanged": unchanged_files,
+        "failed": failed_files + result["failed"],
+    }
+
+
+def _sync_directory(
+    context_name: str,
+    path: Path,
+    recursive: bool = True,
+    progress_callback=None,
+) -> dict:
+    """
+    Sincroniza uma pasta com o índice do contexto em streaming: só arquivos
+    novos ou alterados são carregados, e arquivos apagados da pasta são removidos.
+
+    Returns:
+        Dicionário com listas "indexed", "unchanged", "removed" e "failed"
+    """
+    with _begin_context_ingestion(context_name) as ingestion:
+        return state.pipeline.sync_directory(
+            ingestion,
+            path,
+            recursive=recursive,
+            progress_callback=progress_callback,
+        )
+
+
+def index_documents(
+    files,
+    embeddings_choice: str = None,
+    session: Optional[SessionState] = None,
+    progress=gr.Progress(),
+) -> str:
+    """Indexa documentos no contexto atual da sessão."""
     if not files:
         return "❌ Nenhum arquivo selecionado."
 
@@ -272,34 +442,21 @@ def index_documents(files, embeddings_choice: str = None) -> str:
         embeddings_choice = "Ollama BGE-M3 (Local - Grátis)"
     
     # Atualiza provider de embeddings
-    provider = "ollama" if "Ollama" in embeddings_choice else "openai"
+    provider = _embeddings_provider(embeddings_choice)
     if provider != state.embeddings.provider:
-        state.embeddings = EmbeddingsManager.from_config("config.toml", override_provider=provider)
-        state.current_embeddings_provider = provider
-        # Reseta vector store para usar novo provider
-        state.vector_store = None
-        state.rag_chain = None
-
-    context_name = state.current_context
-    successful_files = []
-    failed_files = []
-
-    for file in files:
-        file_path = file.name
-        file_name = Path(file_path).name
+        _reset_embeddings_provider(provider)
 
-        try:
-            docs = state.document_loader.load(file_path)
-
-            if not docs:
-                failed_files.append(f"{file_name} (sem conteúdo)")
-                continue
-
-            _process_single_file_in_context(docs, file_name, context_name)
-            successful_files.append(file_name)
+    context_name = (session or SessionState()).current_context
+    result = _index_files(
+        context_name,
+        [Path(file.name) for file in files],
+        progress_callback=_progress_callback(progress),
+    )
+    vector_store = _get_context_entry(context_name).vector_store
 
-        except Exception as e:
-            failed_files.append(f"{file_name} ({str(e)[:50]})")
+    successful_files = result["indexed"]
+    unchanged_files = result["unchanged"]
+    failed_files = [f"{file_name} ({error[:50]})" for file_name, error in result["failed"]]
 
     # Monta relatório
     report = [f"📂 **Contexto:** {context_name}"]
@@ -312,6 +469,9 @@ def index_documents(files, embeddings_choice: str = None) -> str:
         if len(successful_files) > 10:
             report.append(f"  ... e mais {len(successful_files) - 10}")
 
+    if unchanged_files:
+        report.append(f"\n⏭️ {len(unchanged_files)} arquivo(s) sem alterações (ignorados)")
+
     if failed_files:
         report.append(f"\n❌ {len(failed_files)} arquivo(s) com erro:")
         for name in failed_files[:5]:
@@ -319,17 +479,31 @@ def index_documents(files, embeddings_choice: str = None) -> str:
         if len(failed_files) > 5:
             report.append(f"  ... e mais {len(failed_files) - 5}")
 
-    if state.vector_store and state.vector_store.is_initialized:
-        total_stats = state.vector_store.get_stats()
+    if vector_store.is_initialized:
+        total_stats = vector_store.get_stats()
         report.append(f"\n📚 Total no contexto:")
         report.append(f"  • {total_stats.get('total_documents', '?')} chunks")
         report.append(f"  • {total_stats.get('total_files', '?')} arquivos")
 
+        cache_stats = total_stats.get("embedding_cache")
+        if cache_stats:
+            report.append(f"  • Cache de embeddings: {cache_stats['hit_rate']:.0%} de acerto")
+
+        metrics = state.embeddings.get_metrics()
+        if metrics["texts"]:
+            report.append(f"  • Embeddings: {metrics['texts']} textos, {metrics['throughput_texts_per_s']} textos/s")
+
     return "\n".join(report)
 
 
-def index_directory(folder_path: str, recursive: bool = True, embeddings_choice: str = None) -> str:
-    """Indexa todos os documentos de uma pasta no contexto atual."""
+def index_directory(
+    folder_path: str,
+    recursive: bool = True,
+    embeddings_choice: str = None,
+    session: Optional[SessionState] = None,
+    progress=gr.Progress(),
+) -> str:
+    """Indexa todos os documentos de uma pasta no contexto atual da sessão."""
     if not folder_path or not folder_path.strip():
         return "❌ Por favor, informe o caminho da pasta."
     
@@ -338,16 +512,12 @@ def index_directory(folder_path: str, recursive: bool = True, embeddings_choice:
         embeddings_choice = "Ollama BGE-M3 (Local - Grátis)"
     
     # Atualiza provider de embeddings
-    provider = "ollama" if "Ollama" in embeddings_choice else "openai"
+    provider = _embeddings_provider(embeddings_choice)
     if provider != state.embeddings.provider:
-        state.embeddings = EmbeddingsManager.from_config("config.toml", override_provider=provider)
-        state.current_embeddings_provider = provider
-        # Reseta vector store para usar novo provider
-        state.vector_store = None
-        state.rag_chain = None
+        _reset_embeddings_provider(provider)
 
     folder_path = folder_path.strip()
-    context_name = state.current_context
+    context_name = (session or SessionState()).current_context
     path = Path(folder_path)
 
     if not path.exists():
@@ -357,30 +527,15 @@ def index_directory(folder_path: str, recursive: bool = True, embeddings_choice:
         return f"❌ O caminho não é uma pasta: {folder_path}"
 
     try:
-        all_documents = state.document_loader.load_directory(path, recursive=recursive)
+        result = _sync_directory(context_name, path, recursive, _progress_callback(progress))
+        vector_store = _get_context_entry(context_name).vector_store
 
-        if not all_documents:
+        if not (result["indexed"] or result["unchanged"] or result["removed"] or result["failed"]):
             return f"❌ Nenhum documento suportado encontrado em: {folder_path}"
 
-        # Agrupa documentos por arquivo fonte
-        docs_by_file = {}
-        for doc in all_documents:
-            source = doc.metadata.get("source", "unknown")
-            if source not in docs_by_file:
-                docs_by_file[source] = []
-            docs_by_file[source].append(doc)
-
-        # Processa cada arquivo
-        successful_files = []
-        failed_files = []
-
-        for file_source, docs in docs_by_file.items():
-            file_name = Path(file_source).name
-            try:
-                _process_single_file_in_context(docs, file_name, context_name)
-                successful_files.append(file_name)
-            except Exception as e:
-                failed_files.append(f"{file_name} ({str(e)[:50]})")
+        successful_files = result["indexed"]
+        unchanged_files = result["unchanged"]
+        failed_files = [f"{name} ({error[:50]})" for name, error in result["failed"]]
 
         # Monta relatório
         report = [f"📂 **Contexto:** {context_name}\n"]
@@ -392,17 +547,33 @@ def index_directory(folder_path: str, recursive: bool = True, embeddings_choice:
             if len(successful_files) > 10:
                 report.append(f"  ... e mais {len(successful_files) - 10}")
 
+        if unchanged_files:
+            report.append(f"\n⏭️ {len(unchanged_files)} arquivo(s) sem alterações (ignorados)")
+
+        if result["removed"]:
+            report.append(f"\n🗑️ {len(result['removed'])} arquivo(s) removido(s) da pasta:")
+            for name in result["removed"][:5]:
+                report.append(f"  • {name}")
+
         if failed_files:
             report.append(f"\n❌ {len(failed_files)} arquivo(s) com erro:")
             for name in failed_files[:5]:
                 report.append(f"  • {name}")
 
-        if state.vector_store and state.vector_store.is_initialized:
-            total_stats = state.vector_store.get_stats()
+        if vector_store.is_initialized:
+            total_stats = vector_store.get_stats()
             report.append(f"\n📚 Total no contexto:")
             report.append(f"  • {total_stats.get('total_documents', '?')} chunks")
             report.append(f"  • {total_stats.get('total_files', '?')} arquivos")
 
+            cache_stats = total_stats.get("embedding_cache")
+            if cache_stats:
+                report.append(f"  • Cache de embeddings: {cache_stats['hit_rate']:.0%} de acerto")
+
+            metrics = state.embeddings.get_metrics()
+            if metrics["texts"]:
+                report.append(f"  • Embeddings: {metrics['texts']} textos, {metrics['throughput_texts_per_s']} textos/s")
+
         return "\n".join(report)
 
     except PermissionError:
@@ -415,40 +586,95 @@ def index_directory(folder_path: str, recursive: bool = True, embeddings_choice:
 # FUNÇÕES DE CONSULTA
 # ============================================================================
 
-def query_rag(question: str, llm_choice: str) -> tuple:
-    """Executa query no contexto atual."""
-    if not question.strip():
-        return "Por favor, digite uma pergunta.", ""
-
-    if state.rag_chain is None:
-        return f"❌ Contexto '{state.current_context}' não tem documentos indexados.", ""
+def _format_sources_markdown(sources: List[dict], cached: bool = False) -> str:
+    """Formata as fontes de uma resposta para o painel lateral."""
+    sources_text = ""
+    if cached:
+        sources_text += "⚡ *Resposta reaproveitada de uma pergunta semelhante (cache)*\n\n"
+    sources_text += "📚 **Fontes consultadas:**\n\n"
+    for i, source in enumerate(sources, 1):
+        sources_text += f"**[{i}] {source['file']}** (chunk {source['chunk']})\n"
+        sources_text += f"> {source['content']}\n\n"
+    return sources_text
+
+
+async def _stream_answer(
+    context_name: str,
+    question: str,
+    llm_provider: str,
+    metadata_filter: Optional[MetadataFilter] = None,
+) -> AsyncIterator[dict]:
+    """
+    Eventos de RAGChain.astream para uma pergunta (interface e API).
+
+    ``metadata_filter`` restringe a busca (ex: um arquivo, páginas, seção).
+
+    A consulta tem leitura no contexto (várias em paralelo, mas não durante a
+    indexação dele) até a busca terminar; a geração não usa mais o índice.
+
+    Raises:
+        LookupError: Se o contexto não tem documentos indexados
+    """
+    lock = state.context_locks.get(context_name)
+
+    # A espera pelo lock e o carregamento do índice rodam fora do event loop
+    await lock.acquire_read_async()
+    locked = True
 
     try:
-        provider = "openai" if llm_choice == "GPT-4o (OpenAI)" else "anthropic"
-        if state.rag_chain.llm_provider != provider:
-            state.rag_chain.switch_llm(provider)
+        entry = await asyncio.to_thread(_get_context_entry, context_name)
+        rag_chain = entry.chain_for(
+            llm_provider,
+            lambda provider: _new_rag_chain(entry.vector_store, context_name, provider),
+        )
+        if rag_chain is None:
+            raise LookupError(f"Contexto '{context_name}' não tem documentos indexados.")
 
-        result = state.rag_chain.query(question, return_sources=True)
-        answer = result["answer"]
+        async for event in rag_chain.astream(question, metadata_filter):
+            if event["type"] == "sources" and locked:
+                lock.release_read()
+                locked = False
+            yield event
 
-        sources_text = "📚 **Fontes consultadas:**\n\n"
-        for i, source in enumerate(result.get("sources", []), 1):
-            sources_text += f"**[{i}] {source['file']}** (chunk {source['chunk']})\n"
-            sources_text += f"> {source['content']}\n\n"
+    finally:
+        if locked:
+            lock.release_read()
+
+
+async def query_rag(question: str, llm_choice: str, session: SessionState) -> AsyncIterator[tuple]:
+    """Executa query no contexto da sessão, atualizando a resposta a cada token."""
+    if not question.strip():
+        yield "Por favor, digite uma pergunta.", ""
+        return
 
-        return answer, sources_text
+    provider = "openai" if llm_choice == "GPT-4o (OpenAI)" else "anthropic"
+    answer = ""
+    sources_text = ""
+
+    try:
+        async for event in _stream_answer(session.current_context, question, provider):
+            if event["type"] == "sources":
+                # Fontes aparecem antes do primeiro token da resposta
+                sources_text = _format_sources_markdown(event["sources"], event["cached"])
+                yield "⏳ Gerando resposta...", sources_text
+            elif event["type"] == "token":
+                answer += event["text"]
+                yield answer, sources_text
+
+    except LookupError as e:
+        yield f"❌ {str(e)}", ""
 
     except Exception as e:
-        return f"❌ Erro na consulta: {str(e)}", ""
+        yield f"{answer}\n\n❌ Erro na consulta: {str(e)}".strip(), sources_text
 
 
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
 
-def get_current_context_label() -> str:
-    """Retorna label do contexto atual."""
-    return f"📂 Contexto: **{state.current_context}**"
+def get_current_context_label(session: SessionState) -> str:
+    """Retorna label do contexto atual da sessão."""
+    return f"📂 Contexto: **{session.current_context}**"
 
 
 def get_status() -> str:
@@ -465,6 +691,16 @@ def get_status() -> str:
         for ctx in stats['contexts']:
             status += f"  • {ctx['name']}: {ctx['documents']} docs, {ctx['files']} arquivos\n"
 
+    pool_stats = state.context_pool.get_stats()
+    status += f"\n🧠 **Contextos em memória:** {len(pool_stats['resident'])}/{pool_stats['max_contexts']}"
+    status += f" ({pool_stats['memory_mb']}/{pool_stats['memory_budget_mb']} MB)\n"
+    status += f"• Acertos: {pool_stats['hits']} | Carregamentos: {pool_stats['misses']}"
+    status += f" | Descartes: {pool_stats['evictions']}\n"
+
+    lock_stats = state.context_locks.get_stats()
+    if lock_stats["writing"]:
+        status += f"• Indexando agora: {', '.join(lock_stats['writing'])}\n"
+
     return status
 
 
@@ -477,6 +713,9 @@ with gr.Blocks(
     theme=gr.themes.Soft(),
 ) as demo:
 
+    # Contexto selecionado em cada aba do navegador
+    session_state = gr.State(SessionState())
+
     gr.Markdown("""
     # 🔍 RAG Multi-Contexto
     **Gerencie documentos por contexto (ex: cond_169, cond_170)**
@@ -493,7 +732,7 @@ with gr.Blocks(
 
             context_dropdown = gr.Dropdown(
                 choices=get_available_contexts(),
-                value=state.current_context,
+                value="default",
                 label="Selecione o Contexto",
                 interactive=True,
             )
@@ -534,7 +773,7 @@ with gr.Blocks(
         with gr.Column(scale=1):
             gr.Markdown("### 📄 Indexação")
 
-            current_context_label = gr.Markdown(get_current_context_label())
+            current_context_label = gr.Markdown(get_current_context_label(SessionState()))
             
             with gr.Tab("Upload"):
                 file_input = gr.File(
@@ -564,7 +803,7 @@ with gr.Blocks(
         with gr.Column(scale=2):
             gr.Markdown("### 💬 Consulta")
 
-            query_context_label = gr.Markdown(get_current_context_label())
+            query_context_label = gr.Markdown(get_current_context_label(SessionState()))
 
             with gr.Row():
                 llm_choice = gr.Dropdown(
@@ -576,7 +815,11 @@ with gr.Blocks(
                     allow_custom_value=False,
                 )
                 embeddings_choice = gr.Dropdown(
-                    choices=["Ollama BGE-M3 (Local - Grátis)", "OpenAI text-embedding-3-small (Pago)"],
+                    choices=[
+                        "Ollama BGE-M3 (Local - Grátis)",
+                        "BGE-M3 ONNX (CPU, em processo - Grátis)",
+                        "OpenAI text-embedding-3-small (Pago)",
+                    ],
                     value=None,
                     label="Modelo de Embeddings (Indexação) - Padrão: Ollama Grátis",
                     scale=1,
@@ -609,52 +852,54 @@ with gr.Blocks(
     # EVENTOS
     # =========================================================================
 
-    def refresh_dropdown():
+    def refresh_dropdown(session):
         contexts = get_available_contexts()
-        return gr.update(choices=contexts, value=state.current_context)
+        return gr.update(choices=contexts, value=session.current_context)
 
-    def update_context_labels():
-        label = get_current_context_label()
+    def update_context_labels(session):
+        label = get_current_context_label(session)
         return label, label
 
-    def on_context_change(context_name):
+    def on_context_change(context_name, session):
         """Carrega contexto automaticamente ao selecionar no dropdown."""
-        if context_name and context_name != state.current_context:
-            status = switch_context(context_name)
-            label = get_current_context_label()
+        if context_name and context_name != session.current_context:
+            status = switch_context(context_name, session)
+            label = get_current_context_label(session)
             return status, label, label, ""  # Limpa resultado anterior
         return gr.update(), gr.update(), gr.update(), gr.update()
 
     # Contextos - Carrega automaticamente ao selecionar
     context_dropdown.change(
         fn=on_context_change,
-        inputs=[context_dropdown],
+        inputs=[context_dropdown, session_state],
         outputs=[context_status, current_context_label, query_context_label, index_output],
     )
 
     refresh_btn.click(
         fn=refresh_dropdown,
+        inputs=[session_state],
         outputs=[context_dropdown],
     )
 
     load_context_btn.click(
         fn=switch_context,
-        inputs=[context_dropdown],
+        inputs=[context_dropdown, session_state],
         outputs=[context_status],
     ).then(
         fn=update_context_labels,
+        inputs=[session_state],
         outputs=[current_context_label, query_context_label],
     )
 
     create_btn.click(
         fn=create_new_context,
-        inputs=[new_context_name, new_context_desc],
+        inputs=[new_context_name, new_context_desc, session_state],
         outputs=[context_status, context_dropdown, current_context_label, query_context_label],
     )
 
     delete_btn.click(
         fn=delete_context,
-        inputs=[context_dropdown],
+        inputs=[context_dropdown, session_state],
         outputs=[context_status, context_dropdown, current_context_label, query_context_label],
     )
 
@@ -664,29 +909,35 @@ with gr.Blocks(
         outputs=[context_status],
     )
 
-    # Indexação
+    # Indexação (fila própria: indexações longas não ocupam as vagas das consultas)
+    indexing_limit = state.server_config.get("indexing_concurrency", 2)
+
     index_btn.click(
         fn=index_documents,
-        inputs=[file_input, embeddings_choice],
+        inputs=[file_input, embeddings_choice, session_state],
         outputs=[index_output],
+        concurrency_id="indexing",
+        concurrency_limit=indexing_limit,
     )
 
     index_folder_btn.click(
         fn=index_directory,
-        inputs=[folder_input, recursive_check, embeddings_choice],
+        inputs=[folder_input, recursive_check, embeddings_choice, session_state],
         outputs=[index_output],
+        concurrency_id="indexing",
+        concurrency_limit=indexing_limit,
     )
 
     # Consulta
     query_btn.click(
         fn=query_rag,
-        inputs=[question_input, llm_choice],
+        inputs=[question_input, llm_choice, session_state],
         outputs=[answer_output, sources_output],
     )
 
     question_input.submit(
         fn=query_rag,
-        inputs=[question_input, llm_choice],
+        inputs=[question_input, llm_choice, session_state],
         outputs=[answer_output, sources_output],
     )
 
@@ -713,13 +964,39 @@ if __name__ == "__main__":
     if not state.context_manager.context_exists("default"):
         state.context_manager.create_context("default", "Contexto padrão")
 
+    # Pré-carrega contextos configurados em [context_pool]
+    state.context_pool.preload(state.context_pool.preload_contexts, _load_context)
+
     # Tenta carregar contexto padrão se tiver índice
     if state.context_manager.has_index("default"):
-        switch_context("default")
+        _get_context_entry("default")
 
-    # Inicia aplicação
-    demo.launch(
-        server_name="0.0.0.0",
-        server_port=7860,
-        share=False,
+    # Fila do Gradio: consultas simultâneas e tamanho máximo da fila
+    server_config = state.server_config
+    demo.queue(
+        default_concurrency_limit=server_config.get("concurrency_limit", 8),
+        max_size=server_config.get("max_queue_size", 64) or None,
     )
+
+    if server_config.get("api_enabled", True):
+        # API JSON (/health, /metrics, /contexts/...) com a interface em "/"
+        api = create_api(
+            state,
+            stream_answer=_stream_answer,
+            index_files=_index_files,
+            federated_answer=_federated_answer,
+            batch_concurrency=server_config.get("batch_concurrency", 4),
+        )
+        uvicorn.run(
+            gr.mount_gradio_app(api, demo, path="/"),
+            host=server_config.get("host", "0.0.0.0"),
+            port=server_config.get("port", 7860),
+            timeout_keep_alive=server_config.get("keep_alive_seconds", 30),
+        )
+    else:
+        # Inicia aplicação
+        demo.launch(
+            server_name=server_config.get("host", "0.0.0.0"),
+            server_port=server_config.get("port", 7860),
+            share=False,
+        )
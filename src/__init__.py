@@ -3,15 +3,20 @@
 from .document_loader import DocumentLoader
 from .chunker import Chunker
 from .embeddings import EmbeddingsManager
-from .vector_store import VectorStore
+from .vector_store import VectorStore, IngestionSession
 from .toon_formatter import ToonFormatter
 from .rag_chain import RAGChain
+from .ingestion import IngestionPipeline
+from .context_pool import ContextPool
 
 __all__ = [
     "DocumentLoader",
     "Chunker",
     "EmbeddingsManager",
     "VectorStore",
+    "IngestionSession",
     "ToonFormatter",
     "RAGChain",
+    "IngestionPipeline",
+    "ContextPool",
 ]
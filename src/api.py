@@ -0,0 +1,308 @@
+"""API - Endpoints HTTP/JSON de consulta e indexação (sem a interface Gradio)."""
+
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Callable, List, Optional
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from .metadata_filter import MetadataFilter
+from .query_cache import caches_from_config
+
+
+# (contexto, pergunta, provedor do LLM, filtro) -> eventos de RAGChain.astream
+StreamAnswer = Callable[[str, str, str, Optional[MetadataFilter]], AsyncIterator[dict]]
+# (contexto, arquivos) -> {"indexed", "unchanged", "failed"}
+IndexFiles = Callable[[str, List[Path]], dict]
+# (contextos, pergunta, provedor do LLM, filtro) -> resultado de RAGChain.query_contexts
+FederatedAnswer = Callable[[List[str], str, str, Optional[MetadataFilter]], dict]
+
+
+class QueryRequest(BaseModel):
+    """Corpo de /contexts/{name}/query e /query/stream."""
+
+    question: str = Field(..., min_length=1)
+    llm_provider: str = "openai"
+    return_sources: bool = True
+    # Filtro de metadados (ver MetadataFilter.from_dict), ex:
+    # {"source": "convencao.pdf", "page_min": 3, "header_1": "Lazer"}
+    filter: Optional[dict] = None
+
+
+class BatchQueryRequest(BaseModel):
+    """Corpo de /contexts/{name}/query/batch."""
+
+    questions: List[str] = Field(..., min_length=1)
+    llm_provider: str = "openai"
+    return_sources: bool = True
+    filter: Optional[dict] = None
+
+
+class FederatedQueryRequest(BaseModel):
+    """Corpo de /query/federated."""
+
+    question: str = Field(..., min_length=1)
+    # Vazio = contextos já carregados (residentes no pool) com documentos indexados
+    contexts: List[str] = Field(default_factory=list)
+    llm_provider: str = "openai"
+    return_sources: bool = True
+    filter: Optional[dict] = None
+
+
+class CreateContextRequest(BaseModel):
+    """Corpo de POST /contexts."""
+
+    name: str = Field(..., min_length=1)
+    description: str = ""
+
+
+class RequestMetrics:
+    """Contadores de requisições HTTP (expostos em /metrics)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+
+    def begin(self) -> float:
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def end(self, started: float, status_code: int) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_seconds += time.perf_counter() - started
+            if status_code >= 500:
+                self.errors += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "avg_latency_ms": round(1000 * self.total_seconds / self.requests, 1) if self.requests else 0.0,
+                "uptime_seconds": round(time.time() - self.started_at),
+            }
+
+
+def create_api(
+    state,
+    stream_answer: StreamAnswer,
+    index_files: IndexFiles,
+    federated_answer: Optional[FederatedAnswer] = None,
+    batch_concurrency: int = 4,
+    config_path: str = "config.toml",
+) -> FastAPI:
+    """
+    Cria a API HTTP sobre o mesmo estado da interface Gradio.
+
+    Consultas usam os contextos já carregados no ContextPool e os mesmos
+    locks por contexto da interface; a geração é assíncrona, então um único
+    processo atende muitos clientes simultâneos. Em /query/stream a resposta é
+    enviada em NDJSON (um evento JSON por linha).
+
+    Args:
+        state: Estado compartilhado do app (context_manager, context_pool, context_locks, embeddings)
+        stream_answer: Gera os eventos de resposta de uma pergunta em um contexto
+        index_files: Indexa arquivos em um contexto
+        federated_answer: Responde com documentos de vários contextos
+            (None = sem /query/federated)
+        batch_concurrency: Perguntas de um lote respondidas em paralelo
+        config_path: Caminho para o arquivo config.toml (caches de consulta)
+
+    Returns:
+        Aplicação FastAPI (o Gradio pode ser montado nela)
+    """
+    api = FastAPI(title="RAG Multi-Contexto API")
+    metrics = RequestMetrics()
+    query_cache, answer_cache = caches_from_config(config_path)
+
+    @api.middleware("http")
+    async def count_requests(request: Request, call_next):
+        started = metrics.begin()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            metrics.end(started, status_code)
+
+    def require_context(name: str) -> None:
+        if not state.context_manager.context_exists(name):
+            raise HTTPException(status_code=404, detail=f"Contexto '{name}' não existe.")
+
+    def parse_filter(data: Optional[dict]) -> Optional[MetadataFilter]:
+        try:
+            return MetadataFilter.from_dict(data)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Filtro inválido: {e}")
+
+    async def answer(
+        name: str,
+        question: str,
+        llm_provider: str,
+        return_sources: bool,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> dict:
+        """Consome os eventos e retorna o resultado final (mesmo formato de RAGChain.query)."""
+        try:
+            async for event in stream_answer(name, question, llm_provider, metadata_filter):
+                if event["type"] == "done":
+                    result = {k: v for k, v in event.items() if k != "type"}
+                    if not return_sources:
+                        result.pop("sources", None)
+                    return result
+        except LookupError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        raise HTTPException(status_code=500, detail="Resposta incompleta.")
+
+    # ------------------------------------------------------------------
+    # Saúde e métricas
+    # ------------------------------------------------------------------
+
+    @api.get("/health")
+    async def health() -> dict:
+        return {"status": "ok", "uptime_seconds": metrics.get_stats()["uptime_seconds"]}
+
+    @api.get("/metrics")
+    async def get_metrics() -> dict:
+        return {
+            "http": metrics.get_stats(),
+            "context_pool": state.context_pool.get_stats(),
+            "locks": state.context_locks.get_stats(),
+            "query_cache": query_cache.get_stats() if query_cache else None,
+            "answer_cache": answer_cache.get_stats() if answer_cache else None,
+            "embeddings": state.embeddings.get_metrics(),
+            "federated": state.federated.get_stats() if getattr(state, "federated", None) else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Contextos
+    # ------------------------------------------------------------------
+
+    @api.get("/contexts")
+    async def list_contexts() -> dict:
+        return await run_in_threadpool(state.context_manager.get_stats)
+
+    @api.post("/contexts", status_code=201)
+    async def create_context(body: CreateContextRequest) -> dict:
+        created = await run_in_threadpool(state.context_manager.create_context, body.name, body.description)
+        if not created:
+            raise HTTPException(status_code=409, detail=f"Contexto '{body.name}' já existe.")
+        return {"name": body.name}
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    @api.post("/contexts/{name}/query")
+    async def query(name: str, body: QueryRequest) -> dict:
+        require_context(name)
+        metadata_filter = parse_filter(body.filter)
+        return await answer(name, body.question, body.llm_provider, body.return_sources, metadata_filter)
+
+    @api.post("/contexts/{name}/query/stream")
+    async def query_stream(name: str, body: QueryRequest) -> StreamingResponse:
+        require_context(name)
+        events = stream_answer(name, body.question, body.llm_provider, parse_filter(body.filter))
+
+        # Lê o primeiro evento antes de responder para ainda poder retornar 409
+        try:
+            first = await events.__anext__()
+        except LookupError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        async def ndjson() -> AsyncIterator[str]:
+            try:
+                event = first
+                while True:
+                    if event["type"] == "done" and not body.return_sources:
+                        event = {k: v for k, v in event.items() if k != "sources"}
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+                    event = await events.__anext__()
+            except StopAsyncIteration:
+                pass
+            except Exception as e:
+                yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+            finally:
+                await events.aclose()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    @api.post("/contexts/{name}/query/batch")
+    async def query_batch(name: str, body: BatchQueryRequest) -> dict:
+        require_context(name)
+        metadata_filter = parse_filter(body.filter)
+        semaphore = asyncio.Semaphore(max(1, batch_concurrency))
+
+        async def run(question: str) -> dict:
+            async with semaphore:
+                try:
+                    return await answer(name, question, body.llm_provider, body.return_sources, metadata_filter)
+                except HTTPException as e:
+                    return {"error": e.detail}
+                except Exception as e:
+                    return {"error": str(e)}
+
+        results = await asyncio.gather(*(run(question) for question in body.questions))
+        return {
+            "results": [
+                {"question": question, **result}
+                for question, result in zip(body.questions, results)
+            ]
+        }
+
+    @api.post("/query/federated")
+    async def query_federated(body: FederatedQueryRequest) -> dict:
+        if federated_answer is None:
+            raise HTTPException(status_code=404, detail="Busca em vários contextos desativada.")
+        for name in body.contexts:
+            require_context(name)
+        metadata_filter = parse_filter(body.filter)
+        try:
+            result = await run_in_threadpool(
+                federated_answer, body.contexts, body.question, body.llm_provider, metadata_filter
+            )
+        except LookupError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if not body.return_sources:
+            result.pop("sources", None)
+        return result
+
+    # ------------------------------------------------------------------
+    # Indexação
+    # ------------------------------------------------------------------
+
+    @api.post("/contexts/{name}/documents")
+    async def upload_documents(name: str, files: List[UploadFile] = File(...)) -> dict:
+        require_context(name)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_paths = []
+            for upload in files:
+                # Mantém o nome original: é a chave do arquivo no índice
+                file_path = Path(tmp_dir) / Path(upload.filename or "documento").name
+                with open(file_path, "wb") as f:
+                    while chunk := await upload.read(1024 * 1024):
+                        f.write(chunk)
+                file_paths.append(file_path)
+
+            result = await run_in_threadpool(index_files, name, file_paths)
+
+        return {**result, "failed": [{"file": f, "error": e} for f, e in result["failed"]]}
+
+    return api
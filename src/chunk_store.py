@@ -0,0 +1,364 @@
+"""Chunk Store - Armazenamento em disco (SQLite) dos textos e metadados dos chunks."""
+
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Docstore do LangChain persistido em SQLite.
+
+    Substitui o InMemoryDocstore serializado em ``index.pkl``: os textos ficam
+    em disco e só os chunks retornados pela busca (top-k) são lidos. Metadados
+    com valores texto (source, file_path, file_type, loaded_at...), iguais em
+    todos os chunks de um arquivo, são internados em uma tabela própria e
+    referenciados por ID; apenas valores numéricos (chunk_index, page...) são
+    gravados por chunk.
+
+    Alterações ficam em uma transação aberta até ``commit()`` (chamado pelo
+    VectorStore.save), mantendo o arquivo consistente com o índice em disco.
+
+    Com ``lexical=True`` (busca híbrida), um índice invertido FTS5 (BM25)
+    sobre os textos é mantido por triggers a cada inserção/remoção de chunks.
+    A tabela FTS usa os próprios textos de ``chunks`` (conteúdo externo), então
+    só os termos são gravados a mais. Sem busca híbrida o FTS5 não é criado
+    (nem exigido do SQLite).
+    """
+
+    FILE_NAME = "chunks.sqlite"
+
+    # Palavras muito comuns ignoradas na busca lexical
+    STOPWORDS = frozenset(
+        "a à ao aos as às até com como da das de do dos e é em entre era essa esse esta este "
+        "eu foi for há isso isto já mais mas me mesmo na nas nem no nos o os ou para pela pelas "
+        "pelo pelos por qual quando que quem se sem ser seu sua são também te tem um uma uns "
+        "umas vai você".split()
+    )
+
+    # Máximo de conjuntos de metadados mantidos em memória
+    _METADATA_CACHE_SIZE = 10_000
+
+    def __init__(self, path: Union[str, Path] = ":memory:", lexical: bool = True):
+        """
+        Inicializa o chunk store.
+
+        Args:
+            path: Arquivo SQLite (":memory:" para um store temporário)
+            lexical: Cria/mantém o índice FTS5 para search_lexical
+        """
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " id INTEGER PRIMARY KEY,"
+            " json TEXT NOT NULL UNIQUE"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " metadata_id INTEGER NOT NULL REFERENCES metadata(id),"
+            " extra TEXT"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_metadata ON chunks(metadata_id)")
+        if lexical:
+            self._create_lexical_index()
+        self._conn.commit()
+
+        # metadata_id -> dicionário (metadados internados)
+        self._metadata_cache: Dict[int, dict] = {}
+
+    # ------------------------------------------------------------------
+    # Interface Docstore do LangChain
+    # ------------------------------------------------------------------
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Busca um chunk pelo ID (retorna texto de erro se não existir, como o LangChain)."""
+        found = self.get_many([search])
+        return found.get(search, f"ID {search} not found.")
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Adiciona chunks.
+
+        Args:
+            texts: Dicionário ID -> Document
+        """
+        with self._lock:
+            overlapping = self._existing_ids(texts)
+            if overlapping:
+                raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+            self._write(texts, "INSERT")
+
+    def update(self, texts: Dict[str, Document]) -> None:
+        """Substitui texto/metadados de chunks (sem alterar o embedding)."""
+        with self._lock:
+            self._write(texts, "INSERT OR REPLACE")
+
+    def delete(self, ids: List) -> None:
+        """Remove chunks pelo ID (IDs inexistentes são ignorados)."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Document]:
+        """
+        Lê vários chunks de uma vez (ex: os top-k de uma busca).
+
+        Args:
+            ids: IDs dos chunks
+
+        Returns:
+            Dicionário ID -> Document (apenas os encontrados)
+        """
+        ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id is not None]
+        found: Dict[str, Document] = {}
+
+        with self._lock:
+            # SQLite limita o número de parâmetros por consulta
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata_id, extra FROM chunks WHERE id IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for doc_id, text, metadata_id, extra in rows:
+                    metadata = dict(self._get_metadata(metadata_id))
+                    if extra:
+                        metadata.update(json.loads(extra))
+                    found[doc_id] = Document(id=doc_id, page_content=text, metadata=metadata)
+
+        return found
+
+    def search_lexical(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """
+        Busca BM25 nos textos dos chunks.
+
+        Encontra termos exatos que embeddings recuperam mal (ex: "Art. 12",
+        "bloco B", nomes).
+
+        Args:
+            query: Texto da consulta
+            k: Número máximo de resultados
+
+        Returns:
+            Lista de (ID do chunk, score BM25), do mais ao menos relevante
+        """
+        match = self.lexical_query(query)
+        if not match or k <= 0 or not self.has_lexical_index:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, bm25(chunks_fts) AS rank FROM chunks_fts"
+                " JOIN chunks c ON c.rowid = chunks_fts.rowid"
+                " WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, k),
+            ).fetchall()
+        # bm25() do SQLite é negativo (menor = melhor)
+        return [(doc_id, -rank) for doc_id, rank in rows]
+
+    @property
+    def has_lexical_index(self) -> bool:
+        """Indica se o arquivo tem o índice FTS5 (busca lexical)."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone()
+        return row is not None
+
+    @classmethod
+    def lexical_query(cls, text: str) -> str:
+        """Converte uma pergunta em consulta FTS5 (termos entre aspas unidos por OR)."""
+        terms = []
+        for term in re.findall(r"\w+", text.casefold()):
+            if term not in cls.STOPWORDS and term not in terms:
+                terms.append(term)
+        return " OR ".join(f'"{term}"' for term in terms)
+
+    def ids_for_source(self, source: str) -> List[str]:
+        """Retorna os IDs dos chunks com o metadado "source" informado."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id FROM chunks c JOIN metadata m ON m.id = c.metadata_id"
+                " WHERE json_extract(m.json, '$.source') = ?",
+                (source,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_metadata(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Percorre os metadados de todos os chunks, sem ler os textos.
+
+        Yields:
+            Tuplas (ID do chunk, metadados)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, metadata_id, extra FROM chunks").fetchall()
+            for doc_id, metadata_id, extra in rows:
+                metadata = self._get_metadata(metadata_id)
+                if extra:
+                    metadata = {**metadata, **json.loads(extra)}
+                yield doc_id, metadata
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM chunks WHERE id = ?", (doc_id,)).fetchone()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def commit(self) -> None:
+        """Grava as alterações pendentes no arquivo."""
+        with self._lock:
+            # Remove conjuntos de metadados que não são mais referenciados
+            self._conn.execute(
+                "DELETE FROM metadata WHERE id NOT IN (SELECT metadata_id FROM chunks)"
+            )
+            self._metadata_cache.clear()
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove todos os chunks e metadados."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM metadata")
+            self._metadata_cache.clear()
+
+    def save_to(self, path: Union[str, Path]) -> None:
+        """Copia o conteúdo (incluindo alterações pendentes) para outro arquivo."""
+        with self._lock:
+            self._conn.commit()
+            target = sqlite3.connect(str(path))
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+
+    def close(self) -> None:
+        """Fecha a conexão (alterações não confirmadas são descartadas)."""
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _create_lexical_index(self) -> None:
+        """Cria o índice FTS5 e os triggers que o mantêm (reconstruindo stores antigos)."""
+        # INSERT OR REPLACE (update) só dispara o trigger de remoção com esta opção
+        self._conn.execute("PRAGMA recursive_triggers = ON")
+
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone()
+        if exists:
+            return
+
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE chunks_fts USING fts5("
+            " text, content='chunks', content_rowid='rowid',"
+            " tokenize='unicode61 remove_diacritics 2'"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER chunks_fts_insert AFTER INSERT ON chunks BEGIN"
+            " INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);"
+            " END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER chunks_fts_delete AFTER DELETE ON chunks BEGIN"
+            " INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);"
+            " END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER chunks_fts_update AFTER UPDATE ON chunks BEGIN"
+            " INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);"
+            " INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);"
+            " END"
+        )
+        # Chunk store criado antes do índice lexical
+        self._conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def _split_metadata(metadata: dict) -> Tuple[str, Optional[str]]:
+        """Separa metadados internáveis (texto) dos específicos do chunk."""
+        shared = {}
+        extra = {}
+        for key, value in metadata.items():
+            if isinstance(value, str):
+                shared[key] = value
+            else:
+                extra[key] = value
+        shared_json = json.dumps(shared, ensure_ascii=False, sort_keys=True)
+        extra_json = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+        return shared_json, extra_json
+
+    def _intern_metadata(self, shared_json: str) -> int:
+        """Retorna o ID do conjunto de metadados, criando-o se necessário."""
+        row = self._conn.execute("SELECT id FROM metadata WHERE json = ?", (shared_json,)).fetchone()
+        if row:
+            return row[0]
+        return self._conn.execute("INSERT INTO metadata (json) VALUES (?)", (shared_json,)).lastrowid
+
+    def _get_metadata(self, metadata_id: int) -> dict:
+        """Lê um conjunto de metadados internados (com cache em memória)."""
+        metadata = self._metadata_cache.get(metadata_id)
+        if metadata is None:
+            row = self._conn.execute("SELECT json FROM metadata WHERE id = ?", (metadata_id,)).fetchone()
+            metadata = json.loads(row[0]) if row else {}
+            if len(self._metadata_cache) >= self._METADATA_CACHE_SIZE:
+                self._metadata_cache.clear()
+            self._metadata_cache[metadata_id] = metadata
+        return metadata
+
+    def _existing_ids(self, texts: Dict[str, Document]) -> List[str]:
+        """IDs de ``texts`` que já estão no store."""
+        ids = list(texts)
+        existing = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT id FROM chunks WHERE id IN ({placeholders})", batch
+            ).fetchall()
+            existing.extend(row[0] for row in rows)
+        return existing
+
+    def _write(self, texts: Dict[str, Document], verb: str) -> None:
+        """Grava chunks internando os metadados."""
+        interned: Dict[str, int] = {}
+        rows = []
+        for doc_id, doc in texts.items():
+            shared_json, extra_json = self._split_metadata(doc.metadata or {})
+            if shared_json not in interned:
+                interned[shared_json] = self._intern_metadata(shared_json)
+            rows.append((doc_id, doc.page_content, interned[shared_json], extra_json))
+
+        self._conn.executemany(
+            f"{verb} INTO chunks (id, text, metadata_id, extra) VALUES (?, ?, ?, ?)",
+            rows,
+        )
@@ -1,6 +1,6 @@
 """Chunker - Estratégias de chunking para documentos."""
 
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
 import toml
 from langchain_core.documents import Document
@@ -76,8 +76,18 @@ class Chunker:
         Returns:
             Lista de Documents (chunks) com metadados preservados
         """
-        all_chunks = []
+        return list(self.iter_split(documents))
 
+    def iter_split(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Divide documentos em chunks sob demanda (um documento por vez).
+
+        Args:
+            documents: Documents para dividir (lista ou gerador)
+
+        Yields:
+            Chunks com metadados preservados
+        """
         for doc in documents:
             # Usa splitter específico para Markdown
             if doc.metadata.get("file_type") in [".md", ".markdown"]:
@@ -90,9 +100,7 @@ class Chunker:
                 chunk.metadata["chunk_index"] = i
                 chunk.metadata["total_chunks"] = len(chunks)
 
-            all_chunks.extend(chunks)
-
-        return all_chunks
+            yield from chunks
 
     def _split_text(self, document: Document) -> List[Document]:
         """Divide documento usando RecursiveCharacterTextSplitter."""
@@ -0,0 +1,199 @@
+"""Concurrency - Locks de leitura/escrita por contexto e limite de taxa de chamadas."""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class RWLock:
+    """
+    Lock de leitores/escritor.
+
+    Várias consultas (leitores) usam o índice ao mesmo tempo; a indexação
+    (escritor) tem acesso exclusivo. Um escritor esperando bloqueia novos
+    leitores, para que consultas contínuas não adiem a indexação
+    indefinidamente.
+
+    O lock não pertence a uma thread: pode ser adquirido em uma thread e
+    liberado em outra (ex: handlers assíncronos que usam asyncio.to_thread).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self, timeout: Optional[float] = None) -> bool:
+        """
+        Adquire o lock para leitura.
+
+        Args:
+            timeout: Tempo máximo de espera em segundos (None = sem limite)
+
+        Returns:
+            True se adquiriu, False se o tempo esgotou
+        """
+        with self._cond:
+            acquired = self._cond.wait_for(
+                lambda: not self._writer and not self._writers_waiting,
+                timeout,
+            )
+            if acquired:
+                self._readers += 1
+            return acquired
+
+    async def acquire_read_async(self) -> None:
+        """
+        Adquire o lock para leitura sem bloquear o event loop.
+
+        A espera roda em uma thread (asyncio.to_thread). Se a tarefa é
+        cancelada durante a espera (ex: cliente desconectou), a thread ainda
+        adquire o lock quando o escritor terminar; essa leitura é liberada
+        em seguida, para não travar o contexto.
+
+        Raises:
+            asyncio.CancelledError: Se a tarefa foi cancelada durante a espera
+        """
+        waiting = asyncio.ensure_future(asyncio.to_thread(self.acquire_read))
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            waiting.add_done_callback(self._release_abandoned_read)
+            raise
+
+    def _release_abandoned_read(self, waiting: "asyncio.Future") -> None:
+        """Libera a leitura adquirida para uma tarefa já cancelada."""
+        if not waiting.cancelled() and waiting.exception() is None:
+            self.release_read()
+
+    def release_read(self) -> None:
+        """Libera uma leitura."""
+        with self._cond:
+            if self._readers <= 0:
+                raise RuntimeError("release_read sem acquire_read")
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self, timeout: Optional[float] = None) -> bool:
+        """
+        Adquire o lock para escrita (exclusivo).
+
+        Args:
+            timeout: Tempo máximo de espera em segundos (None = sem limite)
+
+        Returns:
+            True se adquiriu, False se o tempo esgotou
+        """
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                acquired = self._cond.wait_for(
+                    lambda: not self._writer and not self._readers,
+                    timeout,
+                )
+            finally:
+                self._writers_waiting -= 1
+            if acquired:
+                self._writer = True
+            else:
+                # Leitores bloqueados pelo escritor desistente podem seguir
+                self._cond.notify_all()
+            return acquired
+
+    def release_write(self) -> None:
+        """Libera a escrita."""
+        with self._cond:
+            if not self._writer:
+                raise RuntimeError("release_write sem acquire_write")
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Context manager de leitura."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Context manager de escrita."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    @property
+    def readers(self) -> int:
+        """Leituras em andamento."""
+        return self._readers
+
+    @property
+    def writing(self) -> bool:
+        """True se há uma escrita em andamento."""
+        return self._writer
+
+
+class ContextLocks:
+    """
+    Um RWLock por contexto.
+
+    Indexar um contexto bloqueia apenas as consultas desse contexto; os demais
+    continuam respondendo normalmente.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, RWLock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, context_name: str) -> RWLock:
+        """Retorna o lock do contexto (criado no primeiro uso)."""
+        with self._lock:
+            lock = self._locks.get(context_name)
+            if lock is None:
+                lock = self._locks[context_name] = RWLock()
+            return lock
+
+    def get_stats(self) -> dict:
+        """Retorna leituras e escritas em andamento por contexto."""
+        with self._lock:
+            locks = dict(self._locks)
+        return {
+            "writing": [name for name, lock in locks.items() if lock.writing],
+            "readers": {name: lock.readers for name, lock in locks.items() if lock.readers},
+        }
+
+
+class AsyncRateLimiter:
+    """
+    Espaça o início de chamadas assíncronas (ex: requisições ao LLM) para
+    respeitar um limite de requisições por minuto.
+    """
+
+    def __init__(self, requests_per_minute: float = 0):
+        """
+        Inicializa o limitador.
+
+        Args:
+            requests_per_minute: Máximo de chamadas por minuto (0 = sem limite)
+        """
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_at = 0.0
+
+    async def acquire(self) -> None:
+        """Espera até a próxima chamada poder começar."""
+        if not self.interval:
+            return
+        # Sem await entre a leitura e a reserva do horário: seguro no event loop
+        now = time.monotonic()
+        start_at = max(now, self._next_at)
+        self._next_at = start_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import List, Optional, Dict
 from datetime import datetime
 
+from .vector_store import VectorStore
+
 
 class ContextManager:
     """Gerencia múltiplos contextos (ex: cond_169, cond_170)."""
@@ -21,8 +23,8 @@ class ContextManager:
         contexts = []
         for item in self.CONTEXTS_DIR.iterdir():
             if item.is_dir():
-                # Contexto válido se tem index.faiss OU metadata.json
-                has_index = (item / "index.faiss").exists()
+                # Contexto válido se tem índice gravado OU metadata.json
+                has_index = VectorStore.has_saved_index(str(item))
                 has_metadata = (item / "metadata.json").exists()
                 if has_index or has_metadata:
                     contexts.append(item.name)
@@ -74,7 +76,7 @@ class ContextManager:
     def has_index(self, context_name: str) -> bool:
         """Verifica se um contexto tem índice FAISS."""
         context_path = self.get_context_path(context_name)
-        return (context_path / "index.faiss").exists()
+        return VectorStore.has_saved_index(str(context_path))
 
     def get_context_metadata(self, context_name: str) -> Optional[Dict]:
         """Retorna metadados do contexto."""
@@ -115,6 +117,24 @@ class ContextManager:
         with open(metadata_file, "w", encoding="utf-8") as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
 
+    def set_index_settings(self, context_name: str, index_settings: Dict) -> None:
+        """
+        Define o tipo de índice FAISS do contexto (sobrescreve o [index] do config).
+
+        Args:
+            context_name: Nome do contexto
+            index_settings: Ex: {"type": "hnsw", "ef_search": 128}
+        """
+        metadata = self.get_context_metadata(context_name)
+        if metadata is None:
+            raise ValueError(f"Contexto '{context_name}' não existe.")
+
+        metadata["index"] = {**metadata.get("index", {}), **index_settings}
+
+        metadata_file = self.get_context_path(context_name) / "metadata.json"
+        with open(metadata_file, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
     def delete_context(self, context_name: str) -> bool:
         """Deleta um contexto completamente."""
         context_path = self.get_context_path(context_name)
@@ -188,8 +208,20 @@ class ContextManager:
             return False
 
         try:
-            # Remove arquivos de índice
-            index_files = ["index.faiss", "index.pkl"]
+            # Remove as gerações gravadas e arquivos de índice
+            for item in context_path.iterdir():
+                if item.is_dir() and item.name.startswith(VectorStore.GENERATION_PREFIX):
+                    shutil.rmtree(item)
+            index_files = [
+                VectorStore.CURRENT_FILE,
+                "index.faiss",
+                "index.pkl",
+                "index_ids.npy",
+                "chunks.sqlite",
+                "chunks.sqlite-wal",
+                "chunks.sqlite-shm",
+                "file_manifest.json",
+            ]
             for file_name in index_files:
                 file_path = context_path / file_name
                 if file_path.exists():
@@ -0,0 +1,252 @@
+"""Context Pool - Cache LRU em memória de contextos carregados (índice + RAG Chain)."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import toml
+
+from .rag_chain import RAGChain
+from .vector_store import VectorStore
+
+
+# Carrega um contexto do disco: (VectorStore, RAGChain ou None se não indexado)
+ContextLoader = Callable[[str], Tuple[VectorStore, Optional[RAGChain]]]
+
+
+class PooledContext:
+    """Contexto residente no pool."""
+
+    def __init__(self, name: str, vector_store: VectorStore, rag_chain: Optional[RAGChain] = None):
+        """
+        Inicializa a entrada.
+
+        Args:
+            name: Nome do contexto
+            vector_store: VectorStore do contexto (carregado ou vazio)
+            rag_chain: RAG Chain do contexto (None se ainda não indexado)
+        """
+        self.name = name
+        self.vector_store = vector_store
+        self.rag_chain = rag_chain
+        self.size_bytes = vector_store.memory_usage_bytes()
+        self.loaded_at = time.time()
+
+        # RAG Chains do contexto por provedor de LLM (compartilhados entre sessões)
+        self._chains: Dict[str, RAGChain] = {}
+        if rag_chain is not None:
+            self._chains[rag_chain.llm_provider] = rag_chain
+        self._chains_lock = threading.Lock()
+
+    def chain_for(self, provider: str, factory: Callable[[str], RAGChain]) -> Optional[RAGChain]:
+        """
+        Retorna o RAG Chain do contexto para o provedor de LLM informado.
+
+        Cada provedor tem seu próprio chain, então uma sessão que escolhe outro
+        LLM não troca o modelo das demais.
+
+        Args:
+            provider: Provedor do LLM ("openai" ou "anthropic")
+            factory: Cria o chain do provedor (chamado apenas na primeira vez)
+
+        Returns:
+            RAG Chain ou None se o contexto ainda não foi indexado
+        """
+        if self.rag_chain is None:
+            return None
+        with self._chains_lock:
+            chain = self._chains.get(provider)
+            if chain is None:
+                chain = self._chains[provider] = factory(provider)
+            return chain
+
+
+class ContextPool:
+    """
+    Mantém os contextos mais usados em memória.
+
+    Trocar de contexto no dropdown reaproveita o VectorStore e o RAGChain
+    já carregados em vez de reler o índice do disco. Os contextos menos
+    usados recentemente são descartados quando o pool passa do número máximo
+    de contextos ou do orçamento de memória (estimado pelo tamanho do índice
+    e dos textos).
+    """
+
+    def __init__(
+        self,
+        max_contexts: int = 8,
+        memory_budget_mb: float = 4096,
+        preload_contexts: Optional[List[str]] = None,
+    ):
+        """
+        Inicializa o pool.
+
+        Args:
+            max_contexts: Máximo de contextos residentes (0 = sem limite)
+            memory_budget_mb: Memória máxima estimada em MB (0 = sem limite)
+            preload_contexts: Contextos a carregar na inicialização (ver preload)
+        """
+        self.max_contexts = max_contexts
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.preload_contexts = list(preload_contexts or [])
+
+        self._entries: "OrderedDict[str, PooledContext]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Um lock de carregamento por contexto: ler um índice do disco não
+        # bloqueia o acesso aos contextos já residentes
+        self._loading: Dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, config_path: str = "config.toml") -> "ContextPool":
+        """
+        Cria ContextPool a partir de arquivo de configuração TOML.
+
+        Args:
+            config_path: Caminho para o arquivo config.toml
+
+        Returns:
+            Instância configurada do ContextPool
+        """
+        config = toml.load(config_path)
+        pool_config = config.get("context_pool", {})
+
+        return cls(
+            max_contexts=pool_config.get("max_contexts", 8),
+            memory_budget_mb=pool_config.get("memory_budget_mb", 4096),
+            preload_contexts=pool_config.get("preload", []),
+        )
+
+    def get(self, name: str) -> Optional[PooledContext]:
+        """Retorna o contexto se estiver residente (marcando-o como recente)."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+            return entry
+
+    def get_or_load(self, name: str, loader: ContextLoader) -> PooledContext:
+        """
+        Retorna o contexto do pool ou o carrega do disco.
+
+        Args:
+            name: Nome do contexto
+            loader: Função que carrega (VectorStore, RAGChain) do disco
+
+        Returns:
+            Contexto residente
+        """
+        with self._lock:
+            entry = self.get(name)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            # Outra sessão pode ter carregado o contexto enquanto esperávamos
+            with self._lock:
+                entry = self.get(name)
+                if entry is not None:
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            vector_store, rag_chain = loader(name)
+            return self.put(name, vector_store, rag_chain)
+
+    def put(
+        self,
+        name: str,
+        vector_store: VectorStore,
+        rag_chain: Optional[RAGChain] = None,
+    ) -> PooledContext:
+        """
+        Adiciona ou atualiza um contexto (ex: após indexar documentos).
+
+        Args:
+            name: Nome do contexto
+            vector_store: VectorStore do contexto
+            rag_chain: RAG Chain do contexto
+
+        Returns:
+            Entrada criada
+        """
+        with self._lock:
+            entry = PooledContext(name, vector_store, rag_chain)
+            self._entries[name] = entry
+            self._entries.move_to_end(name)
+            self._evict()
+            return entry
+
+    def invalidate(self, name: str) -> None:
+        """Remove um contexto do pool (ex: contexto apagado ou índice limpo)."""
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        """Remove todos os contextos (ex: troca do provider de embeddings)."""
+        with self._lock:
+            self._entries.clear()
+
+    def preload(self, names: Iterable[str], loader: ContextLoader) -> List[str]:
+        """
+        Carrega contextos antecipadamente (ex: na inicialização).
+
+        Args:
+            names: Contextos a carregar
+            loader: Função que carrega (VectorStore, RAGChain) do disco
+
+        Returns:
+            Contextos efetivamente carregados
+        """
+        loaded = []
+        for name in names:
+            try:
+                self.get_or_load(name, loader)
+                loaded.append(name)
+            except Exception as e:
+                print(f"Erro ao pré-carregar contexto '{name}': {e}")
+        return loaded
+
+    def _evict(self) -> None:
+        """Descarta os contextos menos usados até caber nos limites."""
+        # O contexto mais recente nunca é descartado, mesmo se sozinho passar do limite
+        while len(self._entries) > 1:
+            over_count = self.max_contexts and len(self._entries) > self.max_contexts
+            over_memory = self.memory_budget_bytes and self.memory_usage_bytes > self.memory_budget_bytes
+            if not (over_count or over_memory):
+                break
+
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        """Memória estimada dos contextos residentes."""
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    @property
+    def resident(self) -> List[str]:
+        """Contextos residentes, do menos ao mais recente."""
+        with self._lock:
+            return list(self._entries)
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de uso do pool."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "resident": list(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "memory_mb": round(self.memory_usage_bytes / (1024 * 1024), 1),
+                "memory_budget_mb": round(self.memory_budget_bytes / (1024 * 1024), 1),
+                "max_contexts": self.max_contexts,
+            }
@@ -0,0 +1,123 @@
+"""Diversity - Remoção de quase-duplicatas (SimHash) e MMR sobre os candidatos da busca."""
+
+import hashlib
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+
+# Palavras por shingle do SimHash
+SHINGLE_SIZE = 3
+SIGNATURE_BITS = 64
+
+_WORD_RE = re.compile(r"\w+")
+_BIT_POSITIONS = np.arange(SIGNATURE_BITS, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """
+    Assinatura SimHash de 64 bits do texto.
+
+    Textos quase iguais (mesma convenção em PDF e DOCX, revisões com poucas
+    palavras trocadas, OCR com ruído) têm assinaturas a poucos bits de
+    distância. Calculada na indexação e guardada nos metadados do chunk
+    ("simhash").
+
+    Args:
+        text: Texto do chunk
+
+    Returns:
+        Assinatura (inteiro sem sinal de 64 bits)
+    """
+    words = _WORD_RE.findall(text.casefold())
+    if not words:
+        return 0
+    shingles = [
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    ]
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    # Cada bit da assinatura é o voto da maioria dos shingles
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int((votes.astype(np.uint64) << _BIT_POSITIONS).sum())
+
+
+def hamming_distances(signatures: Sequence[int]) -> np.ndarray:
+    """Matriz de distâncias de Hamming entre todas as assinaturas."""
+    sig = np.asarray(signatures, dtype=np.uint64)
+    xor = sig[:, None] ^ sig[None, :]
+    return np.unpackbits(xor[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def unique_indices(signatures: Sequence[int], max_distance: int = 10) -> List[int]:
+    """
+    Posições mantidas após remover quase-duplicatas.
+
+    As assinaturas estão em ordem de relevância: de cada grupo de textos a
+    até ``max_distance`` bits uns dos outros fica o mais relevante.
+
+    Args:
+        signatures: Assinaturas SimHash dos candidatos
+        max_distance: Distância de Hamming máxima entre quase-duplicatas
+
+    Returns:
+        Posições mantidas, em ordem
+    """
+    if len(signatures) <= 1:
+        return list(range(len(signatures)))
+
+    close = hamming_distances(signatures) <= max_distance
+    kept: List[int] = []
+    for i in range(len(signatures)):
+        if not close[i, kept].any():
+            kept.append(i)
+    return kept
+
+
+def mmr(
+    relevance: Sequence[float],
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+) -> List[int]:
+    """
+    Maximal marginal relevance: escolhe ``k`` candidatos relevantes e pouco
+    parecidos entre si.
+
+    A cada passo entra o candidato com maior
+    ``lambda_mult * relevância - (1 - lambda_mult) * maior similaridade com os já escolhidos``.
+
+    Args:
+        relevance: Relevância de cada candidato (0 a 1)
+        vectors: Embeddings dos candidatos (uma linha por candidato)
+        k: Número de candidatos escolhidos
+        lambda_mult: Peso da relevância (1 = só relevância, 0 = só diversidade)
+
+    Returns:
+        Posições escolhidas, na ordem de escolha
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1.0)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        choice = int(np.argmax(scores))
+        selected.append(choice)
+        np.maximum(max_similarity, similarity[choice], out=max_similarity)
+    return selected
@@ -1,10 +1,14 @@
 """Document Loader - Carregamento de documentos multi-formato com OCR."""
 
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 import io
+import os
 
+import toml
 from langchain_core.documents import Document
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -22,6 +26,10 @@ except ImportError:
     OCR_AVAILABLE = False
 
 
+# Resultado de carregamento: (caminho, documentos, mensagem de erro ou None)
+LoadResult = Tuple[Path, List[Document], Optional[str]]
+
+
 class DocumentLoader:
     """Carrega documentos de diversos formatos com detecção automática."""
 
@@ -36,7 +44,30 @@ class DocumentLoader:
         ".markdown": "text",
     }
 
-    def __init__(self):
+    # Tentativas por tarefa quando um processo do pool morre
+    MAX_TASK_ATTEMPTS = 2
+
+    def __init__(
+        self,
+        workers: int = 1,
+        ocr_dpi: int = 200,
+        ocr_lang: str = "por+eng",
+        ocr_timeout: float = 0,
+    ):
+        """
+        Inicializa o loader.
+
+        Args:
+            workers: Processos para carregamento paralelo (1 = sequencial, 0 = nº de CPUs)
+            ocr_dpi: Resolução usada para converter páginas em imagem no OCR
+            ocr_lang: Idiomas do Tesseract
+            ocr_timeout: Tempo máximo de OCR por página em segundos (0 = sem limite)
+        """
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.ocr_dpi = ocr_dpi
+        self.ocr_lang = ocr_lang
+        self.ocr_timeout = ocr_timeout
+
         self._loaders = {
             "pdf": self._load_pdf,
             "docx": self._load_docx,
@@ -44,6 +75,27 @@ class DocumentLoader:
             "text": self._load_text,
         }
 
+    @classmethod
+    def from_config(cls, config_path: str = "config.toml") -> "DocumentLoader":
+        """
+        Cria DocumentLoader a partir de arquivo de configuração TOML.
+
+        Args:
+            config_path: Caminho para o arquivo config.toml
+
+        Returns:
+            Instância configurada do DocumentLoader
+        """
+        config = toml.load(config_path)
+        loading_config = config.get("loading", {})
+
+        return cls(
+            workers=loading_config.get("workers", 1),
+            ocr_dpi=loading_config.get("ocr_dpi", 200),
+            ocr_lang=loading_config.get("ocr_lang", "por+eng"),
+            ocr_timeout=loading_config.get("ocr_timeout", 0),
+        )
+
     def load(self, file_path: str | Path) -> List[Document]:
         """
         Carrega um documento e retorna lista de Documents do LangChain.
@@ -54,6 +106,16 @@ class DocumentLoader:
         Returns:
             Lista de Documents com conteúdo e metadados
         """
+        path = self._validate(file_path)
+        doc_type = self.SUPPORTED_EXTENSIONS[path.suffix.lower()]
+        loader_func = self._loaders[doc_type]
+
+        documents = loader_func(path)
+
+        return self._enrich(documents, path)
+
+    def _validate(self, file_path: str | Path) -> Path:
+        """Verifica se o arquivo existe e tem formato suportado."""
         path = Path(file_path)
 
         if not path.exists():
@@ -67,17 +129,15 @@ class DocumentLoader:
                 f"Formatos suportados: {list(self.SUPPORTED_EXTENSIONS.keys())}"
             )
 
-        doc_type = self.SUPPORTED_EXTENSIONS[extension]
-        loader_func = self._loaders[doc_type]
-
-        documents = loader_func(path)
+        return path
 
-        # Enriquece metadados
+    def _enrich(self, documents: List[Document], path: Path) -> List[Document]:
+        """Enriquece metadados dos documentos carregados."""
         for doc in documents:
             doc.metadata.update({
                 "source": str(path.name),
                 "file_path": str(path.absolute()),
-                "file_type": extension,
+                "file_type": path.suffix.lower(),
                 "loaded_at": datetime.now().isoformat(),
             })
 
@@ -86,7 +146,8 @@ class DocumentLoader:
     def load_directory(
         self,
         directory: str | Path,
-        recursive: bool = True
+        recursive: bool = True,
+        workers: Optional[int] = None,
     ) -> List[Document]:
         """
         Carrega todos os documentos de um diretório.
@@ -94,27 +155,236 @@ class DocumentLoader:
         Args:
             directory: Caminho para o diretório
             recursive: Se True, busca em subdiretórios
+            workers: Processos para carregamento paralelo (padrão: self.workers)
 
         Returns:
             Lista de Documents de todos os arquivos
         """
+        all_documents = []
+
+        file_paths = self.list_files(directory, recursive=recursive)
+        for file_path, docs, error in self.iter_load(file_paths, workers=workers):
+            if error:
+                print(f"Erro ao carregar {file_path}: {error}")
+            all_documents.extend(docs)
+
+        return all_documents
+
+    def iter_directory(
+        self,
+        directory: str | Path,
+        recursive: bool = True,
+        workers: Optional[int] = None,
+    ) -> Iterator[LoadResult]:
+        """
+        Carrega os arquivos de um diretório sob demanda, um arquivo por vez.
+
+        Args:
+            directory: Caminho para o diretório
+            recursive: Se True, busca em subdiretórios
+            workers: Processos para carregamento paralelo (padrão: self.workers)
+
+        Yields:
+            Tuplas (caminho, documentos, erro) em ordem de conclusão
+        """
+        yield from self.iter_load(self.iter_files(directory, recursive=recursive), workers=workers)
+
+    def list_files(
+        self,
+        directory: str | Path,
+        recursive: bool = True
+    ) -> List[Path]:
+        """
+        Lista os arquivos suportados de um diretório (sem carregá-los).
+
+        Args:
+            directory: Caminho para o diretório
+            recursive: Se True, busca em subdiretórios
+
+        Returns:
+            Lista de caminhos de arquivos suportados
+        """
+        return sorted(self.iter_files(directory, recursive=recursive))
+
+    def iter_files(
+        self,
+        directory: str | Path,
+        recursive: bool = True
+    ) -> Iterator[Path]:
+        """
+        Percorre os arquivos suportados de um diretório sob demanda.
+
+        Args:
+            directory: Caminho para o diretório
+            recursive: Se True, busca em subdiretórios
+
+        Yields:
+            Caminhos de arquivos suportados
+        """
         dir_path = Path(directory)
 
         if not dir_path.is_dir():
             raise NotADirectoryError(f"Não é um diretório: {directory}")
 
-        all_documents = []
         pattern = "**/*" if recursive else "*"
 
         for file_path in dir_path.glob(pattern):
             if file_path.is_file() and file_path.suffix.lower() in self.SUPPORTED_EXTENSIONS:
+                yield file_path
+
+    def iter_load(
+        self,
+        file_paths: Iterable[str | Path],
+        workers: Optional[int] = None,
+    ) -> Iterator[LoadResult]:
+        """
+        Carrega vários arquivos, entregando cada um assim que termina.
+
+        Com mais de um worker, o parsing roda em um pool de processos e o OCR
+        de PDFs digitalizados é distribuído por página. Erros de um arquivo
+        são devolvidos no resultado e não interrompem os demais.
+
+        Args:
+            file_paths: Caminhos dos arquivos
+            workers: Processos para carregamento paralelo (padrão: self.workers)
+
+        Yields:
+            Tuplas (caminho, documentos, erro) em ordem de conclusão
+        """
+        workers = workers or self.workers
+
+        if workers <= 1:
+            for file_path in file_paths:
+                path = Path(file_path)
                 try:
-                    docs = self.load(file_path)
-                    all_documents.extend(docs)
+                    yield path, self.load(path), None
                 except Exception as e:
-                    print(f"Erro ao carregar {file_path}: {e}")
+                    yield path, [], str(e)
+            return
 
-        return all_documents
+        yield from self._iter_load_parallel(file_paths, workers)
+
+    def _iter_load_parallel(
+        self,
+        file_paths: Iterable[str | Path],
+        workers: int,
+    ) -> Iterator[LoadResult]:
+        """Carregamento paralelo em pool de processos (ver iter_load)."""
+        paths = iter(file_paths)
+        # Limita arquivos em andamento para não ler a pasta inteira de uma vez
+        max_files_in_flight = workers * 2
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+        pending = {}   # future -> tarefa (kind, path, page)
+        attempts = {}  # tarefa -> nº de tentativas
+        ocr_jobs = {}  # path -> {"remaining": int, "pages": {page: Document}, "fallback": docs}
+        files_in_flight = 0
+
+        def submit(task):
+            kind, path, page = task
+            attempts[task] = attempts.get(task, 0) + 1
+            if kind == "file":
+                future = pool.submit(_load_file_task, self._task_options(), str(path))
+            else:
+                future = pool.submit(
+                    _ocr_page_task, str(path), page, self.ocr_dpi, self.ocr_lang, self.ocr_timeout,
+                )
+            pending[future] = task
+
+        def fill():
+            nonlocal files_in_flight
+            while files_in_flight < max_files_in_flight:
+                path = next(paths, None)
+                if path is None:
+                    return
+                submit(("file", Path(path), None))
+                files_in_flight += 1
+
+        def finish_ocr(path):
+            job = ocr_jobs.pop(path)
+            documents = [job["pages"][page] for page in sorted(job["pages"])]
+            return path, self._enrich(documents or job["fallback"], path), None
+
+        try:
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = []
+
+                for future in done:
+                    task = pending.pop(future)
+                    kind, path, page = task
+
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken.append(task)
+                        continue
+                    except Exception as e:
+                        result = e
+
+                    if kind == "file":
+                        if isinstance(result, Exception):
+                            files_in_flight -= 1
+                            yield path, [], str(result)
+                        elif "ocr_pages" in result:
+                            # PDF digitalizado: OCR de cada página como tarefa separada
+                            ocr_jobs[path] = {
+                                "remaining": result["ocr_pages"],
+                                "pages": {},
+                                "fallback": result["documents"],
+                            }
+                            for page_number in range(result["ocr_pages"]):
+                                submit(("ocr", path, page_number))
+                            if not result["ocr_pages"]:
+                                files_in_flight -= 1
+                                yield finish_ocr(path)
+                        else:
+                            files_in_flight -= 1
+                            yield path, result["documents"], None
+                    else:
+                        job = ocr_jobs[path]
+                        job["remaining"] -= 1
+                        if isinstance(result, Document):
+                            job["pages"][page] = result
+                        elif isinstance(result, Exception):
+                            print(f"Erro no OCR de {path} (página {page + 1}): {result}")
+                        if job["remaining"] == 0:
+                            files_in_flight -= 1
+                            yield finish_ocr(path)
+
+                if broken:
+                    # Um processo morreu: recria o pool e reenvia as tarefas afetadas
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    retry = broken + list(pending.values())
+                    pending.clear()
+
+                    for task in retry:
+                        kind, path, page = task
+                        if attempts.get(task, 0) < self.MAX_TASK_ATTEMPTS:
+                            submit(task)
+                        elif kind == "file":
+                            files_in_flight -= 1
+                            yield path, [], "Processo de carregamento encerrado inesperadamente"
+                        else:
+                            job = ocr_jobs[path]
+                            job["remaining"] -= 1
+                            if job["remaining"] == 0:
+                                files_in_flight -= 1
+                                yield finish_ocr(path)
+
+                fill()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _task_options(self) -> dict:
+        """Opções do loader repassadas aos processos do pool."""
+        return {
+            "ocr_dpi": self.ocr_dpi,
+            "ocr_lang": self.ocr_lang,
+            "ocr_timeout": self.ocr_timeout,
+        }
 
     def _load_pdf(self, path: Path) -> List[Document]:
         """Carrega arquivo PDF com fallback para OCR se necessário."""
@@ -122,17 +392,20 @@ class DocumentLoader:
         loader = PyPDFLoader(str(path))
         documents = loader.load()
 
-        # Verifica se extraiu texto
-        total_text = sum(len(doc.page_content.strip()) for doc in documents)
-
         # Se tem pouco texto, tenta OCR
-        if total_text < 50 and OCR_AVAILABLE:
+        if self._needs_ocr(documents):
             ocr_documents = self._load_pdf_with_ocr(path)
             if ocr_documents:
                 return ocr_documents
 
         return documents
 
+    @staticmethod
+    def _needs_ocr(documents: List[Document]) -> bool:
+        """Verifica se o PDF extraiu pouco texto e o OCR está disponível."""
+        total_text = sum(len(doc.page_content.strip()) for doc in documents)
+        return total_text < 50 and OCR_AVAILABLE
+
     def _load_pdf_with_ocr(self, path: Path) -> List[Document]:
         """Carrega PDF usando OCR (para PDFs digitalizados)."""
         if not OCR_AVAILABLE:
@@ -140,22 +413,12 @@ class DocumentLoader:
 
         try:
             # Converte PDF para imagens
-            images = convert_from_path(str(path), dpi=200)
+            images = convert_from_path(str(path), dpi=self.ocr_dpi)
 
             documents = []
             for i, image in enumerate(images):
-                # Extrai texto da imagem usando Tesseract
-                text = pytesseract.image_to_string(image, lang='por+eng')
-
-                if text.strip():
-                    doc = Document(
-                        page_content=text,
-                        metadata={
-                            "page": i,
-                            "source": str(path.name),
-                            "extraction_method": "ocr",
-                        }
-                    )
+                doc = self._ocr_image(image, path, i)
+                if doc is not None:
                     documents.append(doc)
 
             return documents
@@ -164,6 +427,26 @@ class DocumentLoader:
             print(f"Erro no OCR de {path}: {e}")
             return []
 
+    def _ocr_image(self, image, path: Path, page: int) -> Optional[Document]:
+        """Extrai texto de uma página (imagem) usando Tesseract."""
+        text = pytesseract.image_to_string(
+            image,
+            lang=self.ocr_lang,
+            timeout=self.ocr_timeout,
+        )
+
+        if not text.strip():
+            return None
+
+        return Document(
+            page_content=text,
+            metadata={
+                "page": page,
+                "source": str(path.name),
+                "extraction_method": "ocr",
+            }
+        )
+
     def _load_docx(self, path: Path) -> List[Document]:
         """Carrega arquivo DOCX/DOC."""
         loader = Docx2txtLoader(str(path))
@@ -183,3 +466,36 @@ class DocumentLoader:
     def get_supported_formats(cls) -> List[str]:
         """Retorna lista de extensões suportadas."""
         return list(cls.SUPPORTED_EXTENSIONS.keys())
+
+
+# ============================================================================
+# Tarefas executadas nos processos do pool (precisam ser funções de módulo)
+# ============================================================================
+
+def _load_file_task(options: dict, file_path: str) -> dict:
+    """Carrega um arquivo; PDFs sem texto retornam o nº de páginas para OCR."""
+    loader = DocumentLoader(**options)
+    path = loader._validate(file_path)
+
+    if path.suffix.lower() == ".pdf":
+        documents = PyPDFLoader(str(path)).load()
+        if loader._needs_ocr(documents):
+            return {"ocr_pages": len(documents), "documents": documents}
+        return {"documents": loader._enrich(documents, path)}
+
+    return {"documents": loader.load(path)}
+
+
+def _ocr_page_task(
+    file_path: str,
+    page: int,
+    dpi: int,
+    lang: str,
+    timeout: float,
+) -> Optional[Document]:
+    """Executa OCR de uma única página de um PDF."""
+    loader = DocumentLoader(ocr_dpi=dpi, ocr_lang=lang, ocr_timeout=timeout)
+    images = convert_from_path(file_path, dpi=dpi, first_page=page + 1, last_page=page + 1)
+    if not images:
+        return None
+    return loader._ocr_image(images[0], Path(file_path), page)
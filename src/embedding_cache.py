@@ -0,0 +1,357 @@
+"""Embedding Cache - Cache persistente de embeddings endereçado por conteúdo."""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    Armazena vetores de embeddings em disco (SQLite, float32 compacto).
+
+    A chave é o hash de (provider, modelo, texto normalizado), então o mesmo
+    chunk indexado em contextos diferentes ou re-indexado não gera uma nova
+    chamada ao provedor. Entradas menos usadas são removidas (LRU) quando o
+    cache ultrapassa o limite de entradas ou de tamanho.
+
+    O número de entradas e o tamanho total são mantidos em memória (contados
+    uma vez ao abrir o arquivo), e os acessos das leituras são acumulados e
+    gravados em lote, então consultas ao cache não escrevem no disco.
+    """
+
+    DEFAULT_PATH = "data/embedding_cache/embeddings.sqlite"
+    # Acessos acumulados antes de gravar last_access (ordem do LRU)
+    ACCESS_FLUSH_SIZE = 1000
+    ACCESS_FLUSH_SECONDS = 30.0
+
+    # Instâncias compartilhadas por caminho (uma conexão por arquivo)
+    _shared: Dict[str, "EmbeddingCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        max_entries: int = 500_000,
+        max_size_mb: float = 2048,
+    ):
+        """
+        Inicializa o cache.
+
+        Args:
+            path: Caminho do arquivo SQLite
+            max_entries: Número máximo de vetores armazenados (0 = sem limite)
+            max_size_mb: Tamanho máximo dos vetores em MB (0 = sem limite)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+        self.evictions = 0
+        self._entries, self._bytes = self._count()
+        # Chave -> último acesso ainda não gravado
+        self._pending_access: Dict[bytes, float] = {}
+        self._last_access_flush = time.monotonic()
+
+    @classmethod
+    def shared(cls, path: str = DEFAULT_PATH, **kwargs) -> "EmbeddingCache":
+        """Retorna uma instância compartilhada para o caminho informado."""
+        resolved = str(Path(path).resolve())
+        with cls._shared_lock:
+            if resolved not in cls._shared:
+                cls._shared[resolved] = cls(path, **kwargs)
+            return cls._shared[resolved]
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normaliza texto (Unicode NFC e espaços) antes do hash."""
+        text = unicodedata.normalize("NFC", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    @classmethod
+    def make_key(cls, provider: str, model: str, text: str) -> bytes:
+        """Gera a chave (sha256) para um texto em um provider/modelo."""
+        payload = f"{provider}\0{model}\0{cls.normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Busca vetores no cache.
+
+        Args:
+            keys: Chaves geradas por make_key
+
+        Returns:
+            Dicionário chave -> vetor float32 (apenas as encontradas)
+        """
+        found: Dict[bytes, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return found
+
+        with self._lock:
+            # SQLite limita o número de parâmetros por consulta
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._pending_access.update((key, now) for key in found)
+                if (
+                    len(self._pending_access) >= self.ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_access_flush >= self.ACCESS_FLUSH_SECONDS
+                ):
+                    self._write_access()
+                    self._conn.commit()
+
+        return found
+
+    def _count(self) -> tuple:
+        """Conta entradas e bytes dos vetores (varre a tabela)."""
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        return count, total_bytes
+
+    def _write_access(self) -> None:
+        """Grava os acessos acumulados (sem commit)."""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(access, key) for key, access in self._pending_access.items()],
+            )
+            self._pending_access = {}
+        self._last_access_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Grava os acessos pendentes (ordem do LRU) no disco."""
+        with self._lock:
+            self._write_access()
+            self._conn.commit()
+
+    def put_many(self, items: Dict[bytes, List[float]]) -> None:
+        """
+        Armazena vetores no cache.
+
+        Args:
+            items: Dicionário chave -> vetor
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+
+        with self._lock:
+            # Vetores substituídos não contam duas vezes
+            replaced_entries, replaced_bytes = 0, 0
+            keys = [row[0] for row in rows]
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                count, size = self._conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchone()
+                replaced_entries += count
+                replaced_bytes += size
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._entries += len(rows) - replaced_entries
+            self._bytes += sum(len(row[1]) for row in rows) - replaced_bytes
+            self._write_access()
+            self._conn.commit()
+            self._evict_if_needed()
+
+    def _evict_if_needed(self) -> None:
+        """Remove as entradas menos usadas se os limites forem ultrapassados."""
+        count, total_bytes = self._entries, self._bytes
+
+        over_entries = self.max_entries and count > self.max_entries
+        over_bytes = self.max_bytes and total_bytes > self.max_bytes
+        if not (over_entries or over_bytes):
+            return
+
+        # Remove até 90% do limite para não despejar a cada inserção
+        to_remove = 0
+        if over_entries:
+            to_remove = count - int(self.max_entries * 0.9)
+        if over_bytes and count:
+            avg_size = total_bytes / count
+            to_remove = max(to_remove, int((total_bytes - self.max_bytes * 0.9) / avg_size) + 1)
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (to_remove,),
+        )
+        self._conn.commit()
+        self.evictions += to_remove
+        # Recontagem rara (só ao despejar): corrige escritas de outros processos
+        self._entries, self._bytes = self._count()
+
+    def clear(self) -> None:
+        """Remove todas as entradas do cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._pending_access = {}
+            self._entries, self._bytes = 0, 0
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de ocupação do cache."""
+        with self._lock:
+            count, total_bytes = self._entries, self._bytes
+
+        return {
+            "path": self.path,
+            "entries": count,
+            "size_mb": round(total_bytes / (1024 * 1024), 2),
+            "evictions": self.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper de Embeddings do LangChain que consulta o EmbeddingCache.
+
+    Pode ser passado diretamente ao FAISS/VectorStore: apenas os textos
+    ausentes do cache são enviados ao provedor.
+    """
+
+    def __init__(
+        self,
+        wrapped: Embeddings,
+        cache: EmbeddingCache,
+        provider: str,
+        model: str,
+    ):
+        """
+        Inicializa o wrapper.
+
+        Args:
+            wrapped: Embeddings original (OpenAI, Ollama...)
+            cache: Cache persistente
+            provider: Nome do provedor (parte da chave)
+            model: Nome do modelo (parte da chave)
+        """
+        self.wrapped = wrapped
+        self.cache = cache
+        self.provider = provider
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, texts: List[str]):
+        """Separa textos em acertos e faltas do cache."""
+        keys = [EmbeddingCache.make_key(self.provider, self.model, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        # Textos repetidos no mesmo lote são enviados apenas uma vez
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        hit_count = sum(1 for key in keys if key in found)
+        self.hits += hit_count
+        self.misses += len(texts) - hit_count
+        return keys, found, missing
+
+    def _store(self, found: Dict, missing: Dict[bytes, str], vectors: List[List[float]]) -> None:
+        """Grava os vetores recém-gerados no cache."""
+        new_items = dict(zip(missing.keys(), vectors))
+        self.cache.put_many(new_items)
+        for key, vector in new_items.items():
+            found[key] = np.asarray(vector, dtype=np.float32)
+
+    @property
+    def returns_arrays(self) -> bool:
+        """True se embed_documents retorna np.ndarray (provedor local)."""
+        return getattr(self.wrapped, "returns_arrays", False)
+
+    def _result(self, keys: List[bytes], found: Dict) -> List[List[float]]:
+        """Vetores na ordem dos textos (matriz NumPy se o provedor for local)."""
+        if self.returns_arrays and keys:
+            return np.vstack([found[key] for key in keys])
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings usando o cache para textos já conhecidos."""
+        keys, found, missing = self._lookup(texts)
+
+        if missing:
+            vectors = self.wrapped.embed_documents(list(missing.values()))
+            self._store(found, missing, vectors)
+
+        return self._result(keys, found)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_documents."""
+        keys, found, missing = self._lookup(texts)
+
+        if missing:
+            vectors = await self.wrapped.aembed_documents(list(missing.values()))
+            self._store(found, missing, vectors)
+
+        return self._result(keys, found)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeddings de queries não passam pelo cache persistente."""
+        return self.wrapped.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versão assíncrona de embed_query."""
+        return await self.wrapped.aembed_query(text)
+
+    @property
+    def hit_rate(self) -> float:
+        """Taxa de acerto desde a criação do wrapper."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_cache_stats(self) -> dict:
+        """Retorna estatísticas de acerto e ocupação do cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            **self.cache.get_stats(),
+        }
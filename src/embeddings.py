@@ -1,32 +1,271 @@
 """Embeddings Manager - Wrapper para geração de embeddings."""
 
+import asyncio
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
+import numpy as np
 import toml
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.embeddings import Embeddings
 
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .local_embeddings import OnnxEmbeddings
+from .model_registry import EmbeddingModelInfo, EmbeddingModelRegistry
+
+
+class EmbeddingMetrics:
+    """Contadores de latência e vazão das chamadas de embeddings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.retries = 0
+        self.errors = 0
+        self.total_batch_latency = 0.0
+        self.last_batch_latency = 0.0
+        self.total_call_time = 0.0
+
+    def record_batch(self, num_texts: int, latency: float) -> None:
+        """Registra um lote concluído."""
+        with self._lock:
+            self.batches += 1
+            self.texts += num_texts
+            self.total_batch_latency += latency
+            self.last_batch_latency = latency
+
+    def record_retry(self) -> None:
+        """Registra uma nova tentativa após erro transitório."""
+        with self._lock:
+            self.retries += 1
+
+    def record_error(self) -> None:
+        """Registra um lote que falhou definitivamente."""
+        with self._lock:
+            self.errors += 1
+
+    def record_call(self, elapsed: float) -> None:
+        """Registra o tempo total de uma chamada (vários lotes em paralelo)."""
+        with self._lock:
+            self.total_call_time += elapsed
+
+    def get_stats(self) -> dict:
+        """Retorna os contadores e médias."""
+        with self._lock:
+            avg_latency = self.total_batch_latency / self.batches if self.batches else 0.0
+            throughput = self.texts / self.total_call_time if self.total_call_time else 0.0
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "retries": self.retries,
+                "errors": self.errors,
+                "avg_batch_latency_ms": round(avg_latency * 1000, 1),
+                "last_batch_latency_ms": round(self.last_batch_latency * 1000, 1),
+                "throughput_texts_per_s": round(throughput, 1),
+            }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Wrapper de Embeddings que divide textos em lotes e mantém vários em andamento.
+
+    Erros transitórios (HTTP 429/5xx, conexão) são repetidos com backoff
+    exponencial. Latência por lote e vazão ficam disponíveis em ``metrics``.
+    """
+
+    def __init__(
+        self,
+        wrapped: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Inicializa o wrapper.
+
+        Args:
+            wrapped: Embeddings original (OpenAI, Ollama...)
+            batch_size: Textos por requisição
+            max_concurrency: Máximo de requisições simultâneas
+            max_retries: Tentativas extras em erros transitórios
+            retry_backoff: Espera inicial (segundos) antes de repetir
+            max_backoff: Espera máxima (segundos) entre tentativas
+        """
+        self.wrapped = wrapped
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.metrics = EmbeddingMetrics()
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Verifica se o erro é transitório (429, 5xx ou falha de conexão)."""
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(status, int):
+            return status == 429 or status >= 500
+
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        name = type(error).__name__
+        return "Connection" in name or "Timeout" in name
+
+    def _backoff(self, attempt: int) -> float:
+        """Tempo de espera para a tentativa (exponencial com jitter)."""
+        delay = min(self.max_backoff, self.retry_backoff * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    @property
+    def returns_arrays(self) -> bool:
+        """True se o provedor retorna np.ndarray (lotes são unidos sem virar listas)."""
+        return getattr(self.wrapped, "returns_arrays", False)
+
+    def _merge(self, results: list) -> List[List[float]]:
+        """Une os vetores dos lotes na ordem original."""
+        if self.returns_arrays:
+            return np.vstack(results)
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Envia um lote com retry/backoff."""
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                vectors = self.wrapped.embed_documents(batch)
+            except Exception as e:
+                if attempt < self.max_retries and self.is_retryable(e):
+                    self.metrics.record_retry()
+                    time.sleep(self._backoff(attempt))
+                    continue
+                self.metrics.record_error()
+                raise
+            self.metrics.record_batch(len(batch), time.perf_counter() - start)
+            return vectors
+
+    async def _aembed_batch(self, batch: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """Versão assíncrona de _embed_batch."""
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    vectors = await self.wrapped.aembed_documents(batch)
+                except Exception as e:
+                    if attempt < self.max_retries and self.is_retryable(e):
+                        self.metrics.record_retry()
+                        await asyncio.sleep(self._backoff(attempt))
+                        continue
+                    self.metrics.record_error()
+                    raise
+                self.metrics.record_batch(len(batch), time.perf_counter() - start)
+                return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings em lotes, com até max_concurrency lotes simultâneos."""
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        batches = self._batches(texts)
+
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+
+        self.metrics.record_call(time.perf_counter() - start)
+        return self._merge(results)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings de forma assíncrona mantendo vários lotes em andamento."""
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(
+            self._aembed_batch(batch, semaphore) for batch in self._batches(texts)
+        ))
+
+        self.metrics.record_call(time.perf_counter() - start)
+        return self._merge(results)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera embedding de uma query (com retry)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.wrapped.embed_query(text)
+            except Exception as e:
+                if attempt < self.max_retries and self.is_retryable(e):
+                    self.metrics.record_retry()
+                    time.sleep(self._backoff(attempt))
+                    continue
+                raise
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versão assíncrona de embed_query."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.wrapped.aembed_query(text)
+            except Exception as e:
+                if attempt < self.max_retries and self.is_retryable(e):
+                    self.metrics.record_retry()
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                raise
+
 
 class EmbeddingsManager:
     """Gerencia a geração de embeddings para documentos e queries."""
 
+    # Textos por chamada ao modelo local (ele mesmo agrupa em lotes por tamanho)
+    LOCAL_CALL_SIZE = 1024
+
     def __init__(
         self,
         provider: str = "openai",
         model: str = "text-embedding-3-small",
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        local_model_path: Optional[str] = None,
+        local_max_length: int = 8192,
+        local_threads: int = 0,
     ):
         """
         Inicializa o gerenciador de embeddings.
 
         Args:
-            provider: Provedor de embeddings ("openai", "ollama")
+            provider: Provedor de embeddings ("openai", "ollama", "local")
             model: Nome do modelo de embeddings
             api_key: API key (opcional, usa variável de ambiente se não fornecida)
             base_url: Base URL para Ollama (opcional, padrão: http://localhost:11434)
+            cache: Cache persistente de embeddings (opcional)
+            batch_size: Textos por requisição ao provedor
+            max_concurrency: Máximo de requisições simultâneas
+            max_retries: Tentativas extras em erros 429/5xx/conexão
+            retry_backoff: Espera inicial (segundos) do backoff exponencial
+            local_model_path: Pasta do modelo ONNX (provider "local")
+            local_max_length: Máximo de tokens por texto (provider "local")
+            local_threads: Threads intra-op do ONNX Runtime (0 = todos os núcleos)
         """
         self.provider = provider
         self.model = model
@@ -48,9 +287,42 @@ class EmbeddingsManager:
                 num_ctx=8192,  # Contexto maior para chunks longos
                 # mirostat=2 melhora qualidade dos embeddings
             )
+        elif provider == "local":
+            # Modelo no próprio processo (ONNX Runtime): sem HTTP, vetores em NumPy
+            self._embeddings = OnnxEmbeddings(
+                model_path=local_model_path or f"models/{model}",
+                model=model,
+                max_length=local_max_length,
+                batch_size=batch_size,
+                threads=local_threads,
+            )
+            # Lotes por tamanho e threads ficam dentro do modelo; não há o que repetir
+            batch_size = self.LOCAL_CALL_SIZE
+            max_concurrency = 1
+            max_retries = 0
         else:
             raise ValueError(f"Provedor não suportado: {provider}")
 
+        # Lotes, concorrência e retry ficam abaixo do cache:
+        # só textos ausentes do cache viram requisições
+        self._batched = BatchedEmbeddings(
+            self._embeddings,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+        )
+        self._embeddings = self._batched
+
+        # Cache de embeddings é transparente para FAISS/VectorStore
+        if cache is not None:
+            self._embeddings = CachedEmbeddings(
+                self._embeddings,
+                cache=cache,
+                provider=provider,
+                model=model,
+            )
+
     @classmethod
     def from_config(cls, config_path: str = "config.toml", override_provider: Optional[str] = None) -> "EmbeddingsManager":
         """
@@ -58,7 +330,7 @@ class EmbeddingsManager:
 
         Args:
             config_path: Caminho para o arquivo config.toml
-            override_provider: Substitui o provider do config.toml ("openai" ou "ollama")
+            override_provider: Substitui o provider do config.toml ("openai", "ollama" ou "local")
 
         Returns:
             Instância configurada do EmbeddingsManager
@@ -70,15 +342,39 @@ class EmbeddingsManager:
         provider = override_provider or embeddings_config.get("provider", "openai")
         
         # Ajusta modelo baseado no provider
+        local_config = embeddings_config.get("local", {})
         if provider == "ollama":
             model = embeddings_config.get("model", "bge-m3")
+        elif provider == "local":
+            model = local_config.get("model", "bge-m3")
         else:
             model = embeddings_config.get("model", "text-embedding-3-small")
 
+        # Cache compartilhado entre contextos e re-indexações
+        cache = None
+        cache_config = embeddings_config.get("cache", {})
+        if cache_config.get("enabled", False):
+            cache = EmbeddingCache.shared(
+                path=cache_config.get("path", EmbeddingCache.DEFAULT_PATH),
+                max_entries=cache_config.get("max_entries", 500_000),
+                max_size_mb=cache_config.get("max_size_mb", 2048),
+            )
+
         return cls(
             provider=provider,
             model=model,
             base_url=embeddings_config.get("base_url"),
+            cache=cache,
+            batch_size=(
+                local_config.get("batch_size", 16) if provider == "local"
+                else embeddings_config.get("batch_size", 64)
+            ),
+            max_concurrency=embeddings_config.get("max_concurrency", 4),
+            max_retries=embeddings_config.get("max_retries", 3),
+            retry_backoff=embeddings_config.get("retry_backoff", 0.5),
+            local_model_path=local_config.get("model_path"),
+            local_max_length=local_config.get("max_length", 8192),
+            local_threads=local_config.get("threads", 0),
         )
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -93,6 +389,18 @@ class EmbeddingsManager:
         """
         return self._embeddings.embed_documents(texts)
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings de forma assíncrona, com vários lotes em andamento.
+
+        Args:
+            texts: Lista de textos para gerar embeddings
+
+        Returns:
+            Lista de vetores de embeddings
+        """
+        return await self._embeddings.aembed_documents(texts)
+
     def embed_query(self, text: str) -> List[float]:
         """
         Gera embedding para uma query.
@@ -110,21 +418,43 @@ class EmbeddingsManager:
         """Retorna o objeto de embeddings do LangChain."""
         return self._embeddings
 
+    def get_metrics(self) -> dict:
+        """Retorna latência por lote e vazão das requisições de embeddings."""
+        return self._batched.metrics.get_stats()
+
+    def get_cache_stats(self) -> Optional[dict]:
+        """Retorna estatísticas do cache de embeddings (None se desativado)."""
+        if isinstance(self._embeddings, CachedEmbeddings):
+            return self._embeddings.get_cache_stats()
+        return None
+
     def get_info(self) -> dict:
         """Retorna informações sobre o modelo de embeddings."""
+        model_info = self.get_model_info()
         return {
             "provider": self.provider,
             "model": self.model,
-            "dimensions": self.get_dimensions(),
+            "dimensions": model_info.dimensions,
+            "max_tokens": model_info.max_tokens,
+            "normalized": model_info.normalized,
+            "cache": self.get_cache_stats(),
+            "metrics": self.get_metrics(),
         }
-    
+
+    def get_model_info(self) -> EmbeddingModelInfo:
+        """
+        Dimensões, contexto máximo e normalização do modelo.
+
+        Vêm do registro de modelos conhecidos; um modelo desconhecido gera um
+        único embedding de teste, guardado para o resto do processo.
+        """
+        return EmbeddingModelRegistry.resolve(self.model, self.embed_query)
+
     def get_dimensions(self) -> int:
         """
         Retorna o número de dimensões dos embeddings.
-        
+
         Returns:
             Número de dimensões do vetor de embedding
         """
-        # Gera um embedding de teste para descobrir dimensões
-        test_embedding = self.embed_query("test")
-        return len(test_embedding)
+        return self.get_model_info().dimensions
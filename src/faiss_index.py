@@ -0,0 +1,514 @@
+"""FAISS Index - Tipos de índice (flat, HNSW, IVF-PQ), codecs e utilitários de construção."""
+
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+import toml
+
+
+class IndexSettings:
+    """
+    Configuração do tipo de índice FAISS de um contexto.
+
+    - ``flat``: busca exata (padrão), latência cresce linearmente com o nº de chunks
+    - ``hnsw``: grafo HNSW, busca aproximada rápida (M e efSearch ajustáveis)
+    - ``ivfpq``: IVF com Product Quantization, menor memória (requer treino)
+
+    Os vetores dos índices flat e HNSW podem ser guardados comprimidos
+    (``codec``): ``fp16`` usa metade da memória do float32 praticamente sem
+    perda de recall; ``sq8`` (quantização escalar de 8 bits) usa um quarto.
+    Opcionalmente a dimensão é reduzida antes da indexação (``reduce_dim``):
+    por PCA treinada nos vetores do contexto ou por truncamento
+    (modelos Matryoshka, ex: text-embedding-3-*). Em ambos os casos os
+    vetores reduzidos são renormalizados.
+    """
+
+    INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+    CODECS = ("float32", "fp16", "sq8")
+    REDUCTIONS = ("pca", "truncate")
+
+    # Descrição do armazenamento de cada codec no faiss.index_factory
+    _CODEC_FACTORY = {"float32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+
+    # PQ de 8 bits usa 256 centroides por subquantizador
+    _PQ_CENTROIDS = 256
+    # Pontos de treino recomendados pelo FAISS por centroide
+    _POINTS_PER_CENTROID = 39
+    # Pontos de treino da PCA por dimensão mantida
+    _PCA_POINTS_PER_DIM = 10
+
+    def __init__(
+        self,
+        index_type: str = "flat",
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        ef_search: int = 64,
+        ivf_nlist: int = 0,
+        pq_m: int = 0,
+        nprobe: int = 16,
+        train_sample: int = 100_000,
+        promote_threshold: int = 0,
+        promote_to: str = "hnsw",
+        min_recall: float = 0.9,
+        mmap: bool = False,
+        codec: str = "float32",
+        reduce_dim: int = 0,
+        reduction: str = "pca",
+    ):
+        """
+        Inicializa a configuração.
+
+        Args:
+            index_type: "flat", "hnsw" ou "ivfpq"
+            hnsw_m: Vizinhos por nó no grafo HNSW
+            ef_construction: Largura da busca na construção do HNSW
+            ef_search: Largura da busca na consulta do HNSW
+            ivf_nlist: Nº de listas do IVF (0 = automático, ~4·√N)
+            pq_m: Subquantizadores do PQ (0 = automático, dim/16)
+            nprobe: Listas visitadas por consulta no IVF
+            train_sample: Máximo de vetores usados no treino do IVF-PQ
+            promote_threshold: Nº de chunks para promover flat → ANN (0 = nunca)
+            promote_to: Tipo de índice usado na promoção automática
+            min_recall: Recall@10 mínimo (vs. flat) para aceitar a promoção
+            mmap: Carrega o índice mapeado em memória, somente leitura
+                (páginas do cache do SO compartilhadas entre processos)
+            codec: Armazenamento dos vetores no flat/HNSW: "float32", "fp16" ou "sq8"
+            reduce_dim: Dimensão após a redução (0 = sem redução)
+            reduction: "pca" (requer treino) ou "truncate" (modelos Matryoshka)
+        """
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Tipo de índice não suportado: {index_type}")
+        if promote_to not in self.INDEX_TYPES:
+            raise ValueError(f"Tipo de índice não suportado: {promote_to}")
+        if codec not in self.CODECS:
+            raise ValueError(f"Codec não suportado: {codec}")
+        if reduction not in self.REDUCTIONS:
+            raise ValueError(f"Redução de dimensão não suportada: {reduction}")
+
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.ivf_nlist = ivf_nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.train_sample = train_sample
+        self.promote_threshold = promote_threshold
+        self.promote_to = promote_to
+        self.min_recall = min_recall
+        self.mmap = mmap
+        self.codec = codec
+        self.reduce_dim = reduce_dim
+        self.reduction = reduction
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "IndexSettings":
+        """Cria a configuração a partir de um dicionário (chaves desconhecidas são ignoradas)."""
+        data = dict(data or {})
+        if "type" in data:
+            data["index_type"] = data.pop("type")
+        defaults = cls().to_dict()
+        return cls(**{key: data[key] for key in defaults if key in data})
+
+    @classmethod
+    def from_config(
+        cls,
+        config_path: str = "config.toml",
+        context_metadata: Optional[Dict] = None,
+    ) -> "IndexSettings":
+        """
+        Cria IndexSettings a partir do config.toml e dos metadados do contexto.
+
+        Args:
+            config_path: Caminho para o arquivo config.toml
+            context_metadata: Metadados do contexto (chave "index" sobrescreve o config)
+
+        Returns:
+            Instância configurada do IndexSettings
+        """
+        config = toml.load(config_path)
+        data = dict(config.get("index", {}))
+        if context_metadata:
+            data.update(context_metadata.get("index") or {})
+        return cls.from_dict(data)
+
+    def to_dict(self) -> Dict:
+        """Serializa a configuração (para metadados do índice/contexto)."""
+        return {
+            "index_type": self.index_type,
+            "hnsw_m": self.hnsw_m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "ivf_nlist": self.ivf_nlist,
+            "pq_m": self.pq_m,
+            "nprobe": self.nprobe,
+            "train_sample": self.train_sample,
+            "promote_threshold": self.promote_threshold,
+            "promote_to": self.promote_to,
+            "min_recall": self.min_recall,
+            "mmap": self.mmap,
+            "codec": self.codec,
+            "reduce_dim": self.reduce_dim,
+            "reduction": self.reduction,
+        }
+
+    def with_type(self, index_type: str) -> "IndexSettings":
+        """Retorna uma cópia com outro tipo de índice."""
+        return IndexSettings.from_dict({**self.to_dict(), "index_type": index_type})
+
+    def exact(self) -> "IndexSettings":
+        """Cópia flat, float32 e sem redução (referência da busca exata)."""
+        return IndexSettings.from_dict(
+            {**self.to_dict(), "index_type": "flat", "codec": "float32", "reduce_dim": 0}
+        )
+
+    def for_index(self, index: faiss.Index) -> "IndexSettings":
+        """Cópia com o tipo, codec e redução de um índice existente (ex: compactação)."""
+        layout = index_layout(index)
+        data = {**self.to_dict(), "index_type": layout["type"], "reduce_dim": 0}
+        if layout["codec"] != "pq":
+            data["codec"] = layout["codec"]
+        if layout["reduction"]:
+            data["reduce_dim"] = layout["dimensions"]
+            data["reduction"] = layout["reduction"]
+        return IndexSettings.from_dict(data)
+
+    @property
+    def is_exact(self) -> bool:
+        """Se o índice configurado é o flat float32 sem redução."""
+        return self.index_type == "flat" and self.codec == "float32" and not self.reduce_dim
+
+    def reduced_dim(self, dim: int) -> int:
+        """Dimensão indexada para vetores de dimensão ``dim``."""
+        return self.reduce_dim if 0 < self.reduce_dim < dim else dim
+
+    def _nlist_for(self, num_vectors: int) -> int:
+        """Nº de listas do IVF para a quantidade de vetores."""
+        if self.ivf_nlist:
+            return self.ivf_nlist
+        return max(1, int(4 * np.sqrt(num_vectors)))
+
+    def _pq_m_for(self, dim: int) -> int:
+        """Nº de subquantizadores do PQ (precisa dividir a dimensão)."""
+        pq_m = self.pq_m or max(1, dim // 16)
+        while dim % pq_m:
+            pq_m -= 1
+        return pq_m
+
+    def min_training_vectors(self, num_vectors: int) -> int:
+        """Vetores necessários para treinar o IVF-PQ e a PCA desta configuração."""
+        required = 0
+        if self.index_type == "ivfpq":
+            centroids = max(self._nlist_for(num_vectors), self._PQ_CENTROIDS)
+            required = centroids * self._POINTS_PER_CENTROID
+        if self.reduce_dim and self.reduction == "pca":
+            required = max(required, self.reduce_dim * self._PCA_POINTS_PER_DIM)
+        return required
+
+    def factory_string(self, dim: int, num_vectors: int = 0) -> str:
+        """
+        Descrição do índice no formato do faiss.index_factory.
+
+        O truncamento não tem descrição no index_factory: a string descreve
+        só o índice interno, na dimensão reduzida (ver create_index).
+        """
+        reduced = self.reduced_dim(dim)
+        storage = self._CODEC_FACTORY[self.codec]
+        if self.index_type == "hnsw":
+            description = f"HNSW{self.hnsw_m},{storage}"
+        elif self.index_type == "ivfpq":
+            description = f"IVF{self._nlist_for(num_vectors)},PQ{self._pq_m_for(reduced)}"
+        else:
+            description = storage
+
+        if reduced < dim and self.reduction == "pca":
+            description = f"PCA{reduced},L2norm,{description}"
+        return description
+
+    def create_index(self, dim: int, num_vectors: int = 0) -> faiss.Index:
+        """
+        Cria um índice vazio (ainda não treinado, no caso do IVF-PQ).
+
+        Args:
+            dim: Dimensão dos vetores
+            num_vectors: Nº esperado de vetores (define o nlist automático)
+
+        Returns:
+            Índice FAISS com métrica L2 (padrão do LangChain)
+        """
+        reduced = self.reduced_dim(dim)
+        if reduced < dim and self.reduction == "truncate":
+            # Mantém as primeiras dimensões e renormaliza (Matryoshka)
+            inner = faiss.index_factory(reduced, self.factory_string(reduced, num_vectors), faiss.METRIC_L2)
+            index = faiss.IndexPreTransform(inner)
+            index.prepend_transform(faiss.NormalizationTransform(reduced, 2.0))
+            index.prepend_transform(faiss.RemapDimensionsTransform(dim, reduced, False))
+        else:
+            index = faiss.index_factory(dim, self.factory_string(dim, num_vectors), faiss.METRIC_L2)
+
+        if self.index_type == "hnsw":
+            hnsw = base_index(index).hnsw
+            hnsw.efConstruction = self.ef_construction
+            hnsw.efSearch = self.ef_search
+        return index
+
+    def search_parameters(self, index: faiss.Index, k: int, selector: Optional[faiss.IDSelector] = None):
+        """
+        Parâmetros de busca por consulta (efSearch/nprobe) para o índice.
+
+        Com ``selector`` (ver id_selector), só as posições selecionadas entram
+        no resultado; o filtro é aplicado dentro da busca do FAISS.
+        """
+        index_type = index_type_of(index)
+        if index_type == "hnsw":
+            if selector is not None:
+                return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k), sel=selector)
+            return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k))
+        if index_type == "ivfpq":
+            if selector is not None:
+                return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=selector)
+            return faiss.SearchParametersIVF(nprobe=self.nprobe)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+
+def id_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """
+    Seletor de posições do índice a partir de uma máscara booleana.
+
+    Usa um bitmap (1 bit por posição); o buffer fica referenciado no próprio
+    seletor enquanto ele existir.
+    """
+    bits = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
+    selector.referenced_bits = bits
+    return selector
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """Índice interno, sem as transformações de redução de dimensão."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Identifica o tipo ("flat", "hnsw" ou "ivfpq") de um índice FAISS."""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def codec_of(index: faiss.Index) -> str:
+    """Codec dos vetores armazenados ("float32", "fp16", "sq8" ou "pq")."""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return "pq"
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        qtype = index.sq.qtype
+        if qtype == faiss.ScalarQuantizer.QT_fp16:
+            return "fp16"
+        if qtype == faiss.ScalarQuantizer.QT_8bit:
+            return "sq8"
+    return "float32"
+
+
+def stored_dim(index: faiss.Index) -> int:
+    """Dimensão dos vetores armazenados (menor que index.d se houve redução)."""
+    return base_index(index).d
+
+
+def code_size_of(index: faiss.Index) -> int:
+    """Bytes do código de cada vetor (float32, fp16, SQ8 ou PQ)."""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.downcast_index(index.storage).code_size
+    return index.code_size
+
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    """
+    Memória ocupada por vetor no índice.
+
+    Código do vetor, mais o ID no IVF ou os ~2·M vizinhos (int32) do nível
+    0 no HNSW.
+    """
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        return code_size_of(base) + 8
+    if isinstance(base, faiss.IndexHNSW):
+        return code_size_of(base) + base.hnsw.nb_neighbors(0) * 4
+    return code_size_of(base)
+
+
+def index_layout(index: faiss.Index) -> Dict:
+    """
+    Tipo, codec, dimensão armazenada e redução de um índice FAISS.
+
+    Gravado nos metadados do índice; ``bytes_per_vector`` não inclui o
+    mapeamento posição → ID do LangChain.
+    """
+    reduction = None
+    top = faiss.downcast_index(index)
+    if isinstance(top, faiss.IndexPreTransform) and top.chain.size():
+        first = faiss.downcast_VectorTransform(top.chain.at(0))
+        reduction = "pca" if isinstance(first, faiss.PCAMatrix) else "truncate"
+    return {
+        "type": index_type_of(index),
+        "codec": codec_of(index),
+        "dimensions": stored_dim(index),
+        "reduction": reduction,
+        "bytes_per_vector": bytes_per_vector(index),
+    }
+
+
+def mmap_io_flags() -> int:
+    """
+    Flags de leitura do FAISS para carregar um índice mapeado em memória.
+
+    Os vetores/códigos não são copiados para a memória do processo: o arquivo
+    é mapeado somente leitura e as páginas ficam no cache do sistema
+    operacional, compartilhadas por todos os processos que servem o mesmo
+    contexto. A carga passa a ter tempo quase constante.
+    """
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def copy_to_memory(index: faiss.Index) -> faiss.Index:
+    """
+    Copia um índice mapeado em memória para a heap (permite alterações).
+
+    clone_index manteria a visão do arquivo mapeado; serializar e
+    desserializar gera uma cópia que pertence ao processo.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """
+    Verifica se o índice aceita remoção física mantendo posições contíguas.
+
+    HNSW não implementa remove_ids e o IVF preserva os rótulos originais
+    após a remoção (o mapeamento posição → docstore do LangChain quebraria).
+    """
+    return index_type_of(index) == "flat"
+
+
+def prepare_index(index: faiss.Index, settings: Optional[IndexSettings] = None) -> faiss.Index:
+    """
+    Ajustes após criar/carregar um índice.
+
+    Habilita reconstruct() no IVF e aplica efSearch/nprobe da configuração
+    como padrão do índice (usado pelas buscas do próprio LangChain).
+    """
+    index_type = index_type_of(index)
+    if index_type == "ivfpq":
+        ivf = faiss.extract_index_ivf(index)
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if settings is not None:
+            ivf.nprobe = settings.nprobe
+    elif index_type == "hnsw" and settings is not None:
+        base_index(index).hnsw.efSearch = settings.ef_search
+    return index
+
+
+def iter_vectors(index: faiss.Index, batch_size: int = 65536):
+    """
+    Percorre os vetores armazenados no índice em blocos (sem copiar tudo).
+
+    Em índices comprimidos os vetores são reconstruídos (aproximados); com
+    redução de dimensão voltam à dimensão original.
+    """
+    for start in range(0, index.ntotal, batch_size):
+        count = min(batch_size, index.ntotal - start)
+        if index_type_of(index) == "ivfpq":
+            yield np.vstack([index.reconstruct(i) for i in range(start, start + count)])
+        else:
+            yield index.reconstruct_n(start, count)
+
+
+def sample_vectors(index: faiss.Index, size: int, seed: int = 0) -> np.ndarray:
+    """Amostra aleatória de vetores do índice (para treino e testes de recall)."""
+    size = min(size, index.ntotal)
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.choice(index.ntotal, size=size, replace=False))
+    return np.vstack([index.reconstruct(int(i)) for i in positions]).astype(np.float32)
+
+
+def build_from_index(
+    source: faiss.Index,
+    settings: IndexSettings,
+    keep: Optional[np.ndarray] = None,
+) -> faiss.Index:
+    """
+    Constrói um novo índice com os vetores de outro (promoção/compactação).
+
+    Args:
+        source: Índice de origem
+        settings: Configuração do novo índice
+        keep: Máscara booleana das posições a manter (None = todas)
+
+    Returns:
+        Novo índice com os vetores na mesma ordem relativa
+    """
+    num_vectors = int(keep.sum()) if keep is not None else source.ntotal
+    target = settings.create_index(source.d, num_vectors)
+
+    if not target.is_trained:
+        target.train(sample_vectors(source, settings.train_sample))
+    prepare_index(target, settings)
+
+    start = 0
+    for block in iter_vectors(source):
+        end = start + len(block)
+        if keep is not None:
+            block = block[keep[start:end]]
+        start = end
+        if len(block):
+            target.add(np.ascontiguousarray(block, dtype=np.float32))
+
+    return target
+
+
+def measure_recall(
+    exact: faiss.Index,
+    candidate: faiss.Index,
+    settings: IndexSettings,
+    k: int = 10,
+    num_queries: int = 200,
+) -> float:
+    """
+    Mede o recall@k de um índice aproximado em relação à busca exata.
+
+    Usa vetores do próprio índice como consultas.
+
+    Args:
+        exact: Índice de referência (flat)
+        candidate: Índice aproximado a avaliar
+        settings: Configuração de busca do índice aproximado
+        k: Nº de vizinhos comparados
+        num_queries: Nº de consultas amostradas
+
+    Returns:
+        Fração média dos k vizinhos exatos encontrados pelo índice aproximado
+    """
+    if exact.ntotal == 0:
+        return 1.0
+
+    k = min(k, exact.ntotal)
+    queries = sample_vectors(exact, num_queries, seed=1)
+
+    _, expected = exact.search(queries, k)
+    _, found = candidate.search(queries, k, params=settings.search_parameters(candidate, k))
+
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / (len(queries) * k)
@@ -0,0 +1,256 @@
+"""Federated Search - Mesma pergunta em vários contextos com um único embedding."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+import toml
+from langchain_core.documents import Document
+
+from .concurrency import ContextLocks
+from .metadata_filter import MetadataFilter
+from .vector_store import VectorStore
+
+
+# Nome do contexto -> VectorStore carregado (None se o contexto não tem índice)
+StoreLoader = Callable[[str], Optional[VectorStore]]
+
+
+class FederatedSearch:
+    """
+    Busca uma pergunta em vários contextos (ex: todos os condomínios).
+
+    A pergunta é embedada uma única vez por modelo de embeddings (em geral
+    todos os contextos usam o mesmo) e as buscas no FAISS rodam em paralelo
+    em um pool de threads (o FAISS libera o GIL). Cada contexto contribui com
+    no máximo ``per_context_k`` documentos e os resultados são unidos pela
+    similaridade vetorial até ``top_k``; cada documento leva o nome do
+    contexto em ``metadata["context"]``.
+
+    Com busca híbrida, a ordem dentro de cada contexto continua sendo a do
+    RRF, mas o score RRF (só de posição) não é comparável entre contextos:
+    a união usa a melhor similaridade vetorial ainda não usada de cada
+    contexto.
+    """
+
+    def __init__(
+        self,
+        get_store: StoreLoader,
+        max_workers: int = 8,
+        per_context_k: int = 4,
+        top_k: int = 12,
+        min_similarity: Optional[float] = None,
+        context_locks: Optional[ContextLocks] = None,
+    ):
+        """
+        Inicializa a busca federada.
+
+        Args:
+            get_store: Retorna o VectorStore de um contexto (ex: do ContextPool)
+            max_workers: Contextos buscados em paralelo
+            per_context_k: Máximo de documentos de cada contexto
+            top_k: Máximo de documentos no resultado unido
+            min_similarity: Similaridade mínima dos documentos (None = sem threshold)
+            context_locks: Locks por contexto; a busca em cada contexto é uma
+                leitura (não roda durante a indexação dele)
+        """
+        self.get_store = get_store
+        self.max_workers = max(1, max_workers)
+        self.per_context_k = per_context_k
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.context_locks = context_locks
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        self.searches = 0
+        self.context_errors = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls,
+        get_store: StoreLoader,
+        config_path: str = "config.toml",
+        context_locks: Optional[ContextLocks] = None,
+    ) -> "FederatedSearch":
+        """
+        Cria FederatedSearch a partir de arquivo de configuração TOML.
+
+        Args:
+            get_store: Retorna o VectorStore de um contexto
+            config_path: Caminho para o arquivo config.toml
+            context_locks: Locks por contexto do app
+
+        Returns:
+            Instância configurada do FederatedSearch
+        """
+        config = toml.load(config_path)
+        federated_config = config.get("federated", {})
+        retrieval_config = config.get("retrieval", {})
+
+        return cls(
+            get_store=get_store,
+            max_workers=federated_config.get("max_workers", 8),
+            per_context_k=federated_config.get("per_context_k", 4),
+            top_k=federated_config.get("top_k", 12),
+            min_similarity=retrieval_config.get("score_threshold"),
+            context_locks=context_locks,
+        )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Pool de threads das buscas (criado na primeira busca)."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="federated"
+                )
+            return self._executor
+
+    def _search_context(
+        self,
+        context_name: str,
+        query: str,
+        embeddings: Dict[str, List[float]],
+        per_context_k: int,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Busca em um contexto; retorna (Document com "context", similaridade vetorial)."""
+        lock = self.context_locks.get(context_name).read() if self.context_locks else nullcontext()
+        with lock:
+            store = self.get_store(context_name)
+            if store is None or not store.is_initialized:
+                return []
+
+            key = store.embedding_key
+            if key not in embeddings:
+                # Contexto indexado com outro modelo: embedding próprio
+                embeddings[key] = store.embed_query(query)
+
+            hits = store.search_hybrid(
+                query,
+                embeddings[key],
+                top_k=per_context_k,
+                min_similarity=self.min_similarity,
+                min_k=0,
+                metadata_filter=metadata_filter,
+            )
+            if store.hybrid_search:
+                # Busca híbrida retorna o score RRF: similaridade calculada à parte
+                similarities = store.vector_similarities(embeddings[key], [doc.id for doc, _ in hits])
+            else:
+                similarities = [store.similarity(score) for _, score in hits]
+
+        return [
+            (
+                Document(page_content=doc.page_content, metadata={**doc.metadata, "context": context_name}, id=doc.id),
+                similarity,
+            )
+            for (doc, _), similarity in zip(hits, similarities)
+        ]
+
+    def search_many(
+        self,
+        contexts: List[str],
+        query: str,
+        embedding: Optional[List[float]] = None,
+        embedding_key: Optional[str] = None,
+        top_k: Optional[int] = None,
+        per_context_k: Optional[int] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Busca a pergunta em todos os contextos e une os resultados.
+
+        Contextos sem índice são ignorados; um contexto que falha é ignorado
+        com um aviso, sem derrubar a busca nos demais.
+
+        Args:
+            contexts: Nomes dos contextos (ex: ContextManager.list_contexts())
+            query: Pergunta
+            embedding: Embedding já calculado da pergunta (opcional)
+            embedding_key: Modelo do ``embedding`` (VectorStore.embedding_key);
+                contextos de outro modelo geram o próprio embedding
+            top_k: Máximo de documentos (padrão: self.top_k)
+            per_context_k: Máximo por contexto (padrão: self.per_context_k)
+            metadata_filter: Filtro aplicado à busca em cada contexto
+
+        Returns:
+            Tuplas (Document, similaridade vetorial) da mais para a menos
+            relevante; o contexto de origem fica em ``metadata["context"]``
+        """
+        top_k = top_k or self.top_k
+        per_context_k = per_context_k or self.per_context_k
+        contexts = list(dict.fromkeys(contexts))
+        if not contexts:
+            return []
+
+        # Embedding por modelo, compartilhado entre as threads
+        embeddings: Dict[str, List[float]] = {}
+        if embedding is not None:
+            if embedding_key is None:
+                store = self.get_store(contexts[0])
+                embedding_key = store.embedding_key if store is not None else ""
+            embeddings[embedding_key] = embedding
+        else:
+            # Embeda antes de distribuir para não gerar o mesmo vetor em várias threads
+            for name in contexts:
+                store = self.get_store(name)
+                if store is not None and store.is_initialized:
+                    embeddings[store.embedding_key] = store.embed_query(query)
+                    break
+
+        futures = {
+            name: self.executor.submit(
+                self._search_context, name, query, embeddings, per_context_k, metadata_filter
+            )
+            for name in contexts
+        }
+
+        merged: List[Tuple[float, Document, float]] = []
+        errors = 0
+        for name, future in futures.items():
+            try:
+                hits = future.result()
+            except Exception as e:
+                print(f"Aviso: busca no contexto '{name}' falhou ({e}).")
+                errors += 1
+                continue
+
+            # Chave de cada resultado: melhor similaridade dele em diante no
+            # contexto (não cresce, então a ordem do contexto é mantida)
+            best = 0.0
+            keys = []
+            for _, similarity in reversed(hits):
+                best = max(best, similarity)
+                keys.append(best)
+            merged.extend((key, doc, similarity) for key, (doc, similarity) in zip(reversed(keys), hits))
+
+        with self._stats_lock:
+            self.searches += 1
+            self.context_errors += errors
+
+        # sort é estável: empates mantêm a ordem dos contextos
+        merged.sort(key=lambda item: -item[0])
+        return [(doc, similarity) for _, doc, similarity in merged[:top_k]]
+
+    def shutdown(self) -> None:
+        """Encerra o pool de threads."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de uso."""
+        with self._stats_lock:
+            return {
+                "searches": self.searches,
+                "context_errors": self.context_errors,
+                "max_workers": self.max_workers,
+                "per_context_k": self.per_context_k,
+                "top_k": self.top_k,
+            }
@@ -0,0 +1,268 @@
+"""Ingestion Pipeline - Pipeline em streaming: carregar → dividir → embeddings → índice."""
+
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import toml
+from langchain_core.documents import Document
+
+from .chunker import Chunker
+from .document_loader import DocumentLoader
+from .vector_store import IngestionSession
+
+
+# Callback de progresso: (arquivos concluídos, total de arquivos, mensagem)
+ProgressCallback = Callable[[int, int, str], None]
+
+# Marca de fim da fila do produtor
+_DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Pipeline de ingestão em streaming.
+
+    Uma thread produtora carrega (via DocumentLoader.iter_load, opcionalmente
+    em paralelo) e divide os arquivos em chunks, colocando-os em uma fila
+    limitada. A thread principal consome a fila e envia os chunks para a
+    IngestionSession, que gera embeddings em micro-lotes. Assim, leitura,
+    chunking e chamadas de embeddings acontecem ao mesmo tempo, e a fila
+    limitada segura o produtor quando os embeddings ficam para trás
+    (memória constante, independente do tamanho da pasta).
+    """
+
+    def __init__(
+        self,
+        document_loader: DocumentLoader,
+        chunker: Chunker,
+        queue_size: int = 8,
+        min_content_chars: int = 10,
+    ):
+        """
+        Inicializa o pipeline.
+
+        Args:
+            document_loader: Loader usado para ler os arquivos
+            chunker: Chunker usado para dividir os documentos
+            queue_size: Máximo de arquivos já divididos aguardando embeddings
+            min_content_chars: Mínimo de caracteres para um arquivo ser indexado
+        """
+        self.document_loader = document_loader
+        self.chunker = chunker
+        self.queue_size = max(1, queue_size)
+        self.min_content_chars = min_content_chars
+
+    @classmethod
+    def from_config(
+        cls,
+        config_path: str = "config.toml",
+        document_loader: Optional[DocumentLoader] = None,
+        chunker: Optional[Chunker] = None,
+    ) -> "IngestionPipeline":
+        """
+        Cria IngestionPipeline a partir de arquivo de configuração TOML.
+
+        Args:
+            config_path: Caminho para o arquivo config.toml
+            document_loader: Loader (opcional, criado do config se ausente)
+            chunker: Chunker (opcional, criado do config se ausente)
+
+        Returns:
+            Instância configurada do IngestionPipeline
+        """
+        config = toml.load(config_path)
+        ingestion_config = config.get("ingestion", {})
+
+        return cls(
+            document_loader=document_loader or DocumentLoader.from_config(config_path),
+            chunker=chunker or Chunker.from_config(config_path),
+            queue_size=ingestion_config.get("queue_size", 8),
+        )
+
+    def chunk_documents(self, docs: List[Document]) -> List[Document]:
+        """
+        Valida o conteúdo de um arquivo e aplica chunking.
+
+        Args:
+            docs: Documents carregados de um arquivo
+
+        Returns:
+            Chunks do arquivo
+        """
+        # Verifica se há conteúdo nos documentos
+        total_content = sum(len(doc.page_content.strip()) for doc in docs)
+        if total_content < self.min_content_chars:
+            raise ValueError("Sem texto (OCR também falhou)")
+
+        chunks = list(self.chunker.iter_split(docs))
+
+        if not chunks:
+            raise ValueError("Conteúdo insuficiente (ignorado)")
+
+        return chunks
+
+    def run(
+        self,
+        session: IngestionSession,
+        file_paths: List[Path],
+        fingerprints: Optional[Dict[Path, dict]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> dict:
+        """
+        Indexa arquivos em streaming dentro de uma sessão de ingestão.
+
+        Args:
+            session: Sessão de ingestão aberta no VectorStore de destino
+            file_paths: Arquivos a indexar
+            fingerprints: Impressões digitais por caminho (indexação incremental)
+            progress_callback: Recebe (concluídos, total, mensagem)
+
+        Returns:
+            Dicionário com listas "indexed" e "failed" (nome, erro)
+        """
+        fingerprints = fingerprints or {}
+        total = len(file_paths)
+        failed: List[Tuple[str, str]] = []
+        done = 0
+
+        def report(message: str) -> None:
+            if progress_callback:
+                progress_callback(done, total, message)
+
+        report("Iniciando indexação...")
+
+        for file_path, chunks, error in self._iter_chunked(file_paths):
+            file_name = file_path.name
+            if error:
+                failed.append((file_name, error))
+            else:
+                session.add_file(file_name, chunks, fingerprints.get(file_path))
+
+            done += 1
+            report(f"{file_name} ({session.chunks_added} chunks novos)")
+
+        # Garante que o último micro-lote também receba embeddings
+        session.flush()
+        failed.extend(session.failed_files.items())
+
+        return {
+            "indexed": list(session.added_files),
+            "failed": failed,
+        }
+
+    def sync_directory(
+        self,
+        session: IngestionSession,
+        directory: str | Path,
+        recursive: bool = True,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> dict:
+        """
+        Sincroniza uma pasta com o índice da sessão.
+
+        Arquivos inalterados não são carregados, arquivos alterados são
+        re-indexados de forma incremental e arquivos que sumiram da pasta
+        são removidos do índice.
+
+        Args:
+            session: Sessão de ingestão aberta no VectorStore de destino
+            directory: Pasta a sincronizar
+            recursive: Se True, inclui subpastas
+            progress_callback: Recebe (concluídos, total, mensagem)
+
+        Returns:
+            Dicionário com listas "indexed", "unchanged", "removed" e "failed"
+        """
+        vector_store = session.vector_store
+        unchanged: List[str] = []
+        failed: List[Tuple[str, str]] = []
+        seen_files = set()
+        fingerprints: Dict[Path, dict] = {}
+
+        # Listar e checar tamanho/mtime é barato: só lê o que mudou
+        for file_path in self.document_loader.iter_files(directory, recursive=recursive):
+            file_name = file_path.name
+            seen_files.add(file_name)
+            try:
+                fingerprint = vector_store.fingerprint_file(str(file_path), file_name)
+                if vector_store.is_file_unchanged(file_name, fingerprint):
+                    unchanged.append(file_name)
+                else:
+                    fingerprints[file_path] = fingerprint
+            except Exception as e:
+                failed.append((file_name, str(e)))
+
+        result = self.run(
+            session,
+            sorted(fingerprints),
+            fingerprints=fingerprints,
+            progress_callback=progress_callback,
+        )
+
+        removed = []
+        for file_name in vector_store.files_under(str(directory)):
+            if file_name not in seen_files:
+                session.remove_file(file_name)
+                removed.append(file_name)
+
+        return {
+            "indexed": result["indexed"],
+            "unchanged": unchanged,
+            "removed": removed,
+            "failed": failed + result["failed"],
+        }
+
+    def _iter_chunked(self, file_paths: Iterable[Path]):
+        """
+        Carrega e divide arquivos em uma thread produtora.
+
+        Yields:
+            Tuplas (caminho, chunks, erro) à medida que ficam prontas
+        """
+        items: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # Bloqueia enquanto a fila estiver cheia (backpressure)
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                for file_path, docs, error in self.document_loader.iter_load(file_paths):
+                    if error is None:
+                        try:
+                            chunks, error = self.chunk_documents(docs), None
+                        except Exception as e:
+                            chunks, error = [], str(e)
+                    else:
+                        chunks = []
+                    if not put((file_path, chunks, error)):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(_DONE)
+
+        producer = threading.Thread(target=produce, name="ingestion-producer", daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            producer.join()
+        finally:
+            # Em caso de interrupção, libera o produtor (thread daemon)
+            stop.set()
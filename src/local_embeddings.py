@@ -0,0 +1,149 @@
+"""Local Embeddings - Modelo de embeddings em processo (ONNX Runtime, CPU)."""
+
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Embeddings gerados no próprio processo com um modelo ONNX (ex: BGE-M3 int8).
+
+    Sem chamada HTTP nem serialização JSON dos vetores: os textos são
+    tokenizados, ordenados por tamanho e agrupados em lotes de comprimento
+    parecido, cada lote com padding só até o maior texto dele. A inferência
+    usa várias threads do ONNX Runtime (intra-op) e ``embed_documents``
+    retorna uma matriz NumPy (float32, uma linha por texto).
+
+    A pasta do modelo deve conter o ``tokenizer.json`` e um
+    ``model_quantized.onnx`` (int8, preferido) ou ``model.onnx``.
+    """
+
+    # embed_documents retorna np.ndarray (os wrappers preservam a matriz)
+    returns_arrays = True
+
+    def __init__(
+        self,
+        model_path: str,
+        model: Optional[str] = None,
+        max_length: int = 8192,
+        batch_size: int = 16,
+        threads: int = 0,
+        normalize: bool = True,
+    ):
+        """
+        Carrega o modelo.
+
+        Args:
+            model_path: Pasta com o modelo ONNX e o tokenizer.json
+            model: Nome do modelo (padrão: nome da pasta)
+            max_length: Máximo de tokens por texto (textos maiores são cortados)
+            batch_size: Textos por execução do modelo
+            threads: Threads intra-op do ONNX Runtime (0 = todos os núcleos)
+            normalize: Se True, retorna vetores unitários (como o BGE-M3 via Ollama)
+        """
+        if not ONNX_AVAILABLE:
+            raise ImportError("Provider 'local' requer os pacotes onnxruntime e tokenizers.")
+
+        folder = Path(model_path)
+        model_file = next(
+            (folder / name for name in ("model_quantized.onnx", "model.onnx") if (folder / name).exists()),
+            None,
+        )
+        if model_file is None:
+            raise FileNotFoundError(f"Modelo ONNX não encontrado em {model_path}")
+
+        self.model_path = str(folder)
+        self.model = model or folder.name
+        self.batch_size = max(1, batch_size)
+        self.normalize = normalize
+
+        self.tokenizer = Tokenizer.from_file(str(folder / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # O padding é feito por lote (ver _run_batch)
+        self.tokenizer.no_padding()
+        self._pad_id = next(
+            (self.tokenizer.token_to_id(token) for token in ("<pad>", "[PAD]")
+             if self.tokenizer.token_to_id(token) is not None),
+            0,
+        )
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+        # A sessão usa todas as threads configuradas: uma execução por vez
+        self._lock = threading.Lock()
+
+    def _run_batch(self, encodings: list) -> np.ndarray:
+        """Executa o modelo em um lote com padding até o maior texto do lote."""
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.full((len(encodings), length), self._pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        with self._lock:
+            output = self.session.run(None, inputs)[0]
+
+        # Exportações com pooling já retornam (lote, dim); senão usa o token
+        # [CLS], que é o embedding denso do BGE-M3
+        vectors = output[:, 0] if output.ndim == 3 else output
+        return vectors.astype(np.float32, copy=False)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Gera os embeddings em lotes agrupados por tamanho.
+
+        Args:
+            texts: Textos
+
+        Returns:
+            Matriz float32 (len(texts), dimensões), na ordem dos textos
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = np.argsort([len(e.ids) for e in encodings], kind="stable")
+
+        result = None
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            vectors = self._run_batch([encodings[i] for i in positions])
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            result[positions] = vectors
+
+        if self.normalize:
+            norms = np.linalg.norm(result, axis=1, keepdims=True)
+            result /= np.where(norms > 0, norms, 1.0)
+        return result
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embeddings dos textos como matriz NumPy (aceita pelo FAISS sem conversão)."""
+        return self.embed_array(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de uma query."""
+        return self.embed_array([text])[0].tolist()
@@ -0,0 +1,269 @@
+"""Metadata Filter - Filtros estruturados da busca (arquivo, tipo, página, seção, data)."""
+
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+Values = Union[str, int, List]
+
+
+def _as_tuple(value) -> tuple:
+    """Normaliza um valor ou lista de valores em tupla (None = vazia)."""
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(value)
+    return (value,)
+
+
+def _as_datetime(value) -> Optional[np.datetime64]:
+    """Converte data ISO (ex: "2024-05-01" ou datetime) em datetime64 (µs)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    try:
+        return np.datetime64(str(value), "us")
+    except ValueError:
+        raise ValueError(f"Data inválida no filtro: {value!r} (use o formato ISO, ex: 2024-05-01)")
+
+
+class MetadataFilter:
+    """
+    Filtro de metadados aplicado antes da busca vetorial.
+
+    Cada campo aceita um valor ou uma lista (qualquer um deles); campos
+    diferentes são combinados com E. Campos:
+
+    - ``source``: nome do arquivo (ex: "convencao.pdf")
+    - ``file_type``: extensão (".pdf" ou "pdf")
+    - ``page``, ``page_min``, ``page_max``: página como gravada pelo loader
+      (PDF e OCR numeram a partir de 0)
+    - ``headers``: seções do Markdown (``header_1`` a ``header_3``, ver
+      Chunker._split_markdown), comparadas pelo texto exato
+    - ``loaded_after``, ``loaded_before``: data de carregamento (``loaded_at``)
+    """
+
+    HEADER_FIELDS = ("header_1", "header_2", "header_3")
+    FIELDS = (
+        "source", "file_type", "page", "page_min", "page_max",
+        *HEADER_FIELDS, "loaded_after", "loaded_before",
+    )
+
+    def __init__(
+        self,
+        source: Optional[Values] = None,
+        file_type: Optional[Values] = None,
+        page: Optional[Values] = None,
+        page_min: Optional[int] = None,
+        page_max: Optional[int] = None,
+        headers: Optional[Dict[str, Values]] = None,
+        loaded_after: Optional[Union[str, datetime]] = None,
+        loaded_before: Optional[Union[str, datetime]] = None,
+    ):
+        """
+        Inicializa o filtro.
+
+        Args:
+            source: Arquivo(s) de origem
+            file_type: Extensão(ões) dos arquivos
+            page: Página(s) exata(s)
+            page_min: Primeira página aceita
+            page_max: Última página aceita
+            headers: Nome do header ("header_1"...) -> texto(s) da seção
+            loaded_after: Carregados a partir desta data
+            loaded_before: Carregados antes desta data
+        """
+        self.source = tuple(str(value) for value in _as_tuple(source))
+        self.file_type = tuple(
+            "." + str(value).lower().lstrip(".") for value in _as_tuple(file_type)
+        )
+        try:
+            self.page = tuple(int(value) for value in _as_tuple(page))
+            self.page_min = int(page_min) if page_min is not None else None
+            self.page_max = int(page_max) if page_max is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("Páginas do filtro devem ser números inteiros.")
+
+        self.headers: Dict[str, tuple] = {}
+        for name, values in (headers or {}).items():
+            if name not in self.HEADER_FIELDS:
+                raise ValueError(f"Header desconhecido no filtro: {name} (use {', '.join(self.HEADER_FIELDS)})")
+            if _as_tuple(values):
+                self.headers[name] = tuple(str(value) for value in _as_tuple(values))
+
+        self.loaded_after = _as_datetime(loaded_after)
+        self.loaded_before = _as_datetime(loaded_before)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["MetadataFilter"]:
+        """
+        Cria o filtro a partir de um dicionário (ex: JSON da API).
+
+        Args:
+            data: Campos do filtro; header_1..header_3 ficam no nível de cima
+
+        Returns:
+            MetadataFilter, ou None se o dicionário está vazio
+
+        Raises:
+            ValueError: Campo desconhecido ou valor inválido
+        """
+        if not data:
+            return None
+        unknown = sorted(set(data) - set(cls.FIELDS))
+        if unknown:
+            raise ValueError(f"Campos desconhecidos no filtro: {', '.join(unknown)}")
+
+        fields = {name: value for name, value in data.items() if name not in cls.HEADER_FIELDS}
+        headers = {name: value for name, value in data.items() if name in cls.HEADER_FIELDS}
+        metadata_filter = cls(**fields, headers=headers)
+        return metadata_filter if not metadata_filter.is_empty else None
+
+    def to_dict(self) -> dict:
+        """Campos preenchidos do filtro (formato aceito por from_dict)."""
+        data = {
+            "source": list(self.source),
+            "file_type": list(self.file_type),
+            "page": list(self.page),
+            "page_min": self.page_min,
+            "page_max": self.page_max,
+            **{name: list(values) for name, values in self.headers.items()},
+            "loaded_after": str(self.loaded_after) if self.loaded_after is not None else None,
+            "loaded_before": str(self.loaded_before) if self.loaded_before is not None else None,
+        }
+        return {name: value for name, value in data.items() if value not in (None, [])}
+
+    @property
+    def is_empty(self) -> bool:
+        """Indica se o filtro não restringe nada."""
+        return not self.to_dict()
+
+    @property
+    def key(self) -> str:
+        """Representação canônica do filtro (escopo do cache de respostas)."""
+        return json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False)
+
+    def matches(self, metadata: dict) -> bool:
+        """
+        Verifica um chunk isolado (ex: resultados do BM25 ou de outra fonte).
+
+        Args:
+            metadata: Metadados do chunk
+
+        Returns:
+            True se o chunk atende ao filtro
+        """
+        return bool(MetadataIndex.build(1, [(0, metadata)]).mask(self)[0])
+
+    def __repr__(self) -> str:
+        return f"MetadataFilter({self.key})"
+
+
+class MetadataIndex:
+    """
+    Colunas de metadados por posição do índice FAISS, para filtrar sem SQL.
+
+    Campos texto (source, file_type, header_*) viram códigos inteiros
+    (valor -> código, como os metadados internados do ChunkStore); página e
+    data de carregamento ficam em colunas numéricas (NaN/NaT quando ausentes).
+    Um filtro é avaliado como operações vetorizadas do NumPy sobre as colunas,
+    resultando em uma máscara booleana por posição, passada ao FAISS como
+    seletor de IDs (ver faiss_index.id_selector).
+    """
+
+    CATEGORICAL = ("source", "file_type", *MetadataFilter.HEADER_FIELDS)
+
+    def __init__(self, size: int):
+        """
+        Cria colunas vazias.
+
+        Args:
+            size: Número de posições (index.ntotal)
+        """
+        self.size = size
+        self._codes = {name: np.full(size, -1, dtype=np.int32) for name in self.CATEGORICAL}
+        self._values: Dict[str, Dict[str, int]] = {name: {} for name in self.CATEGORICAL}
+        self._pages = np.full(size, np.nan, dtype=np.float64)
+        self._loaded_at = np.full(size, np.datetime64("NaT"), dtype="datetime64[us]")
+
+    @classmethod
+    def build(cls, size: int, entries: Iterable[Tuple[int, dict]]) -> "MetadataIndex":
+        """
+        Monta as colunas a partir dos metadados dos chunks.
+
+        Args:
+            size: Número de posições
+            entries: Tuplas (posição, metadados)
+
+        Returns:
+            MetadataIndex preenchido
+        """
+        index = cls(size)
+        for position, metadata in entries:
+            index.add(position, metadata)
+        return index
+
+    def add(self, position: int, metadata: dict) -> None:
+        """Grava os metadados de uma posição."""
+        for name in self.CATEGORICAL:
+            value = metadata.get(name)
+            if value is None:
+                continue
+            value = str(value)
+            if name == "file_type":
+                value = value.lower()
+            codes = self._values[name]
+            self._codes[name][position] = codes.setdefault(value, len(codes))
+
+        page = metadata.get("page")
+        if isinstance(page, (int, float)) and not isinstance(page, bool):
+            self._pages[position] = page
+
+        loaded_at = metadata.get("loaded_at")
+        if loaded_at:
+            try:
+                self._loaded_at[position] = np.datetime64(str(loaded_at), "us")
+            except ValueError:
+                pass
+
+    def _match_values(self, name: str, values: tuple) -> np.ndarray:
+        """Posições cujo campo texto é um dos valores."""
+        codes = [self._values[name][value] for value in values if value in self._values[name]]
+        if not codes:
+            return np.zeros(self.size, dtype=bool)
+        return np.isin(self._codes[name], codes)
+
+    def mask(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """
+        Avalia o filtro em todas as posições.
+
+        Args:
+            metadata_filter: Filtro
+
+        Returns:
+            Máscara booleana (size,) das posições que atendem ao filtro
+        """
+        mask = np.ones(self.size, dtype=bool)
+        if metadata_filter.source:
+            mask &= self._match_values("source", metadata_filter.source)
+        if metadata_filter.file_type:
+            mask &= self._match_values("file_type", metadata_filter.file_type)
+        for name, values in metadata_filter.headers.items():
+            mask &= self._match_values(name, values)
+
+        # Comparações com NaN/NaT são falsas: chunks sem página/data não passam
+        if metadata_filter.page:
+            mask &= np.isin(self._pages, metadata_filter.page)
+        if metadata_filter.page_min is not None:
+            mask &= self._pages >= metadata_filter.page_min
+        if metadata_filter.page_max is not None:
+            mask &= self._pages <= metadata_filter.page_max
+        if metadata_filter.loaded_after is not None:
+            mask &= self._loaded_at >= metadata_filter.loaded_after
+        if metadata_filter.loaded_before is not None:
+            mask &= self._loaded_at < metadata_filter.loaded_before
+        return mask
@@ -0,0 +1,137 @@
+"""Model Registry - Dimensões, contexto máximo e normalização dos modelos de embeddings."""
+
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingModelInfo:
+    """Características de um modelo de embeddings."""
+
+    def __init__(
+        self,
+        model: str,
+        dimensions: int,
+        max_tokens: Optional[int] = None,
+        normalized: Optional[bool] = None,
+    ):
+        """
+        Inicializa as informações do modelo.
+
+        Args:
+            model: Nome do modelo
+            dimensions: Dimensões dos vetores
+            max_tokens: Máximo de tokens por texto (None = desconhecido)
+            normalized: Se os vetores são unitários (None = desconhecido)
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.max_tokens = max_tokens
+        self.normalized = normalized
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Optional["EmbeddingModelInfo"]:
+        """Cria a partir do dicionário salvo nos metadados do índice (None se incompleto)."""
+        if not data.get("model") or not data.get("dimensions"):
+            return None
+        return cls(data["model"], int(data["dimensions"]), data.get("max_tokens"), data.get("normalized"))
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            "max_tokens": self.max_tokens,
+            "normalized": self.normalized,
+        }
+
+
+class EmbeddingModelRegistry:
+    """
+    Registro dos modelos de embeddings conhecidos.
+
+    Evita gerar um embedding de teste só para descobrir as dimensões do
+    modelo. Modelos fora da lista são descobertos com uma única chamada de
+    teste por processo; os salvos nos metadados de um índice são registrados
+    ao carregá-lo.
+    """
+
+    KNOWN_MODELS: Dict[str, EmbeddingModelInfo] = {
+        info.model: info
+        for info in (
+            EmbeddingModelInfo("text-embedding-3-small", 1536, 8191, True),
+            EmbeddingModelInfo("text-embedding-3-large", 3072, 8191, True),
+            EmbeddingModelInfo("text-embedding-ada-002", 1536, 8191, True),
+            EmbeddingModelInfo("bge-m3", 1024, 8192, True),
+            EmbeddingModelInfo("bge-large-en-v1.5", 1024, 512, True),
+            EmbeddingModelInfo("nomic-embed-text", 768, 8192, True),
+            EmbeddingModelInfo("mxbai-embed-large", 1024, 512, True),
+            EmbeddingModelInfo("snowflake-arctic-embed", 1024, 512, True),
+            EmbeddingModelInfo("all-minilm", 384, 256, True),
+            EmbeddingModelInfo("multilingual-e5-large", 1024, 512, True),
+        )
+    }
+
+    # Modelos descobertos por chamada de teste ou lidos de índices salvos
+    _discovered: Dict[str, EmbeddingModelInfo] = {}
+    _lock = threading.Lock()
+    # Serializa as chamadas de teste (uma por modelo, mesmo com várias threads)
+    _probe_lock = threading.Lock()
+
+    @staticmethod
+    def canonical_name(model: str) -> str:
+        """
+        Nome do modelo sem organização e tag (ex: "BAAI/bge-m3" e
+        "bge-m3:latest" -> "bge-m3").
+        """
+        return model.strip().lower().rsplit("/", 1)[-1].split(":", 1)[0]
+
+    @classmethod
+    def lookup(cls, model: Optional[str]) -> Optional[EmbeddingModelInfo]:
+        """
+        Informações do modelo sem gerar embeddings.
+
+        Args:
+            model: Nome do modelo
+
+        Returns:
+            Informações ou None se o modelo é desconhecido
+        """
+        if not model:
+            return None
+        name = cls.canonical_name(model)
+        with cls._lock:
+            return cls.KNOWN_MODELS.get(name) or cls._discovered.get(name)
+
+    @classmethod
+    def register(cls, info: EmbeddingModelInfo) -> None:
+        """Registra um modelo fora da lista (ex: lido dos metadados de um índice)."""
+        name = cls.canonical_name(info.model)
+        with cls._lock:
+            if name not in cls.KNOWN_MODELS:
+                cls._discovered.setdefault(name, info)
+
+    @classmethod
+    def resolve(cls, model: str, embed_query: Callable[[str], List[float]]) -> EmbeddingModelInfo:
+        """
+        Informações do modelo, gerando um embedding de teste só se desconhecido.
+
+        Args:
+            model: Nome do modelo
+            embed_query: Gera o embedding de teste (chamado no máximo uma vez por modelo)
+
+        Returns:
+            Informações do modelo
+        """
+        info = cls.lookup(model)
+        if info is not None:
+            return info
+
+        with cls._probe_lock:
+            info = cls.lookup(model)
+            if info is None:
+                vector = np.asarray(embed_query("test"), dtype=np.float32)
+                norm = float(np.linalg.norm(vector))
+                info = EmbeddingModelInfo(model, len(vector), normalized=abs(norm - 1.0) < 1e-3)
+                cls.register(info)
+            return info
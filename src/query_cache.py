@@ -0,0 +1,354 @@
+"""Query Cache - Cache de embeddings de perguntas e cache semântico de respostas."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import toml
+
+from .embedding_cache import EmbeddingCache
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU em memória de embeddings de perguntas.
+
+    A chave é o texto normalizado (Unicode, espaços e maiúsculas), então
+    "Horário da piscina" e "horário  da piscina " reaproveitam o mesmo vetor
+    sem chamar o provedor de embeddings.
+    """
+
+    _shared: Optional["QueryEmbeddingCache"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 2048):
+        """
+        Inicializa o cache.
+
+        Args:
+            max_entries: Máximo de perguntas armazenadas
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls, **kwargs) -> "QueryEmbeddingCache":
+        """Retorna a instância compartilhada do processo (criada na primeira chamada)."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**kwargs)
+            return cls._shared
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normaliza a pergunta para a chave do cache."""
+        return EmbeddingCache.normalize_text(text).casefold()
+
+    def get_or_embed(
+        self,
+        model_key: str,
+        text: str,
+        embed: Callable[[str], List[float]],
+    ) -> List[float]:
+        """
+        Retorna o embedding da pergunta, calculando-o apenas se ausente.
+
+        Args:
+            model_key: Identificador do modelo de embeddings
+            text: Pergunta
+            embed: Função que gera o embedding (ex: VectorStore.embed_query)
+
+        Returns:
+            Vetor da pergunta
+        """
+        key = (model_key, self.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = embed(text)
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vector
+
+    def get_or_embed_many(
+        self,
+        model_key: str,
+        texts: List[str],
+        embed_many: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """
+        Versão em lote de get_or_embed: as perguntas ausentes (sem repetição)
+        são enviadas em uma única chamada.
+
+        Args:
+            model_key: Identificador do modelo de embeddings
+            texts: Perguntas
+            embed_many: Função que gera vários embeddings (ex: VectorStore.embed_queries)
+
+        Returns:
+            Vetores na mesma ordem das perguntas
+        """
+        keys = [(model_key, self.normalize(text)) for text in texts]
+        vectors: dict = {}
+        missing: dict = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+                    self.hits += 1
+                elif key in missing:
+                    self.hits += 1
+                else:
+                    missing[key] = text
+                    self.misses += 1
+
+        if missing:
+            embedded = embed_many(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing, embedded):
+                    vectors[key] = vector
+                    self._entries[key] = vector
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return [vectors[key] for key in keys]
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de acerto."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class CachedAnswer:
+    """Resposta armazenada no AnswerCache."""
+
+    def __init__(self, scope: Tuple[str, str, str], embedding: np.ndarray, result: dict):
+        self.scope = scope
+        self.embedding = embedding
+        self.result = result
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    Cache semântico de respostas do RAG.
+
+    Uma resposta é reaproveitada quando a nova pergunta tem similaridade de
+    cosseno acima de ``similarity_threshold`` com uma pergunta já respondida
+    no mesmo contexto, com o mesmo LLM e a mesma versão do índice. Quando o
+    índice do contexto muda (nova versão), as respostas antigas do contexto
+    são descartadas. Entradas expiram após ``ttl_seconds`` e as menos usadas
+    saem quando o cache passa de ``max_entries``.
+    """
+
+    _shared: Optional["AnswerCache"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 86400,
+        similarity_threshold: float = 0.95,
+    ):
+        """
+        Inicializa o cache.
+
+        Args:
+            max_entries: Máximo de respostas armazenadas
+            ttl_seconds: Validade de cada resposta (0 = sem expiração)
+            similarity_threshold: Similaridade mínima (cosseno) entre perguntas
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        # Versão atual do índice de cada contexto
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def shared(cls, **kwargs) -> "AnswerCache":
+        """Retorna a instância compartilhada do processo (criada na primeira chamada)."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**kwargs)
+            return cls._shared
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Vetor unitário (produto interno = cosseno)."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, context_name: str, index_version: str) -> None:
+        """Descarta respostas de versões antigas do índice do contexto."""
+        if self._versions.get(context_name) == index_version:
+            return
+        self._versions[context_name] = index_version
+        stale = [
+            entry_id
+            for entry_id, entry in self._entries.items()
+            if entry.scope[0] == context_name and entry.scope[1] != index_version
+        ]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        self.invalidations += len(stale)
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - entry.created_at > self.ttl_seconds
+
+    def lookup(
+        self,
+        context_name: str,
+        index_version: str,
+        llm_key: str,
+        embedding: List[float],
+    ) -> Optional[dict]:
+        """
+        Busca uma resposta para uma pergunta semelhante.
+
+        Args:
+            context_name: Nome do contexto
+            index_version: Versão atual do índice (VectorStore.index_version)
+            llm_key: Provedor/modelo do LLM
+            embedding: Embedding da pergunta
+
+        Returns:
+            Resultado armazenado (com "similarity") ou None
+        """
+        query = self._normalize(embedding)
+        scope = (context_name, index_version, llm_key)
+        now = time.time()
+
+        with self._lock:
+            self._sync_version(context_name, index_version)
+
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[entry_id]
+                    continue
+                if entry.scope != scope or entry.embedding.shape != query.shape:
+                    continue
+                similarity = float(np.dot(entry.embedding, query))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return {**self._entries[best_id].result, "similarity": round(best_similarity, 4)}
+
+    def store(
+        self,
+        context_name: str,
+        index_version: str,
+        llm_key: str,
+        embedding: List[float],
+        result: dict,
+    ) -> None:
+        """
+        Armazena a resposta de uma pergunta.
+
+        Args:
+            context_name: Nome do contexto
+            index_version: Versão do índice usada na resposta
+            llm_key: Provedor/modelo do LLM
+            embedding: Embedding da pergunta
+            result: Resultado do RAGChain.query
+        """
+        with self._lock:
+            self._sync_version(context_name, index_version)
+            entry = CachedAnswer((context_name, index_version, llm_key), self._normalize(embedding), result)
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, context_name: Optional[str] = None) -> None:
+        """Remove as respostas de um contexto (ou todas)."""
+        with self._lock:
+            if context_name is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            stale = [i for i, entry in self._entries.items() if entry.scope[0] == context_name]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de acerto."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def caches_from_config(
+    config_path: str = "config.toml",
+) -> Tuple[Optional[QueryEmbeddingCache], Optional[AnswerCache]]:
+    """
+    Retorna os caches compartilhados configurados em [query_cache].
+
+    Args:
+        config_path: Caminho para o arquivo config.toml
+
+    Returns:
+        Tupla (cache de embeddings de perguntas, cache de respostas); None se desativado
+    """
+    config = toml.load(config_path)
+    cache_config = config.get("query_cache", {})
+
+    query_cache = None
+    if cache_config.get("embedding_max_entries", 2048):
+        query_cache = QueryEmbeddingCache.shared(
+            max_entries=cache_config.get("embedding_max_entries", 2048),
+        )
+
+    answer_cache = None
+    if cache_config.get("answer_enabled", True):
+        answer_cache = AnswerCache.shared(
+            max_entries=cache_config.get("answer_max_entries", 1000),
+            ttl_seconds=cache_config.get("answer_ttl_seconds", 86400),
+            similarity_threshold=cache_config.get("answer_similarity", 0.95),
+        )
+
+    return query_cache, answer_cache
@@ -1,7 +1,10 @@
 """RAG Chain - Pipeline principal de Retrieval-Augmented Generation."""
 
+import asyncio
+import json
 import os
-from typing import List, Optional, Literal
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Literal, TextIO, Tuple, Union
 
 import toml
 from langchain_core.documents import Document
@@ -12,6 +15,11 @@ from langchain_anthropic import ChatAnthropic
 
 from .vector_store import VectorStore
 from .toon_formatter import ToonFormatter
+from .query_cache import AnswerCache, QueryEmbeddingCache, caches_from_config
+from .reranker import Reranker
+from .concurrency import AsyncRateLimiter
+from .federated_search import FederatedSearch
+from .metadata_filter import MetadataFilter
 
 
 LLMProvider = Literal["openai", "anthropic"]
@@ -68,9 +76,19 @@ RESPOSTA:"""
         temperature: float = 0.3,
         max_tokens: int = 4096,
         top_k: int = 8,
+        score_threshold: Optional[float] = None,
+        min_k: int = 1,
+        score_gap: Optional[float] = None,
+        context_token_budget: Optional[int] = None,
+        reranker: Optional[Reranker] = None,
+        rerank_candidates: int = 50,
         use_toon: bool = True,
         system_context: str = "documentos e informações disponíveis",
         context_name: Optional[str] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        batch_concurrency: int = 4,
+        requests_per_minute: float = 0,
     ):
         """
         Inicializa o RAG Chain.
@@ -81,16 +99,37 @@ RESPOSTA:"""
             model: Nome do modelo (usa padrão se não especificado)
             temperature: Temperatura para geração
             max_tokens: Máximo de tokens na resposta
-            top_k: Número de documentos a recuperar
+            top_k: Número máximo de documentos a recuperar
+            score_threshold: Similaridade mínima (cosseno, 0 a 1) dos documentos
+            min_k: Mínimo de documentos enviados ao LLM, mesmo abaixo do threshold
+            score_gap: Para de incluir documentos quando a similaridade cai mais
+                que isso em relação ao anterior (None = desativado)
+            context_token_budget: Máximo de tokens do contexto enviado ao LLM,
+                medido com o tokenizer do modelo (None = sem limite)
+            reranker: Reordena os candidatos antes do LLM (opcional)
+            rerank_candidates: Candidatos buscados para o reranker escolher os top_k
             use_toon: Se True, usa TOON para formatar contexto
             system_context: Descrição do tipo de documentos (personalizável)
             context_name: Nome do contexto atual (ex: cond_169)
+            query_cache: Cache de embeddings das perguntas (opcional)
+            answer_cache: Cache semântico de respostas (opcional)
+            batch_concurrency: Chamadas simultâneas ao LLM em batch_query
+            requests_per_minute: Limite de chamadas ao LLM por minuto em batch_query (0 = sem limite)
         """
         self.vector_store = vector_store
+        self.query_cache = query_cache
+        self.answer_cache = answer_cache
         self.llm_provider = llm_provider
         self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.min_k = min_k
+        self.score_gap = score_gap
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.batch_concurrency = batch_concurrency
+        self.requests_per_minute = requests_per_minute
         self.context_name = context_name or "default"
-        self.toon_formatter = ToonFormatter(use_toon=use_toon)
+        self.toon_formatter = ToonFormatter(use_toon=use_toon, token_budget=context_token_budget)
 
         # Se tem context_name, personaliza o system_context
         if context_name and context_name != "default":
@@ -107,6 +146,9 @@ RESPOSTA:"""
         )
 
         # Configura prompt com o contexto do sistema
+        # Contagem de tokens do contexto com o tokenizer do modelo
+        self.toon_formatter.model = self._model_name()
+
         prompt_text = self.DEFAULT_PROMPT_TEMPLATE.replace("{system_context}", system_context)
         self._prompt = ChatPromptTemplate.from_template(prompt_text)
         self._output_parser = StrOutputParser()
@@ -137,6 +179,9 @@ RESPOSTA:"""
         llm_config = config.get("llm", {}).get(llm_provider, {})
         retrieval_config = config.get("retrieval", {})
         prompt_config = config.get("prompt", {})
+        batch_config = config.get("batch", {})
+        rerank_config = config.get("rerank", {})
+        query_cache, answer_cache = caches_from_config(config_path)
 
         return cls(
             vector_store=vector_store,
@@ -145,8 +190,18 @@ RESPOSTA:"""
             temperature=llm_config.get("temperature", 0.3),
             max_tokens=llm_config.get("max_tokens", 4096),
             top_k=retrieval_config.get("top_k", 8),
+            score_threshold=retrieval_config.get("score_threshold"),
+            min_k=retrieval_config.get("min_k", 1),
+            score_gap=retrieval_config.get("score_gap"),
+            context_token_budget=retrieval_config.get("context_token_budget") or None,
+            reranker=Reranker.from_config(config_path),
+            rerank_candidates=rerank_config.get("candidates", 50),
             system_context=prompt_config.get("system_context", "documentos e informações disponíveis"),
             context_name=context_name,
+            query_cache=query_cache,
+            answer_cache=answer_cache,
+            batch_concurrency=batch_config.get("concurrency", 4),
+            requests_per_minute=batch_config.get("requests_per_minute", 0),
         )
 
     def _create_llm(
@@ -174,53 +229,477 @@ RESPOSTA:"""
         else:
             raise ValueError(f"Provedor não suportado: {provider}")
 
+    @property
+    def llm_key(self) -> str:
+        """Identificador do provedor/modelo do LLM (parte da chave do cache de respostas)."""
+        return f"{self.llm_provider}:{self._model_name()}"
+
+    def _model_name(self) -> str:
+        """Nome do modelo do LLM em uso."""
+        return str(getattr(self._llm, "model_name", None) or getattr(self._llm, "model", "unknown"))
+
+    def _embed_question(self, question: str) -> List[float]:
+        """Embedding da pergunta, reaproveitando o cache quando disponível."""
+        if self.query_cache is None:
+            return self.vector_store.embed_query(question)
+
+        return self.query_cache.get_or_embed(self._embedding_key(), question, self.vector_store.embed_query)
+
+    def _embed_questions(self, questions: List[str]) -> List[List[float]]:
+        """Embeddings de várias perguntas em uma única chamada em lote."""
+        if self.query_cache is None:
+            return self.vector_store.embed_queries(questions)
+
+        return self.query_cache.get_or_embed_many(
+            self._embedding_key(), questions, self.vector_store.embed_queries
+        )
+
+    def _embedding_key(self) -> str:
+        """Identificador do modelo de embeddings (chave do cache de perguntas)."""
+        return self.vector_store.embedding_key
+
+    @property
+    def _answer_chain(self):
+        """Prompt → LLM → texto."""
+        return self._prompt | self._llm | self._output_parser
+
+    @staticmethod
+    def _format_sources(documents: List[Document]) -> List[dict]:
+        """Resumo das fontes exibido ao usuário ("context" na busca em vários contextos)."""
+        sources = []
+        for doc in documents:
+            source = {
+                "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                "file": doc.metadata.get("source", "unknown"),
+                "chunk": ToonFormatter.chunk_label(doc),
+            }
+            if "context" in doc.metadata:
+                source["context"] = doc.metadata["context"]
+            sources.append(source)
+        return sources
+
+    def _cache_scope(self, metadata_filter: Optional[MetadataFilter] = None) -> str:
+        """Escopo do cache de respostas: o contexto e, se houver, o filtro da busca."""
+        if metadata_filter is None:
+            return self.context_name
+        return f"{self.context_name}?{metadata_filter.key}"
+
+    def _retrieve(self, question: str, metadata_filter: Optional[MetadataFilter] = None) -> dict:
+        """
+        Etapa comum a query/stream: embedding, cache de respostas e busca.
+
+        Args:
+            question: Pergunta do usuário
+            metadata_filter: Restringe a busca aos chunks que atendem ao filtro
+
+        Returns:
+            Dicionário com "cached" (resposta do cache) ou, se None, com os
+            dados para gerar a resposta (sources, inputs do prompt...)
+        """
+        embedding = self._embed_question(question)
+        # Respostas com filtro só valem para o mesmo filtro
+        scope = self._cache_scope(metadata_filter)
+
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(
+                scope, self.vector_store.index_version, self.llm_key, embedding
+            )
+            if cached is not None:
+                return {"cached": cached}
+
+        # Versão lida antes da busca: se o índice mudar durante a geração, a
+        # resposta fica associada à versão antiga e é descartada
+        index_version = self.vector_store.index_version
+
+        # 1. Recupera documentos relevantes
+        documents = [doc for doc, _ in self._search([question], [embedding], metadata_filter)[0]]
+
+        return {**self._prepare(question, embedding, index_version, documents), "cache_scope": scope}
+
+    def _search(
+        self,
+        questions: List[str],
+        embeddings: List[List[float]],
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Busca os documentos das perguntas com threshold e top-k adaptativo.
+
+        Documentos pouco relevantes não chegam ao prompt: a lista para abaixo
+        de score_threshold ou em uma queda de similaridade maior que
+        score_gap, com no mínimo min_k e no máximo top_k documentos.
+
+        Com reranker, a busca traz até rerank_candidates documentos acima do
+        threshold e o reranker escolhe os top_k (score_gap não se aplica).
+        """
+        if self.reranker is None:
+            return self.vector_store.search_hybrid_many(
+                questions,
+                embeddings,
+                top_k=self.top_k,
+                min_similarity=self.score_threshold,
+                min_k=self.min_k,
+                score_gap=self.score_gap,
+                metadata_filter=metadata_filter,
+            )
+
+        candidates = self.vector_store.search_hybrid_many(
+            questions,
+            embeddings,
+            top_k=max(self.top_k, self.rerank_candidates),
+            min_similarity=self.score_threshold,
+            min_k=self.min_k,
+            metadata_filter=metadata_filter,
+        )
+        return [
+            self.reranker.rerank(question, results, self.top_k)
+            for question, results in zip(questions, candidates)
+        ]
+
+    def _prepare(
+        self,
+        question: str,
+        embedding: List[float],
+        index_version: str,
+        documents: List[Document],
+    ) -> dict:
+        """Monta os dados para gerar a resposta a partir dos documentos recuperados."""
+        # Une chunks vizinhos e corta no orçamento de tokens do contexto
+        if self.toon_formatter.token_budget:
+            documents = self.toon_formatter.pack_documents(documents)
+
+        # 2. Formata contexto em TOON
+        context = self.toon_formatter.format_documents(documents)
+
+        return {
+            "cached": None,
+            "embedding": embedding,
+            "index_version": index_version,
+            "sources": self._format_sources(documents),
+            "inputs": {"context": context, "question": question},
+        }
+
+    def _finish(self, retrieval: dict, answer: str) -> dict:
+        """Monta o resultado final e o guarda no cache de respostas."""
+        result = {
+            "answer": answer,
+            "llm_provider": self.llm_provider,
+            "context_format": self.toon_formatter.format_type,
+            "sources": retrieval["sources"],
+        }
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                retrieval.get("cache_scope", self.context_name),
+                retrieval["index_version"],
+                self.llm_key,
+                retrieval["embedding"],
+                result,
+            )
+
+        return result
+
     def query(
         self,
         question: str,
         return_sources: bool = True,
+        metadata_filter: Optional[MetadataFilter] = None,
     ) -> dict:
         """
         Executa query no RAG e retorna resposta.
 
+        Perguntas semelhantes a uma já respondida no mesmo contexto (e com o
+        índice inalterado) são respondidas pelo cache, sem chamar o LLM.
+
         Args:
             question: Pergunta do usuário
             return_sources: Se True, retorna também os documentos fonte
+            metadata_filter: Restringe a busca (ex: um arquivo, páginas, seção)
 
         Returns:
-            Dicionário com resposta e metadados
+            Dicionário com resposta e metadados ("cached" indica resposta do cache)
         """
-        # 1. Recupera documentos relevantes
-        documents = self.vector_store.search_documents(
-            query=question,
-            top_k=self.top_k,
+        retrieval = self._retrieve(question, metadata_filter)
+
+        if retrieval["cached"] is not None:
+            result = {**retrieval["cached"], "cached": True}
+        else:
+            # 3. Gera resposta com LLM
+            answer = self._answer_chain.invoke(retrieval["inputs"])
+            result = {**self._finish(retrieval, answer), "cached": False}
+
+        if not return_sources:
+            result.pop("sources", None)
+
+        return result
+
+    def stream(self, question: str, metadata_filter: Optional[MetadataFilter] = None) -> Iterator[dict]:
+        """
+        Executa query no RAG emitindo a resposta à medida que é gerada.
+
+        As fontes são emitidas logo após a busca, antes do primeiro token do
+        LLM.
+
+        Args:
+            question: Pergunta do usuário
+            metadata_filter: Restringe a busca (ex: um arquivo, páginas, seção)
+
+        Yields:
+            Eventos ``{"type": "sources", "sources", "cached"}``, depois
+            ``{"type": "token", "text"}`` (vários) e por fim
+            ``{"type": "done", ...}`` com o mesmo conteúdo de query()
+        """
+        retrieval = self._retrieve(question, metadata_filter)
+
+        cached = retrieval["cached"]
+        if cached is not None:
+            yield {"type": "sources", "sources": cached.get("sources", []), "cached": True}
+            yield {"type": "token", "text": cached["answer"]}
+            yield {"type": "done", **cached, "cached": True}
+            return
+
+        yield {"type": "sources", "sources": retrieval["sources"], "cached": False}
+
+        parts = []
+        for token in self._answer_chain.stream(retrieval["inputs"]):
+            if token:
+                parts.append(token)
+                yield {"type": "token", "text": token}
+
+        # Só respostas completas entram no cache
+        yield {"type": "done", **self._finish(retrieval, "".join(parts)), "cached": False}
+
+    async def astream(
+        self,
+        question: str,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Versão assíncrona de stream() (mesmos eventos).
+
+        A busca roda em uma thread para não bloquear o event loop.
+
+        Args:
+            question: Pergunta do usuário
+            metadata_filter: Restringe a busca (ex: um arquivo, páginas, seção)
+
+        Yields:
+            Eventos "sources", "token" e "done"
+        """
+        retrieval = await asyncio.to_thread(self._retrieve, question, metadata_filter)
+
+        cached = retrieval["cached"]
+        if cached is not None:
+            yield {"type": "sources", "sources": cached.get("sources", []), "cached": True}
+            yield {"type": "token", "text": cached["answer"]}
+            yield {"type": "done", **cached, "cached": True}
+            return
+
+        yield {"type": "sources", "sources": retrieval["sources"], "cached": False}
+
+        parts = []
+        async for token in self._answer_chain.astream(retrieval["inputs"]):
+            if token:
+                parts.append(token)
+                yield {"type": "token", "text": token}
+
+        yield {"type": "done", **self._finish(retrieval, "".join(parts)), "cached": False}
+
+    async def abatch_query(
+        self,
+        questions: Iterable[str],
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        output: Optional[Union[str, Path, TextIO]] = None,
+        return_sources: bool = True,
+    ) -> List[dict]:
+        """
+        Responde muitas perguntas de uma vez (avaliações, geração de FAQ).
+
+        Todas as perguntas são embedadas em um único lote e buscadas em uma
+        única chamada vetorizada ao FAISS; perguntas repetidas (texto
+        normalizado) e respostas já no cache não chamam o LLM. As chamadas ao
+        LLM rodam em paralelo, limitadas por ``concurrency`` e
+        ``requests_per_minute``.
+
+        Args:
+            questions: Perguntas
+            concurrency: Chamadas simultâneas ao LLM (padrão: batch_concurrency)
+            requests_per_minute: Limite de chamadas por minuto (padrão: requests_per_minute)
+            output: Arquivo JSONL (caminho ou arquivo aberto) que recebe cada
+                resultado assim que fica pronto, com "index" e "question"
+            return_sources: Se True, inclui os documentos fonte
+
+        Returns:
+            Resultados na ordem das perguntas (mesmo formato de query(); "error"
+            se a chamada ao LLM falhou)
+        """
+        questions = list(questions)
+        concurrency = concurrency or self.batch_concurrency
+        if requests_per_minute is None:
+            requests_per_minute = self.requests_per_minute
+
+        results: List[Optional[dict]] = [None] * len(questions)
+        if not questions:
+            return []
+
+        opened = isinstance(output, (str, Path))
+        stream = open(output, "w", encoding="utf-8") if opened else output
+
+        def emit(index: int, result: dict) -> None:
+            if not return_sources:
+                result = {k: v for k, v in result.items() if k != "sources"}
+            results[index] = result
+            if stream is not None:
+                line = {"index": index, "question": questions[index], **result}
+                stream.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+                stream.flush()
+
+        try:
+            # 1. Um único lote de embeddings
+            embeddings = await asyncio.to_thread(self._embed_questions, questions)
+            index_version = self.vector_store.index_version
+
+            # Respostas do cache saem imediatamente; perguntas repetidas
+            # compartilham a mesma busca e a mesma chamada ao LLM
+            groups: dict = {}
+            for i, (question, embedding) in enumerate(zip(questions, embeddings)):
+                cached = None
+                if self.answer_cache is not None:
+                    cached = self.answer_cache.lookup(
+                        self.context_name, index_version, self.llm_key, embedding
+                    )
+                if cached is not None:
+                    emit(i, {**cached, "cached": True})
+                else:
+                    groups.setdefault(QueryEmbeddingCache.normalize(question), []).append(i)
+
+            # 2. Uma busca vetorizada para todas as perguntas restantes
+            groups = list(groups.values())
+            hits = await asyncio.to_thread(
+                self._search,
+                [questions[group[0]] for group in groups],
+                [embeddings[group[0]] for group in groups],
+            )
+
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            limiter = AsyncRateLimiter(requests_per_minute)
+
+            async def answer(group: List[int], documents: List[Document]) -> None:
+                first = group[0]
+                retrieval = self._prepare(questions[first], embeddings[first], index_version, documents)
+
+                # 3. Chamadas ao LLM em paralelo, com limite de taxa
+                async with semaphore:
+                    await limiter.acquire()
+                    try:
+                        answer_text = await self._answer_chain.ainvoke(retrieval["inputs"])
+                        result = {**self._finish(retrieval, answer_text), "cached": False}
+                    except Exception as e:
+                        result = {"error": str(e), "llm_provider": self.llm_provider}
+
+                for i in group:
+                    emit(i, result)
+
+            await asyncio.gather(*(
+                answer(group, [doc for doc, _ in group_hits])
+                for group, group_hits in zip(groups, hits)
+            ))
+
+        finally:
+            if opened:
+                stream.close()
+
+        return results
+
+    def batch_query(
+        self,
+        questions: Iterable[str],
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        output: Optional[Union[str, Path, TextIO]] = None,
+        return_sources: bool = True,
+    ) -> List[dict]:
+        """
+        Versão síncrona de abatch_query (para scripts; dentro de um event loop
+        use abatch_query).
+
+        Args:
+            questions: Perguntas
+            concurrency: Chamadas simultâneas ao LLM (padrão: batch_concurrency)
+            requests_per_minute: Limite de chamadas por minuto (padrão: requests_per_minute)
+            output: Arquivo JSONL que recebe cada resultado assim que fica pronto
+            return_sources: Se True, inclui os documentos fonte
+
+        Returns:
+            Resultados na ordem das perguntas
+        """
+        return asyncio.run(self.abatch_query(
+            questions,
+            concurrency=concurrency,
+            requests_per_minute=requests_per_minute,
+            output=output,
+            return_sources=return_sources,
+        ))
+
+    def query_contexts(
+        self,
+        question: str,
+        federated: FederatedSearch,
+        contexts: List[str],
+        return_sources: bool = True,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> dict:
+        """
+        Responde com documentos de vários contextos (ex: todos os condomínios).
+
+        A pergunta é embedada uma vez (com o cache de perguntas deste chain)
+        e buscada em paralelo nos contextos; os documentos unidos, com o
+        contexto de origem de cada um, geram uma única resposta. O cache de
+        respostas não é usado (a resposta depende de vários índices).
+
+        Args:
+            question: Pergunta do usuário
+            federated: Busca federada sobre os contextos carregados
+            contexts: Nomes dos contextos
+            return_sources: Se True, retorna também os documentos fonte
+            metadata_filter: Filtro aplicado à busca em cada contexto
+
+        Returns:
+            Mesmo formato de query(), com "context" em cada fonte e
+            "contexts" (documentos usados de cada contexto)
+        """
+        embedding = self._embed_question(question)
+        results = federated.search_many(
+            contexts,
+            question,
+            embedding=embedding,
+            embedding_key=self._embedding_key(),
+            top_k=max(self.top_k, self.rerank_candidates) if self.reranker else None,
+            metadata_filter=metadata_filter,
         )
+        if self.reranker is not None:
+            results = self.reranker.rerank(question, results, federated.top_k)
 
-        # 2. Formata contexto em TOON
-        context = self.toon_formatter.format_documents(documents)
+        documents = [doc for doc, _ in results]
+        retrieval = self._prepare(question, embedding, "", documents)
 
-        # 3. Gera resposta com LLM
-        chain = self._prompt | self._llm | self._output_parser
-        response = chain.invoke({
-            "context": context,
-            "question": question,
-        })
+        # Atribuição: documentos usados de cada contexto
+        counts = dict.fromkeys(contexts, 0)
+        for doc in documents:
+            name = doc.metadata["context"]
+            counts[name] = counts.get(name, 0) + 1
 
         result = {
-            "answer": response,
+            "answer": self._answer_chain.invoke(retrieval["inputs"]),
             "llm_provider": self.llm_provider,
             "context_format": self.toon_formatter.format_type,
+            "sources": retrieval["sources"],
+            "contexts": counts,
+            "cached": False,
         }
-
-        if return_sources:
-            result["sources"] = [
-                {
-                    "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    "file": doc.metadata.get("source", "unknown"),
-                    "chunk": f"{doc.metadata.get('chunk_index', 0) + 1}/{doc.metadata.get('total_chunks', '?')}",
-                }
-                for doc in documents
-            ]
-
+        if not return_sources:
+            result.pop("sources", None)
         return result
 
     def query_with_scores(
@@ -234,18 +713,22 @@ RESPOSTA:"""
             question: Pergunta do usuário
 
         Returns:
-            Dicionário com resposta, fontes e scores
+            Dicionário com resposta, fontes e scores: ``relevance`` é a
+            similaridade (0 a 1); na busca híbrida o score RRF vem em ``rrf_score``
         """
         # Recupera com scores
-        results = self.vector_store.search(
-            query=question,
-            top_k=self.top_k,
-        )
+        results = self._search([question], [self._embed_question(question)])[0]
 
-        documents = [doc for doc, _ in results]
+        # Busca híbrida retorna o score RRF (só de posição), não uma similaridade
+        if self.vector_store.hybrid_search:
+            label = "rrf_score"
+            results = [(doc, round(score, 4)) for doc, score in results]
+        else:
+            label = "relevance"
+            results = [(doc, round(self.vector_store.similarity(score), 3)) for doc, score in results]
 
         # Formata contexto
-        context = self.toon_formatter.format_with_scores(results)
+        context = self.toon_formatter.format_with_scores(results, score_label=label)
 
         # Gera resposta
         chain = self._prompt | self._llm | self._output_parser
@@ -260,7 +743,7 @@ RESPOSTA:"""
                 {
                     "content": doc.page_content[:200] + "...",
                     "file": doc.metadata.get("source", "unknown"),
-                    "relevance": round(1 - score, 3),
+                    label: score,
                 }
                 for doc, score in results
             ],
@@ -286,13 +769,21 @@ RESPOSTA:"""
             temperature=0.3,
             max_tokens=4096,
         )
+        self.toon_formatter.model = self._model_name()
 
     def get_info(self) -> dict:
         """Retorna informações sobre a configuração atual."""
         return {
             "llm_provider": self.llm_provider,
-            "model": self._llm.model_name if hasattr(self._llm, 'model_name') else str(self._llm.model),
+            "model": self._model_name(),
             "top_k": self.top_k,
+            "score_threshold": self.score_threshold,
+            "min_k": self.min_k,
+            "score_gap": self.score_gap,
+            "context_token_budget": self.toon_formatter.token_budget,
+            "reranker": self.reranker.get_stats() if self.reranker else None,
             "context_format": self.toon_formatter.format_type,
             "vector_store_initialized": self.vector_store.is_initialized,
+            "query_cache": self.query_cache.get_stats() if self.query_cache else None,
+            "answer_cache": self.answer_cache.get_stats() if self.answer_cache else None,
         }
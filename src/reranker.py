@@ -0,0 +1,292 @@
+"""Reranker - Reordenação local (CPU) dos documentos recuperados com um cross-encoder."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import toml
+from langchain_core.documents import Document
+
+from .embedding_cache import EmbeddingCache
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+# (pergunta, textos) -> relevância de cada texto (maior = mais relevante)
+ScoreFn = Callable[[str, List[str]], List[float]]
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder exportado para ONNX (ex: bge-reranker-base, inclusive int8).
+
+    A pasta do modelo deve conter o ``tokenizer.json`` e um ``model.onnx``
+    (ou ``model_quantized.onnx``, preferido quando existe).
+    """
+
+    def __init__(self, model_path: str, max_length: int = 512, threads: int = 0):
+        """
+        Carrega o modelo.
+
+        Args:
+            model_path: Pasta com o modelo ONNX e o tokenizer.json
+            max_length: Máximo de tokens por par (pergunta, texto)
+            threads: Threads do onnxruntime (0 = padrão do onnxruntime)
+        """
+        if not ONNX_AVAILABLE:
+            raise ImportError("Reranker ONNX requer os pacotes onnxruntime e tokenizers.")
+
+        folder = Path(model_path)
+        model_file = next(
+            (folder / name for name in ("model_quantized.onnx", "model.onnx") if (folder / name).exists()),
+            None,
+        )
+        if model_file is None:
+            raise FileNotFoundError(f"Modelo ONNX não encontrado em {model_path}")
+
+        self.tokenizer = Tokenizer.from_file(str(folder / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_token = next(
+            (token for token in ("<pad>", "[PAD]") if self.tokenizer.token_to_id(token) is not None),
+            "[PAD]",
+        )
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def __call__(self, query: str, texts: List[str]) -> List[float]:
+        """Relevância de cada texto para a pergunta (logit do cross-encoder)."""
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        logits = self.session.run(None, inputs)[0]
+        return logits.reshape(len(texts), -1)[:, 0].astype(float).tolist()
+
+
+class Reranker:
+    """
+    Reordena os candidatos da busca por relevância com um modelo local.
+
+    A busca traz mais candidatos que o necessário (ex: 50) e o reranker
+    pontua os pares (pergunta, chunk) em lotes, mantendo os melhores. As
+    pontuações ficam em cache LRU por (pergunta normalizada, texto do chunk).
+    Se pontuar os candidatos passar de ``timeout_ms``, a reordenação é
+    abandonada e vale a ordem original da busca.
+    """
+
+    _shared: Dict[str, "Reranker"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        model_key: str = "custom",
+        batch_size: int = 16,
+        timeout_ms: float = 800,
+        cache_max_entries: int = 20000,
+    ):
+        """
+        Inicializa o reranker.
+
+        Args:
+            score_fn: Função (pergunta, textos) -> relevâncias (ex: OnnxCrossEncoder)
+            model_key: Identificador do modelo (parte da chave do cache)
+            batch_size: Pares (pergunta, chunk) por chamada ao modelo
+            timeout_ms: Tempo máximo da reordenação (0 = sem limite)
+            cache_max_entries: Máximo de pontuações em cache (0 = sem cache)
+        """
+        self.score_fn = score_fn
+        self.model_key = model_key
+        self.batch_size = max(1, batch_size)
+        self.timeout_ms = timeout_ms
+        self.cache_max_entries = cache_max_entries
+
+        self._cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Uma chamada ao modelo por vez: as threads do onnxruntime já usam a CPU toda
+        self._model_lock = threading.Lock()
+
+        self.calls = 0
+        self.cache_hits = 0
+        self.scored = 0
+        self.fallbacks = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def shared(cls, model_path: str, max_length: int = 512, threads: int = 0, **kwargs) -> "Reranker":
+        """
+        Retorna o reranker do modelo, carregado uma única vez por processo.
+
+        Args:
+            model_path: Pasta com o modelo ONNX e o tokenizer.json
+            max_length: Máximo de tokens por par (pergunta, texto)
+            threads: Threads do onnxruntime (0 = padrão do onnxruntime)
+            **kwargs: Demais argumentos do construtor
+
+        Returns:
+            Instância compartilhada
+        """
+        with cls._shared_lock:
+            reranker = cls._shared.get(model_path)
+            if reranker is None:
+                encoder = OnnxCrossEncoder(model_path, max_length=max_length, threads=threads)
+                reranker = cls._shared[model_path] = cls(encoder, model_key=model_path, **kwargs)
+            return reranker
+
+    @classmethod
+    def from_config(cls, config_path: str = "config.toml") -> Optional["Reranker"]:
+        """
+        Cria o reranker configurado em [rerank].
+
+        Args:
+            config_path: Caminho para o arquivo config.toml
+
+        Returns:
+            Reranker compartilhado ou None se desativado/indisponível
+        """
+        config = toml.load(config_path)
+        rerank_config = config.get("rerank", {})
+
+        if not rerank_config.get("enabled", False):
+            return None
+
+        try:
+            return cls.shared(
+                model_path=rerank_config.get("model_path", "models/bge-reranker-base"),
+                max_length=rerank_config.get("max_length", 512),
+                threads=rerank_config.get("threads", 0),
+                batch_size=rerank_config.get("batch_size", 16),
+                timeout_ms=rerank_config.get("timeout_ms", 800),
+                cache_max_entries=rerank_config.get("cache_max_entries", 20000),
+            )
+        except Exception as e:
+            print(f"Aviso: reranker desativado ({e}).")
+            return None
+
+    def _key(self, query: str, text: str) -> Tuple[str, str, str]:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return self.model_key, EmbeddingCache.normalize_text(query).casefold(), digest
+
+    def score(self, query: str, texts: List[str]) -> Optional[List[float]]:
+        """
+        Pontua os textos para a pergunta, usando o cache quando possível.
+
+        Args:
+            query: Pergunta
+            texts: Textos dos candidatos
+
+        Returns:
+            Relevância de cada texto ou None se o tempo limite esgotou
+        """
+        started = time.perf_counter()
+        deadline = started + self.timeout_ms / 1000 if self.timeout_ms else None
+
+        keys = [self._key(query, text) for text in texts]
+        scores: Dict[Tuple[str, str, str], float] = {}
+        missing: Dict[Tuple[str, str, str], str] = {}
+
+        with self._lock:
+            self.calls += 1
+            for key, text in zip(keys, texts):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+                    self.cache_hits += 1
+                else:
+                    missing[key] = text
+
+        pending = list(missing.items())
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                if deadline is not None and time.perf_counter() > deadline:
+                    with self._lock:
+                        self.fallbacks += 1
+                    return None
+
+                batch = pending[start:start + self.batch_size]
+                with self._model_lock:
+                    batch_scores = self.score_fn(query, [text for _, text in batch])
+
+                with self._lock:
+                    self.scored += len(batch)
+                    for (key, _), value in zip(batch, batch_scores):
+                        scores[key] = float(value)
+                        if self.cache_max_entries:
+                            self._cache[key] = float(value)
+                    while len(self._cache) > self.cache_max_entries:
+                        self._cache.popitem(last=False)
+        finally:
+            with self._lock:
+                self.total_seconds += time.perf_counter() - started
+
+        return [scores[key] for key in keys]
+
+    def rerank(
+        self,
+        query: str,
+        results: List[Tuple[Document, float]],
+        top_n: int,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Reordena os resultados da busca e mantém os ``top_n`` melhores.
+
+        Args:
+            query: Pergunta
+            results: Tuplas (Document, score) na ordem da busca
+            top_n: Número de resultados mantidos
+
+        Returns:
+            Tuplas (Document, score da busca) na nova ordem; na ordem original
+            se o tempo limite esgotou ou o modelo falhou
+        """
+        if len(results) <= 1:
+            return results[:top_n]
+
+        try:
+            scores = self.score(query, [doc.page_content for doc, _ in results])
+        except Exception as e:
+            print(f"Erro no reranker: {e}")
+            with self._lock:
+                self.fallbacks += 1
+            scores = None
+
+        if scores is None:
+            return results[:top_n]
+
+        # sorted é estável: empates mantêm a ordem da busca
+        order = sorted(range(len(results)), key=lambda i: -scores[i])
+        return [results[i] for i in order[:top_n]]
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas de uso."""
+        with self._lock:
+            return {
+                "model": self.model_key,
+                "calls": self.calls,
+                "scored": self.scored,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self._cache),
+                "fallbacks": self.fallbacks,
+                "avg_latency_ms": round(1000 * self.total_seconds / self.calls, 1) if self.calls else 0.0,
+            }
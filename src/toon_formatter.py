@@ -1,5 +1,9 @@
 """TOON Formatter - Serialização de contexto em formato TOON para economia de tokens."""
 
+import json
+import math
+import threading
+from collections import defaultdict
 from typing import List, Dict, Any, Optional
 
 try:
@@ -7,11 +11,86 @@ try:
     TOONS_AVAILABLE = True
 except ImportError:
     TOONS_AVAILABLE = False
-    import json
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
 
 from langchain_core.documents import Document
 
 
+class TokenCounter:
+    """
+    Conta tokens com o tokenizer local (tiktoken) do modelo de destino.
+
+    Modelos sem tokenizer no tiktoken (ex: Claude) usam o ``o200k_base`` como
+    aproximação. Sem tiktoken, ou sem os arquivos do encoding (ambiente sem
+    internet na primeira execução), usa a estimativa de ~4 caracteres por
+    token.
+    """
+
+    FALLBACK_ENCODING = "o200k_base"
+    CHARS_PER_TOKEN = 4
+
+    # Encodings carregados por modelo (compartilhados no processo)
+    _encodings: Dict[str, Any] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model: Optional[str] = None):
+        """
+        Inicializa o contador.
+
+        Args:
+            model: Nome do modelo (ex: gpt-4o, claude-sonnet-4-20250514)
+        """
+        self.model = model or "gpt-4o"
+        self._encoding = self._load_encoding(self.model)
+
+    @classmethod
+    def _load_encoding(cls, model: str):
+        """Carrega (uma vez por modelo) o encoding do tiktoken."""
+        with cls._lock:
+            if model in cls._encodings:
+                return cls._encodings[model]
+
+            encoding = None
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    try:
+                        encoding = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        encoding = tiktoken.get_encoding(cls.FALLBACK_ENCODING)
+                except Exception as e:
+                    print(f"Aviso: tokenizer de '{model}' indisponível ({e}). Estimando tokens por caracteres.")
+
+            cls._encodings[model] = encoding
+            return encoding
+
+    @property
+    def is_exact(self) -> bool:
+        """True se usa o tokenizer real (False = estimativa por caracteres)."""
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        """Número de tokens do texto."""
+        if self._encoding is None:
+            return math.ceil(len(text) / self.CHARS_PER_TOKEN)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Corta o texto para caber em ``max_tokens`` tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            return text[:max_tokens * self.CHARS_PER_TOKEN]
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens])
+
+
 class ToonFormatter:
     """
     Formata contexto recuperado em formato TOON para envio ao LLM.
@@ -20,14 +99,29 @@ class ToonFormatter:
     comparado a JSON, ideal para maximizar contexto em prompts de LLM.
     """
 
-    def __init__(self, use_toon: bool = True):
+    # Sobreposição máxima procurada ao unir chunks vizinhos (chunk_overlap é bem menor)
+    MAX_OVERLAP_CHARS = 400
+    # Sobreposições menores que isso são coincidências, não overlap do chunker
+    MIN_OVERLAP_CHARS = 8
+
+    def __init__(
+        self,
+        use_toon: bool = True,
+        token_budget: Optional[int] = None,
+        model: Optional[str] = None,
+    ):
         """
         Inicializa o formatter.
 
         Args:
             use_toon: Se True, usa TOON. Se False ou indisponível, usa JSON.
+            token_budget: Máximo de tokens do contexto em pack_documents (None = sem limite)
+            model: Modelo de destino (tokenizer usado na contagem)
         """
         self.use_toon = use_toon and TOONS_AVAILABLE
+        self.token_budget = token_budget
+        self.model = model
+        self._counter: Optional[TokenCounter] = None
 
         if use_toon and not TOONS_AVAILABLE:
             print("Aviso: biblioteca 'toons' não disponível. Usando JSON como fallback.")
@@ -37,6 +131,7 @@ class ToonFormatter:
         documents: List[Document],
         include_metadata: bool = True,
         max_content_length: Optional[int] = None,
+        token_budget: Optional[int] = None,
     ) -> str:
         """
         Formata lista de Documents para contexto do LLM.
@@ -45,10 +140,24 @@ class ToonFormatter:
             documents: Lista de Documents recuperados
             include_metadata: Se True, inclui metadados (source, etc)
             max_content_length: Limite de caracteres por conteúdo
+            token_budget: Se informado, empacota os documentos nesse número de
+                tokens antes de formatar (ver pack_documents)
 
         Returns:
             String formatada em TOON ou JSON
         """
+        if token_budget:
+            documents = self.pack_documents(documents, token_budget, include_metadata)
+
+        return self._serialize({"sources": self._source_entries(documents, include_metadata, max_content_length)})
+
+    def _source_entries(
+        self,
+        documents: List[Document],
+        include_metadata: bool = True,
+        max_content_length: Optional[int] = None,
+    ) -> List[dict]:
+        """Monta as entradas "sources" do contexto."""
         sources = []
 
         for i, doc in enumerate(documents):
@@ -65,27 +174,169 @@ class ToonFormatter:
             if include_metadata:
                 source_data["file"] = doc.metadata.get("source", "unknown")
 
+                # Busca em vários contextos: contexto de origem do trecho
+                if "context" in doc.metadata:
+                    source_data["context"] = doc.metadata["context"]
+
                 # Adiciona chunk info se disponível
                 if "chunk_index" in doc.metadata:
-                    source_data["chunk"] = f"{doc.metadata['chunk_index'] + 1}/{doc.metadata.get('total_chunks', '?')}"
+                    source_data["chunk"] = self.chunk_label(doc)
 
             sources.append(source_data)
 
-        context = {"sources": sources}
+        return sources
 
-        return self._serialize(context)
+    @staticmethod
+    def chunk_label(doc: Document) -> str:
+        """Posição do chunk no arquivo (ex: "3/10", ou "3-4/10" se unidos)."""
+        position = doc.metadata.get("chunk_range") or doc.metadata.get("chunk_index", 0) + 1
+        return f"{position}/{doc.metadata.get('total_chunks', '?')}"
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        """Contador de tokens do modelo de destino."""
+        if self._counter is None or self._counter.model != (self.model or "gpt-4o"):
+            self._counter = TokenCounter(self.model)
+        return self._counter
+
+    def pack_documents(
+        self,
+        documents: List[Document],
+        token_budget: Optional[int] = None,
+        include_metadata: bool = True,
+    ) -> List[Document]:
+        """
+        Seleciona os documentos que cabem no orçamento de tokens do contexto.
+
+        Chunks repetidos são descartados e chunks vizinhos do mesmo arquivo
+        são unidos sem repetir o texto sobreposto pelo chunker. Os blocos
+        resultantes entram em ordem de relevância (ordem de ``documents``)
+        enquanto couberem; se nem o mais relevante couber, ele é cortado.
+        O orçamento vale para o contexto já serializado, medido com o
+        tokenizer do modelo.
+
+        Args:
+            documents: Documentos recuperados, do mais ao menos relevante
+            token_budget: Máximo de tokens (padrão: token_budget do formatter)
+            include_metadata: Se True, conta os metadados formatados
+
+        Returns:
+            Documentos a enviar ao LLM, em ordem de relevância
+        """
+        token_budget = token_budget or self.token_budget
+        units = self.merge_adjacent(documents)
+        if not token_budget:
+            return units
+
+        counter = self.token_counter
+
+        def cost(docs: List[Document]) -> int:
+            return counter.count(self._serialize({"sources": self._source_entries(docs, include_metadata)}))
+
+        selected: List[Document] = []
+        used = cost([])
+        for unit in units:
+            # Custo incremental da entrada (o cabeçalho já foi contado)
+            unit_cost = cost([unit]) - cost([])
+            if used + unit_cost <= token_budget:
+                selected.append(unit)
+                used += unit_cost
+            elif not selected:
+                # Nem o bloco mais relevante cabe: envia o início dele
+                available = token_budget - used - (unit_cost - counter.count(unit.page_content))
+                content = counter.truncate(unit.page_content, available)
+                if content:
+                    selected.append(Document(page_content=content, metadata=dict(unit.metadata)))
+                    used = cost(selected)
+
+        # A soma por entrada é uma estimativa; confirma no contexto completo
+        while selected and cost(selected) > token_budget:
+            selected.pop()
+
+        return selected
+
+    def merge_adjacent(self, documents: List[Document]) -> List[Document]:
+        """
+        Remove chunks repetidos e une chunks consecutivos do mesmo arquivo.
+
+        O bloco unido fica na posição do chunk mais relevante do grupo e
+        recebe "chunk_range" nos metadados (ex: "3-4").
+
+        Args:
+            documents: Documentos recuperados, do mais ao menos relevante
+
+        Returns:
+            Blocos em ordem de relevância
+        """
+        units = []
+        by_source = defaultdict(list)
+        seen = set()
+
+        for rank, doc in enumerate(documents):
+            key = (doc.metadata.get("context"), doc.page_content.strip())
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if isinstance(doc.metadata.get("chunk_index"), int) and "source" in doc.metadata:
+                # Arquivos de mesmo nome em contextos diferentes não se misturam
+                by_source[(doc.metadata.get("context"), doc.metadata["source"])].append((rank, doc))
+            else:
+                units.append((rank, doc))
+
+        for chunks in by_source.values():
+            chunks.sort(key=lambda item: item[1].metadata["chunk_index"])
+            run = [chunks[0]]
+            for item in chunks[1:]:
+                if item[1].metadata["chunk_index"] == run[-1][1].metadata["chunk_index"] + 1:
+                    run.append(item)
+                else:
+                    units.append(self._merge_run(run))
+                    run = [item]
+            units.append(self._merge_run(run))
+
+        units.sort(key=lambda item: item[0])
+        return [doc for _, doc in units]
+
+    def _merge_run(self, run: List[tuple]) -> tuple:
+        """Une chunks consecutivos (rank, Document) em um único bloco."""
+        if len(run) == 1:
+            return run[0]
+
+        text = run[0][1].page_content
+        for _, doc in run[1:]:
+            overlap = self._overlap(text, doc.page_content)
+            text += doc.page_content[overlap:] if overlap else "\n" + doc.page_content
+
+        first = run[0][1].metadata["chunk_index"]
+        last = run[-1][1].metadata["chunk_index"]
+        metadata = dict(run[0][1].metadata)
+        metadata["chunk_range"] = f"{first + 1}-{last + 1}"
+
+        return min(rank for rank, _ in run), Document(page_content=text, metadata=metadata)
+
+    def _overlap(self, previous: str, current: str) -> int:
+        """Tamanho do maior sufixo de ``previous`` que é prefixo de ``current``."""
+        longest = min(len(previous), len(current), self.MAX_OVERLAP_CHARS)
+        for size in range(longest, self.MIN_OVERLAP_CHARS - 1, -1):
+            if previous.endswith(current[:size]):
+                return size
+        return 0
 
     def format_with_scores(
         self,
         results: List[tuple],  # List[(Document, float)]
         include_scores: bool = True,
+        score_label: str = "relevance",
     ) -> str:
         """
         Formata resultados de busca com scores de similaridade.
 
         Args:
-            results: Lista de tuplas (Document, score)
+            results: Lista de tuplas (Document, score), com o score já na
+                escala exibida (ex: VectorStore.similarity)
             include_scores: Se True, inclui scores na saída
+            score_label: Nome do campo do score (ex: "rrf_score" na busca híbrida)
 
         Returns:
             String formatada em TOON ou JSON
@@ -100,7 +351,7 @@ class ToonFormatter:
             }
 
             if include_scores:
-                source_data["relevance"] = round(1 - score, 3)  # Converte distância para similaridade
+                source_data[score_label] = score
 
             sources.append(source_data)
 
@@ -161,9 +412,10 @@ class ToonFormatter:
         json_chars = len(json_str)
         toon_chars = len(toon_str)
 
-        # Estimativa aproximada: ~4 caracteres por token
-        json_tokens_est = json_chars / 4
-        toon_tokens_est = toon_chars / 4
+        # Tokenizer real quando disponível (senão ~4 caracteres por token)
+        counter = TokenCounter()
+        json_tokens_est = counter.count(json_str)
+        toon_tokens_est = counter.count(toon_str)
 
         savings_pct = ((json_chars - toon_chars) / json_chars) * 100 if json_chars > 0 else 0
 
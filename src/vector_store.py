@@ -1,29 +1,83 @@
 """Vector Store - FAISS para indexação e busca de documentos."""
 
+import hashlib
 import json
+import os
+import re
+import shutil
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
+import faiss
+import numpy as np
 import toml
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings
 
+from .chunk_store import ChunkStore
+from .diversity import mmr, simhash, unique_indices
+from .metadata_filter import MetadataFilter, MetadataIndex
 from .embeddings import EmbeddingsManager
+from .model_registry import EmbeddingModelInfo, EmbeddingModelRegistry
+from .faiss_index import (
+    IndexSettings,
+    build_from_index,
+    bytes_per_vector,
+    code_size_of,
+    copy_to_memory,
+    id_selector,
+    index_layout,
+    index_type_of,
+    measure_recall,
+    mmap_io_flags,
+    prepare_index,
+    supports_remove,
+)
 
 
 class VectorStore:
     """Gerencia o índice FAISS para busca por similaridade."""
 
     METADATA_FILE = "index_metadata.json"
+    MANIFEST_FILE = "file_manifest.json"
+    # Posição no índice FAISS -> ID do chunk (substitui o mapeamento do index.pkl)
+    IDS_FILE = "index_ids.npy"
+    LEGACY_DOCSTORE_FILE = "index.pkl"
+    # Cada save grava os arquivos do índice em uma nova geração (gen-000001/...)
+    # e só então troca o CURRENT: quem carrega vê sempre uma geração completa
+    CURRENT_FILE = "CURRENT"
+    GENERATION_PREFIX = "gen-"
+    # Gerações mantidas no disco (a anterior segue legível para quem a carregou)
+    KEEP_GENERATIONS = 2
     CONTEXTS_BASE_DIR = "data/faiss_index"
+    # Fração de posições removidas (HNSW/IVF) que dispara a compactação do índice
+    TOMBSTONE_COMPACT_RATIO = 0.2
+    # Após uma promoção recusada pelo recall, só tenta de novo quando o
+    # número de vetores crescer este fator (cada tentativa treina e mede)
+    PROMOTION_RETRY_GROWTH = 1.25
+    # Candidatos de cada busca (vetorial e lexical) por resultado na busca híbrida
+    HYBRID_CANDIDATES_FACTOR = 4
+    # Candidatos por resultado quando há remoção de quase-duplicatas ou MMR
+    DIVERSITY_CANDIDATES_FACTOR = 4
+    # Com filtro de metadados, até este nº de posições selecionadas a busca em
+    # HNSW/IVF é exaustiva sobre elas (o grafo/listas perdem recall com filtros
+    # muito seletivos)
+    FILTER_EXACT_MAX = 2048
 
     def __init__(
         self,
         embeddings: Embeddings,
         index_path: Optional[str] = None,
         context_name: Optional[str] = None,
+        index_settings: Optional[IndexSettings] = None,
+        hybrid_search: bool = False,
+        rrf_k: int = 60,
+        dedupe_distance: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
     ):
         """
         Inicializa o Vector Store.
@@ -32,9 +86,20 @@ class VectorStore:
             embeddings: Objeto de embeddings do LangChain
             index_path: Caminho para salvar/carregar o índice (deprecado se usar context_name)
             context_name: Nome do contexto (ex: cond_169) - preferido
+            index_settings: Tipo de índice FAISS (padrão: flat, busca exata)
+            hybrid_search: Se True, search combina FAISS e BM25 (reciprocal rank fusion)
+            rrf_k: Constante do reciprocal rank fusion (maior = ranks pesam menos)
+            dedupe_distance: Distância de Hamming (SimHash) até a qual chunks são
+                quase-duplicatas; só o mais relevante entra (None = desativado)
+            mmr_lambda: Peso da relevância no MMR (1 = só relevância, None = desativado)
         """
         self._embeddings = embeddings
         self._context_name = context_name or "default"
+        self._index_settings = index_settings or IndexSettings()
+        self._hybrid_search = hybrid_search
+        self._rrf_k = rrf_k
+        self._dedupe_distance = dedupe_distance
+        self._mmr_lambda = mmr_lambda
 
         # Se context_name for fornecido, usa o caminho do contexto
         if context_name:
@@ -45,6 +110,28 @@ class VectorStore:
         self._vectorstore: Optional[FAISS] = None
         self._indexed_files: List[str] = []
         self._indexed_at: Optional[str] = None
+        # Impressão digital de cada arquivo e IDs (docstore) dos seus chunks
+        self._file_manifest: Dict[str, dict] = {}
+        # Posições removidas de índices sem remoção física (HNSW/IVF)
+        self._tombstones = 0
+        # Último recall medido contra a busca exata
+        self._last_recall: Optional[float] = None
+        # Última promoção recusada: {"index_type", "num_vectors"}
+        self._failed_promotion: Optional[dict] = None
+        # Índice carregado via mmap (somente leitura até a primeira alteração)
+        self._memory_mapped = False
+        # Textos e metadados dos chunks (SQLite, lidos sob demanda)
+        self._chunk_store: Optional[ChunkStore] = None
+        # Pasta da próxima geração, com a cópia do chunk store em alteração
+        self._staging: Optional[Path] = None
+        # Muda a cada alteração do índice (invalida caches de respostas)
+        self._index_version = uuid.uuid4().hex
+        # Modelo de embeddings gravado nos metadados do índice carregado
+        self._stored_embedding_model: dict = {}
+        # ID do chunk -> posição no índice (MMR), refeito quando o índice muda
+        self._positions: Optional[Tuple[tuple, Dict[str, int]]] = None
+        # Colunas de metadados por posição (filtros), refeitas quando o índice muda
+        self._metadata_index: Optional[Tuple[tuple, MetadataIndex]] = None
 
     @classmethod
     def from_config(
@@ -52,6 +139,7 @@ class VectorStore:
         config_path: str = "config.toml",
         embeddings_manager: Optional[EmbeddingsManager] = None,
         context_name: Optional[str] = None,
+        index_settings: Optional[IndexSettings] = None,
     ) -> "VectorStore":
         """
         Cria VectorStore a partir de arquivo de configuração TOML.
@@ -60,26 +148,35 @@ class VectorStore:
             config_path: Caminho para o arquivo config.toml
             embeddings_manager: Gerenciador de embeddings (opcional)
             context_name: Nome do contexto (ex: cond_169)
+            index_settings: Tipo de índice (padrão: seção [index]; o app passa
+                o do contexto, ver IndexSettings.from_config)
 
         Returns:
             Instância configurada do VectorStore
         """
         config = toml.load(config_path)
         paths_config = config.get("paths", {})
+        retrieval_config = config.get("retrieval", {})
 
         if embeddings_manager is None:
             embeddings_manager = EmbeddingsManager.from_config(config_path)
 
         # Se context_name fornecido, usa sistema de contextos
-        if context_name:
-            return cls(
-                embeddings=embeddings_manager.embeddings,
-                context_name=context_name,
-            )
-
+        location = (
+            {"context_name": context_name}
+            if context_name
+            else {"index_path": paths_config.get("faiss_index_dir", "data/faiss_index")}
+        )
         return cls(
             embeddings=embeddings_manager.embeddings,
-            index_path=paths_config.get("faiss_index_dir", "data/faiss_index"),
+            index_settings=index_settings or IndexSettings.from_config(config_path),
+            hybrid_search=retrieval_config.get("hybrid", False),
+            rrf_k=retrieval_config.get("rrf_k", 60),
+            dedupe_distance=(
+                retrieval_config.get("dedupe_max_distance", 10) if retrieval_config.get("dedupe", False) else None
+            ),
+            mmr_lambda=retrieval_config.get("mmr_lambda", 0.7) if retrieval_config.get("mmr", False) else None,
+            **location,
         )
 
     @property
@@ -87,46 +184,800 @@ class VectorStore:
         """Retorna o nome do contexto atual."""
         return self._context_name
 
+    @property
+    def index_settings(self) -> IndexSettings:
+        """Retorna a configuração do tipo de índice."""
+        return self._index_settings
+
+    @property
+    def index_type(self) -> Optional[str]:
+        """Tipo do índice carregado ("flat", "hnsw" ou "ivfpq")."""
+        if self._vectorstore is None:
+            return None
+        return index_type_of(self._vectorstore.index)
+
+    @property
+    def index_version(self) -> str:
+        """Identificador do conteúdo atual do índice (muda a cada alteração)."""
+        return self._index_version
+
+    def _touch(self) -> None:
+        """Registra uma alteração no conteúdo do índice."""
+        self._index_version = uuid.uuid4().hex
+
+    @property
+    def embedding_info(self) -> dict:
+        """
+        Provider (classe) e modelo de embeddings, ignorando wrappers como o
+        cache, com dimensões, contexto máximo e normalização do registro de
+        modelos (sem gerar embeddings).
+        """
+        base_embeddings = self._embeddings
+        while hasattr(base_embeddings, "wrapped"):
+            base_embeddings = base_embeddings.wrapped
+        embedding_info = {}
+        if hasattr(base_embeddings, 'model'):
+            embedding_info['model'] = base_embeddings.model
+        if hasattr(base_embeddings, '__class__'):
+            embedding_info['provider'] = base_embeddings.__class__.__name__
+
+        model_info = EmbeddingModelRegistry.lookup(embedding_info.get('model'))
+        if model_info is not None:
+            embedding_info.update(
+                dimensions=model_info.dimensions,
+                max_tokens=model_info.max_tokens,
+                normalized=model_info.normalized,
+            )
+        if self._vectorstore is not None:
+            embedding_info['dimensions'] = self._vectorstore.index.d
+        return embedding_info
+
+    @property
+    def embedding_key(self) -> str:
+        """Identificador do modelo de embeddings ("provider:modelo"): mesma chave, mesmo vetor de consulta."""
+        info = self.embedding_info
+        return f"{info.get('provider')}:{info.get('model')}"
+
+    def _check_embedding_model(self) -> None:
+        """
+        Verifica se os embeddings atuais são do modelo que criou o índice.
+
+        Buscar com outro modelo não dá erro no FAISS (ou dá só se as dimensões
+        diferirem), mas retorna resultados sem sentido; a carga falha antes.
+
+        Raises:
+            ValueError: Se o modelo ou as dimensões não conferem
+        """
+        stored = self._stored_embedding_model
+        stored_info = EmbeddingModelInfo.from_dict(stored)
+        if stored_info is not None:
+            EmbeddingModelRegistry.register(stored_info)
+
+        base_embeddings = self._embeddings
+        while hasattr(base_embeddings, "wrapped"):
+            base_embeddings = base_embeddings.wrapped
+        model = getattr(base_embeddings, "model", None)
+        stored_model = stored.get("model")
+
+        if model and stored_model and (
+            EmbeddingModelRegistry.canonical_name(model) != EmbeddingModelRegistry.canonical_name(stored_model)
+        ):
+            raise ValueError(
+                f"O índice do contexto '{self._context_name}' foi criado com o modelo de embeddings "
+                f"'{stored_model}', mas o modelo atual é '{model}'. Use o mesmo modelo ou re-indexe o contexto."
+            )
+
+        model_info = EmbeddingModelRegistry.lookup(model)
+        index_dimensions = self._vectorstore.index.d
+        if model_info is not None and model_info.dimensions != index_dimensions:
+            raise ValueError(
+                f"O modelo de embeddings '{model}' gera vetores de {model_info.dimensions} dimensões, "
+                f"mas o índice do contexto '{self._context_name}' tem {index_dimensions}."
+            )
+
+    def embed_query(self, query: str) -> List[float]:
+        """Gera o embedding de uma consulta com o modelo do índice."""
+        return self._embeddings.embed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Gera os embeddings de várias consultas em uma chamada em lote.
+
+        Os provedores usados (OpenAI, Ollama BGE-M3) não diferenciam consulta
+        de documento, então o lote usa embed_documents.
+        """
+        if not queries:
+            return []
+        return self._embeddings.embed_documents(list(queries))
+
+    @property
+    def is_memory_mapped(self) -> bool:
+        """Indica se o índice está mapeado do disco (somente leitura)."""
+        return self._memory_mapped
+
+    def _ensure_writable(self) -> None:
+        """
+        Prepara o índice e o chunk store para uma alteração.
+
+        O FAISS aborta o processo ao tentar alterar um índice mapeado, então
+        toda alteração passa por aqui: um índice mapeado é copiado para a
+        heap e o chunk store da geração carregada é copiado para a próxima
+        geração (ver _stage_chunk_store).
+        """
+        if self._memory_mapped:
+            self._vectorstore.index = prepare_index(
+                copy_to_memory(self._vectorstore.index), self._index_settings
+            )
+            self._memory_mapped = False
+        if self._vectorstore is not None and isinstance(self._vectorstore.docstore, ChunkStore):
+            self._vectorstore.docstore = self._stage_chunk_store()
+
+    def _open_chunk_store(self, directory: Optional[str] = None) -> ChunkStore:
+        """Abre o chunk store de um diretório (em memória se não houver caminho)."""
+        path = str(Path(directory) / ChunkStore.FILE_NAME) if directory else ":memory:"
+
+        if self._chunk_store is None or self._chunk_store.path != path:
+            if self._chunk_store is not None:
+                self._chunk_store.close()
+            # FTS5 só com busca híbrida: nem todo SQLite é compilado com ele
+            self._chunk_store = ChunkStore(path, lexical=self._hybrid_search)
+        return self._chunk_store
+
+    def _stage_chunk_store(self, path: Optional[str] = None) -> ChunkStore:
+        """
+        Abre para alteração uma cópia do chunk store na pasta da próxima geração.
+
+        O chunk store de uma geração gravada nunca é alterado: processos que
+        ainda usam o índice dessa geração continuam encontrando os chunks que
+        ele referencia. A cópia é feita na primeira alteração após um save e
+        a pasta vira a próxima geração no save seguinte.
+
+        Args:
+            path: Pasta do índice (usa index_path padrão se não fornecido)
+
+        Returns:
+            ChunkStore da próxima geração (em memória se não houver caminho)
+        """
+        root = path or self._index_path
+        if root is None:
+            return self._open_chunk_store()
+
+        root = Path(root)
+        if self._staging is None or self._staging.parent != root or not self._staging.exists():
+            root.mkdir(parents=True, exist_ok=True)
+            self._staging = root / f"{self._next_generation(root)}.tmp"
+            self._staging.mkdir()
+            current = self._vectorstore.docstore if self._vectorstore is not None else None
+            if isinstance(current, ChunkStore):
+                current.save_to(self._staging / ChunkStore.FILE_NAME)
+        return self._open_chunk_store(str(self._staging))
+
     def create_index(self, documents: List[Document]) -> None:
         """
         Cria um novo índice FAISS a partir de documentos.
 
+        O índice é criado com o tipo, codec e redução configurados em
+        index_settings. IVF-PQ e PCA precisam de vetores suficientes para o
+        treino; com poucos documentos o índice começa como flat float32 e é
+        convertido depois (maybe_promote).
+
         Args:
             documents: Lista de Documents para indexar
         """
         if not documents:
             raise ValueError("Lista de documentos vazia")
 
+        self._sign(documents)
         self._vectorstore = FAISS.from_documents(
             documents=documents,
             embedding=self._embeddings,
         )
+        self._tombstones = 0
+        self._memory_mapped = False
+        self._touch()
 
-    def add_documents(self, documents: List[Document]) -> None:
+        # Textos vão para o chunk store em disco em vez do InMemoryDocstore
+        chunk_store = self._stage_chunk_store()
+        chunk_store.clear()
+        chunk_store.add(self._vectorstore.docstore._dict)
+        self._vectorstore.docstore = chunk_store
+
+        settings = self._index_settings
+        if not settings.is_exact and len(documents) >= settings.min_training_vectors(len(documents)):
+            self._replace_index(settings)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> None:
         """
         Adiciona documentos ao índice existente.
 
         Args:
             documents: Lista de Documents para adicionar
+            ids: IDs do docstore para cada documento (opcional)
         """
+        if ids is not None:
+            for doc, doc_id in zip(documents, ids):
+                doc.id = doc_id
+
         if self._vectorstore is None:
             self.create_index(documents)
         else:
-            self._vectorstore.add_documents(documents)
+            self._ensure_writable()
+            self._sign(documents)
+            try:
+                self._vectorstore.add_documents(documents, ids=ids)
+            finally:
+                self._discard_unmapped()
+                self._touch()
+
+    def _discard_unmapped(self) -> None:
+        """
+        Descarta vetores que entraram no índice sem entrar no docstore.
+
+        O LangChain adiciona os vetores ao FAISS antes do docstore; se o
+        docstore recusa os chunks (ex: IDs repetidos), as posições ficam sem
+        ID no mapeamento e deslocariam as próximas inserções.
+        """
+        index = self._vectorstore.index
+        mapping = self._vectorstore.index_to_docstore_id
+        start = len(mapping)
+        if index.ntotal <= start:
+            return
+        if supports_remove(index):
+            index.remove_ids(faiss.IDSelectorRange(start, index.ntotal))
+        else:
+            for position in range(start, index.ntotal):
+                mapping[position] = None
+                self._tombstones += 1
+
+    @staticmethod
+    def _sign(documents: List[Document]) -> None:
+        """Grava a assinatura SimHash de cada chunk nos metadados (quase-duplicatas)."""
+        for doc in documents:
+            if "simhash" not in doc.metadata:
+                doc.metadata["simhash"] = simhash(doc.page_content)
+
+    # ------------------------------------------------------------------
+    # Indexação incremental por arquivo
+    # ------------------------------------------------------------------
+
+    def fingerprint_file(self, file_path: str, file_name: Optional[str] = None) -> dict:
+        """
+        Calcula a impressão digital (tamanho, mtime, sha256) de um arquivo.
+
+        Se tamanho e mtime coincidirem com o registrado, reaproveita o hash
+        já conhecido em vez de reler o arquivo.
+
+        Args:
+            file_path: Caminho do arquivo
+            file_name: Nome registrado no índice (padrão: nome do arquivo)
+
+        Returns:
+            Dicionário com path, size, mtime e sha256
+        """
+        path = Path(file_path)
+        stat = path.stat()
+        known = self._file_manifest.get(file_name or path.name)
+
+        if known and known.get("size") == stat.st_size and known.get("mtime") == stat.st_mtime:
+            sha256 = known["sha256"]
+        else:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+
+        return {
+            "path": str(path.absolute()),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha256,
+        }
+
+    def is_file_unchanged(self, file_name: str, fingerprint: dict) -> bool:
+        """
+        Verifica se um arquivo já está indexado com o mesmo conteúdo.
+
+        Args:
+            file_name: Nome do arquivo no índice
+            fingerprint: Resultado de fingerprint_file
+
+        Returns:
+            True se o conteúdo não mudou desde a última indexação
+        """
+        if self._vectorstore is None:
+            return False
+
+        known = self._file_manifest.get(file_name)
+        return bool(known) and known.get("sha256") == fingerprint.get("sha256")
+
+    def files_under(self, directory: str) -> List[str]:
+        """Retorna os arquivos indexados cujo caminho está dentro do diretório."""
+        base = os.path.join(str(Path(directory).absolute()), "")
+        return [
+            name
+            for name, entry in self._file_manifest.items()
+            if entry.get("path", "").startswith(base)
+        ]
+
+    def plan_file_update(
+        self,
+        file_name: str,
+        chunks: List[Document],
+        fingerprint: Optional[dict] = None,
+    ) -> dict:
+        """
+        Compara os chunks novos de um arquivo com os já indexados.
+
+        Chunks com o mesmo conteúdo mantêm o ID (e o embedding); apenas os
+        chunks novos precisam de embedding e os que sumiram são removidos.
+
+        Args:
+            file_name: Nome do arquivo no índice
+            chunks: Chunks atuais do arquivo
+            fingerprint: Impressão digital do arquivo (opcional)
+
+        Returns:
+            Plano com chunks a adicionar, a manter e IDs a remover
+        """
+        previous_ids: Dict[str, List[str]] = {}
+        if self._vectorstore is not None:
+            known = self._file_manifest.get(file_name)
+            if known:
+                for chunk_hash, doc_id in known.get("chunks", []):
+                    previous_ids.setdefault(chunk_hash, []).append(doc_id)
+            elif file_name in self._indexed_files:
+                # Índice antigo sem manifesto: remove os chunks pelo metadado "source"
+                previous_ids["legacy"] = self._ids_for_source(file_name)
+
+        add_chunks, add_ids, kept, entries = [], [], [], []
+        for chunk in chunks:
+            chunk_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+            reusable = previous_ids.get(chunk_hash)
+            if reusable:
+                doc_id = reusable.pop()
+                kept.append((doc_id, chunk))
+            else:
+                doc_id = str(uuid.uuid4())
+                add_chunks.append(chunk)
+                add_ids.append(doc_id)
+            entries.append([chunk_hash, doc_id])
+
+        return {
+            "file_name": file_name,
+            "add_chunks": add_chunks,
+            "add_ids": add_ids,
+            "kept": kept,
+            "remove_ids": [doc_id for ids in previous_ids.values() for doc_id in ids],
+            "entry": {**(fingerprint or {}), "chunks": entries},
+        }
+
+    def apply_file_updates(self, plans: List[dict]) -> None:
+        """
+        Aplica planos gerados por plan_file_update (adiciona, atualiza e remove).
+
+        A aplicação é tudo ou nada: se uma etapa falha, os chunks já
+        adicionados são removidos e os metadados dos mantidos voltam ao que
+        eram, então os planos podem ser reaplicados (ex: um arquivo por vez).
+
+        Args:
+            plans: Lista de planos de atualização
+        """
+        remove_ids = [doc_id for plan in plans for doc_id in plan["remove_ids"]]
+        add_chunks = [chunk for plan in plans for chunk in plan["add_chunks"]]
+        add_ids = [doc_id for plan in plans for doc_id in plan["add_ids"]]
+
+        # Chunks mantidos recebem os metadados novos sem novo embedding
+        kept = {
+            doc_id: Document(id=doc_id, page_content=chunk.page_content, metadata=chunk.metadata)
+            for plan in plans
+            for doc_id, chunk in plan["kept"]
+        }
+        previous = self._vectorstore.docstore.get_many(kept) if kept and self._vectorstore is not None else {}
+
+        # Gera embeddings primeiro: se falhar, o índice não é alterado
+        if add_chunks:
+            self.add_documents(add_chunks, ids=add_ids)
+
+        try:
+            if kept:
+                self._ensure_writable()
+                self._vectorstore.docstore.update(kept)
+                self._touch()
+            if remove_ids:
+                self._delete_ids(remove_ids)
+        except Exception:
+            if previous:
+                self._vectorstore.docstore.update(previous)
+            added = set(self._position_map())
+            rollback = [doc_id for doc_id in add_ids if doc_id in added]
+            if rollback:
+                self._delete_ids(rollback)
+            raise
+
+        for plan in plans:
+            self._file_manifest[plan["file_name"]] = plan["entry"]
+            if plan["file_name"] not in self._indexed_files:
+                self._indexed_files.append(plan["file_name"])
+
+    def remove_file(self, file_name: str) -> int:
+        """
+        Remove todos os chunks de um arquivo do índice.
+
+        Args:
+            file_name: Nome do arquivo no índice
+
+        Returns:
+            Número de chunks removidos
+        """
+        known = self._file_manifest.pop(file_name, None)
+        if known:
+            ids = [doc_id for _, doc_id in known.get("chunks", [])]
+        else:
+            ids = self._ids_for_source(file_name)
+
+        if ids and self._vectorstore is not None:
+            self._delete_ids(ids)
+
+        if file_name in self._indexed_files:
+            self._indexed_files.remove(file_name)
+
+        return len(ids)
+
+    def _ids_for_source(self, file_name: str) -> List[str]:
+        """Busca IDs de chunks pelo metadado "source" (índices sem manifesto)."""
+        if self._vectorstore is None:
+            return []
+        return self._vectorstore.docstore.ids_for_source(file_name)
+
+    # ------------------------------------------------------------------
+    # Tipos de índice (flat / HNSW / IVF-PQ)
+    # ------------------------------------------------------------------
+
+    def _delete_ids(self, ids: List[str]) -> None:
+        """
+        Remove chunks do índice.
+
+        No flat a remoção é física. HNSW e IVF não mantêm as posições
+        contíguas ao remover, então as posições viram "lápides" (None no
+        mapeamento) ignoradas na busca, e o índice é compactado quando elas
+        passam de TOMBSTONE_COMPACT_RATIO.
+        """
+        self._ensure_writable()
+        self._touch()
+        if supports_remove(self._vectorstore.index):
+            self._vectorstore.delete(ids)
+            return
+
+        to_remove = set(ids)
+        mapping = self._vectorstore.index_to_docstore_id
+        for position, doc_id in mapping.items():
+            if doc_id in to_remove:
+                mapping[position] = None
+                self._tombstones += 1
+        self._vectorstore.docstore.delete(ids)
+
+        ntotal = self._vectorstore.index.ntotal
+        if ntotal and self._tombstones / ntotal > self.TOMBSTONE_COMPACT_RATIO:
+            self.compact()
+
+    def _live_mask(self) -> np.ndarray:
+        """Máscara das posições do índice que não foram removidas."""
+        mapping = self._vectorstore.index_to_docstore_id
+        return np.array([mapping[p] is not None for p in sorted(mapping)], dtype=bool)
+
+    def _replace_index(self, settings: IndexSettings) -> None:
+        """Reconstrói o índice com outro tipo, descartando as lápides."""
+        mapping = self._vectorstore.index_to_docstore_id
+        positions = sorted(mapping)
+
+        self._vectorstore.index = build_from_index(self._vectorstore.index, settings, self._live_mask())
+        self._memory_mapped = False
+        self._touch()
+        self._vectorstore.index_to_docstore_id = {
+            new_position: mapping[old_position]
+            for new_position, old_position in enumerate(p for p in positions if mapping[p] is not None)
+        }
+        self._tombstones = 0
+
+    def compact(self) -> None:
+        """Reconstrói o índice atual sem as posições removidas."""
+        if self._vectorstore is None or not self._tombstones:
+            return
+        self._replace_index(self._index_settings.for_index(self._vectorstore.index))
+
+    def _promotion_target(self) -> Optional[str]:
+        """
+        Tipo para o qual o índice deveria ser convertido (None = manter).
+
+        Além da promoção flat → ANN, converte o índice cujo codec ou
+        dimensão difere do configurado para o contexto.
+        """
+        index = self._vectorstore.index
+        current = index_type_of(index)
+        settings = self._index_settings
+        target = settings.index_type
+        if target == "flat":
+            ntotal = index.ntotal
+            if settings.promote_threshold and ntotal >= settings.promote_threshold:
+                target = settings.promote_to
+            elif current != "flat":
+                return None
+        if target != current:
+            return target
+
+        layout = index_layout(index)
+        if target != "ivfpq" and layout["codec"] != settings.codec:
+            return target
+        if layout["dimensions"] != settings.reduced_dim(index.d):
+            return target
+        return None
+
+    def maybe_promote(self) -> Optional[float]:
+        """
+        Promove o índice flat para ANN se o contexto pedir ou crescer demais,
+        ou o converte para o codec/redução configurados.
+
+        Chamado antes de gravar o índice. A conversão só é aplicada se o
+        recall@10 contra a busca exata atingir ``min_recall``.
+
+        Returns:
+            Recall medido, ou None se não houve tentativa de promoção
+        """
+        if self._vectorstore is None:
+            return None
+
+        target = self._promotion_target()
+        if target is None:
+            return None
+
+        num_vectors = self._vectorstore.index.ntotal - self._tombstones
+        settings = self._index_settings.with_type(target)
+        if num_vectors < settings.min_training_vectors(num_vectors):
+            # Ainda não há vetores suficientes para treinar o IVF-PQ/PCA
+            return None
+
+        failed = self._failed_promotion
+        if (
+            failed is not None
+            and failed.get("index_type") == target
+            and num_vectors < failed.get("num_vectors", 0) * self.PROMOTION_RETRY_GROWTH
+        ):
+            return None
+
+        return self.promote_index(target)
+
+    def promote_index(self, index_type: str, force: bool = False) -> float:
+        """
+        Converte o índice para outro tipo, validando o recall.
+
+        Args:
+            index_type: "flat", "hnsw" ou "ivfpq"
+            force: Aplica mesmo com recall abaixo de ``min_recall``
+
+        Returns:
+            Recall@10 do novo índice em relação ao índice atual
+        """
+        if self._vectorstore is None:
+            raise RuntimeError("Índice não inicializado.")
+
+        settings = self._index_settings.with_type(index_type)
+        previous_index = self._vectorstore.index
+        previous_mapping = dict(self._vectorstore.index_to_docstore_id)
+        previous_tombstones = self._tombstones
+        previous_memory_mapped = self._memory_mapped
+        previous_version = self._index_version
+
+        # Referência exata com as mesmas posições do novo índice
+        exact = build_from_index(previous_index, settings.exact(), self._live_mask())
+        self._replace_index(settings)
+        recall = measure_recall(exact, self._vectorstore.index, settings)
+
+        if recall < settings.min_recall and not force:
+            print(
+                f"Promoção para {index_type} cancelada: recall {recall:.3f} "
+                f"< {settings.min_recall:.3f}"
+            )
+            self._vectorstore.index = previous_index
+            self._vectorstore.index_to_docstore_id = previous_mapping
+            self._tombstones = previous_tombstones
+            # O índice anterior pode ser o mapeado em memória (somente leitura)
+            self._memory_mapped = previous_memory_mapped
+            self._index_version = previous_version
+            self._failed_promotion = {
+                "index_type": index_type,
+                "num_vectors": previous_index.ntotal - previous_tombstones,
+            }
+        else:
+            self._last_recall = recall
+            self._failed_promotion = None
+
+        return recall
+
+    def evaluate_recall(
+        self,
+        k: int = 10,
+        num_queries: int = 200,
+        settings: Optional[IndexSettings] = None,
+    ) -> float:
+        """
+        Mede o recall@k do índice atual contra a busca exata (flat).
+
+        Útil para escolher efSearch/nprobe: passe ``settings`` com outros
+        parâmetros de busca para testá-los sem alterar o índice. Em índices
+        comprimidos (IVF-PQ, fp16, SQ8, redução de dimensão) a referência usa
+        os vetores reconstruídos: o erro de quantização só é medido em
+        promote_index e compare_codecs, que partem do índice original.
+
+        Args:
+            k: Nº de vizinhos comparados
+            num_queries: Nº de consultas amostradas do próprio índice
+            settings: Parâmetros de busca a testar (padrão: index_settings)
+
+        Returns:
+            Recall@k entre 0 e 1 (1.0 para índices flat float32)
+        """
+        if self._vectorstore is None:
+            raise RuntimeError("Índice não inicializado.")
+
+        index = self._vectorstore.index
+        if self._index_settings.for_index(index).is_exact:
+            return 1.0
+
+        exact = build_from_index(index, self._index_settings.exact())
+        recall = measure_recall(exact, index, settings or self._index_settings, k, num_queries)
+        self._last_recall = recall
+        return recall
+
+    def compare_codecs(
+        self,
+        candidates: Optional[List[Dict]] = None,
+        k: int = 10,
+        num_queries: int = 200,
+    ) -> List[Dict]:
+        """
+        Relatório de memória vs. recall de outros codecs/reduções para o contexto.
+
+        Cada alternativa é construída com os vetores do índice atual e medida
+        contra a busca exata; o índice não é alterado. Para aplicar uma
+        escolha, grave-a na chave "index" do metadata.json do contexto
+        (ContextManager.set_index_settings): a conversão acontece na próxima
+        gravação (maybe_promote).
+
+        Args:
+            candidates: Alterações sobre index_settings, ex: {"codec": "sq8"} ou
+                {"reduce_dim": 256, "reduction": "truncate"} (padrão: cada
+                codec, sem e com a redução configurada)
+            k: Nº de vizinhos comparados
+            num_queries: Nº de consultas amostradas do próprio índice
+
+        Returns:
+            Uma linha por alternativa com codec, dimensões, bytes por vetor,
+            memória total (MB) e recall@k (None se faltam vetores para o treino)
+        """
+        if self._vectorstore is None:
+            raise RuntimeError("Índice não inicializado.")
+
+        index = self._vectorstore.index
+        base = self._index_settings.with_type(self.index_type)
+        if candidates is None:
+            codecs = IndexSettings.CODECS if base.index_type != "ivfpq" else (base.codec,)
+            reductions = [0, base.reduce_dim] if base.reduce_dim else [0]
+            candidates = [
+                {"codec": codec, "reduce_dim": reduce_dim}
+                for reduce_dim in reductions
+                for codec in codecs
+            ]
+
+        live = self._live_mask()
+        num_vectors = int(live.sum())
+        exact = build_from_index(index, base.exact(), live)
+
+        report = []
+        for changes in candidates:
+            settings = IndexSettings.from_dict({**base.to_dict(), **changes})
+            row = {
+                "index_type": settings.index_type,
+                "codec": settings.codec if settings.index_type != "ivfpq" else "pq",
+                "dimensions": settings.reduced_dim(index.d),
+                "reduction": settings.reduction if settings.reduced_dim(index.d) < index.d else None,
+                "bytes_per_vector": None,
+                "memory_mb": None,
+                f"recall_at_{k}": None,
+            }
+            if num_vectors >= settings.min_training_vectors(num_vectors):
+                candidate = build_from_index(exact, settings)
+                row["bytes_per_vector"] = bytes_per_vector(candidate)
+                row["memory_mb"] = round(num_vectors * row["bytes_per_vector"] / (1024 * 1024), 2)
+                row[f"recall_at_{k}"] = round(measure_recall(exact, candidate, settings, k, num_queries), 4)
+            report.append(row)
+        return report
+
+    def _search_by_vector(
+        self,
+        embedding: List[float],
+        k: int,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Busca pelos k vizinhos de um vetor, ignorando posições removidas."""
+        return self._search_by_vectors([embedding], k, metadata_filter)[0]
+
+    def _search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Busca os k vizinhos de vários vetores em uma única chamada ao FAISS.
+
+        Com ``metadata_filter``, as posições que atendem ao filtro (e não
+        foram removidas) viram um seletor de IDs da própria busca do FAISS.
+        """
+        index = self._vectorstore.index
+        mapping = self._vectorstore.index_to_docstore_id
+
+        selected = None
+        if metadata_filter is not None:
+            selected = self._filter_mask(metadata_filter)
+            fetch_k = min(k, int(selected.sum()))
+        else:
+            fetch_k = min(k + self._tombstones, index.ntotal)
+        if fetch_k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+
+        if (
+            selected is not None
+            and index_type_of(index) != "flat"
+            and selected.sum() <= self.FILTER_EXACT_MAX
+        ):
+            scores, positions = self._search_positions(queries, np.flatnonzero(selected), fetch_k)
+        else:
+            selector = id_selector(selected) if selected is not None else None
+            params = self._index_settings.search_parameters(index, fetch_k, selector)
+            if params is not None:
+                scores, positions = index.search(queries, fetch_k, params=params)
+            else:
+                scores, positions = index.search(queries, fetch_k)
+
+        all_hits = []
+        for row_scores, row_positions in zip(scores, positions):
+            hits = []
+            for score, position in zip(row_scores, row_positions):
+                doc_id = mapping.get(int(position)) if position >= 0 else None
+                if doc_id is not None:
+                    hits.append((doc_id, float(score)))
+            all_hits.append(hits)
+
+        # Só os textos dos resultados são lidos do chunk store, uma vez por
+        # chunk mesmo que apareça em várias consultas
+        docs = self._vectorstore.docstore.get_many(
+            doc_id for hits in all_hits for doc_id, _ in hits
+        )
+        return [
+            [(docs[doc_id], score) for doc_id, score in hits if doc_id in docs][:k]
+            for hits in all_hits
+        ]
 
     def search(
         self,
         query: str,
         top_k: int = 5,
         score_threshold: Optional[float] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
     ) -> List[Tuple[Document, float]]:
         """
         Busca documentos similares à query.
 
+        Quase-duplicatas e MMR seguem a configuração do store
+        (dedupe_distance e mmr_lambda, ver search_hybrid_many).
+
         Args:
             query: Texto da consulta
             top_k: Número de resultados
             score_threshold: Threshold mínimo de similaridade
+            metadata_filter: Restringe a busca aos chunks que atendem ao filtro
 
         Returns:
             Lista de tuplas (Document, score)
@@ -134,21 +985,430 @@ class VectorStore:
         if self._vectorstore is None:
             raise RuntimeError("Índice não inicializado. Crie ou carregue um índice primeiro.")
 
-        results = self._vectorstore.similarity_search_with_score(
-            query=query,
-            k=top_k,
+        return self.search_hybrid(
+            query, self.embed_query(query), top_k, score_threshold, metadata_filter=metadata_filter
         )
 
+    def search_by_vector(
+        self,
+        embedding: List[float],
+        top_k: int = 5,
+        score_threshold: Optional[float] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Busca documentos similares a um embedding já calculado.
+
+        Args:
+            embedding: Vetor da consulta (embed_query)
+            top_k: Número de resultados
+            score_threshold: Threshold mínimo de similaridade
+            metadata_filter: Restringe a busca aos chunks que atendem ao filtro
+
+        Returns:
+            Lista de tuplas (Document, score)
+        """
+        if self._vectorstore is None:
+            raise RuntimeError("Índice não inicializado. Crie ou carregue um índice primeiro.")
+
+        results = self._search_by_vector(embedding, top_k, metadata_filter)
+
         # Filtra por threshold se especificado
         if score_threshold is not None:
             results = [(doc, score) for doc, score in results if score <= score_threshold]
 
         return results
 
+    def search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        top_k: int = 5,
+        score_threshold: Optional[float] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Busca vários embeddings de uma vez (uma chamada vetorizada ao FAISS).
+
+        Chunks recuperados por mais de uma consulta são lidos uma única vez e
+        compartilhados entre os resultados.
+
+        Args:
+            embeddings: Vetores das consultas (embed_queries)
+            top_k: Número de resultados por consulta
+            score_threshold: Threshold mínimo de similaridade
+            metadata_filter: Restringe a busca aos chunks que atendem ao filtro
+
+        Returns:
+            Uma lista de tuplas (Document, score) por consulta, na mesma ordem
+        """
+        if self._vectorstore is None:
+            raise RuntimeError("Índice não inicializado. Crie ou carregue um índice primeiro.")
+
+        results = self._search_by_vectors(embeddings, top_k, metadata_filter)
+
+        if score_threshold is not None:
+            results = [
+                [(doc, score) for doc, score in hits if score <= score_threshold]
+                for hits in results
+            ]
+
+        return results
+
+    @property
+    def hybrid_search(self) -> bool:
+        """Indica se as buscas combinam FAISS e BM25."""
+        return self._hybrid_search
+
+    def similarity(self, score: float) -> float:
+        """
+        Converte o score bruto do FAISS em similaridade de cosseno (0 a 1).
+
+        Índices L2 retornam a distância ao quadrado; entre vetores unitários
+        (BGE-M3, OpenAI) ela equivale a 2 - 2·cosseno. Índices de produto
+        interno já retornam o cosseno.
+
+        Args:
+            score: Score retornado pelo FAISS (search_by_vector)
+
+        Returns:
+            Similaridade entre 0 e 1 (maior = mais parecido)
+        """
+        if self._vectorstore is not None and self._vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            similarity = score
+        else:
+            similarity = 1.0 - score / 2.0
+        return min(1.0, max(0.0, similarity))
+
+    def vector_similarities(self, embedding: List[float], doc_ids: List[str]) -> List[float]:
+        """
+        Similaridade vetorial entre a consulta e chunks já encontrados.
+
+        O score da busca híbrida (RRF) depende só das posições nas listas de
+        candidatos e não é comparável entre contextos; esta similaridade
+        (a mesma de similarity) é. Os vetores são reconstruídos do índice.
+
+        Args:
+            embedding: Vetor da consulta
+            doc_ids: IDs dos chunks
+
+        Returns:
+            Similaridade (0 a 1) de cada chunk, na mesma ordem
+        """
+        if not doc_ids:
+            return []
+        vectors = self._vectors_for(doc_ids)
+        query = np.asarray(embedding, dtype=np.float32)
+        if self._vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = vectors @ query
+        else:
+            scores = ((vectors - query) ** 2).sum(axis=1)
+        return [self.similarity(float(score)) for score in scores]
+
+    @staticmethod
+    def adaptive_cut(
+        similarities: List[float],
+        max_k: int,
+        min_similarity: Optional[float] = None,
+        min_k: int = 1,
+        score_gap: Optional[float] = None,
+    ) -> int:
+        """
+        Quantos resultados manter de uma lista ordenada por similaridade.
+
+        Os ``min_k`` primeiros sempre entram; depois, a lista para no primeiro
+        resultado abaixo de ``min_similarity`` ou que caia mais de
+        ``score_gap`` em relação ao anterior, até no máximo ``max_k``.
+
+        Args:
+            similarities: Similaridades (0 a 1), da maior para a menor
+            max_k: Máximo de resultados
+            min_similarity: Similaridade mínima (None = sem threshold)
+            min_k: Mínimo de resultados, mesmo abaixo do threshold
+            score_gap: Queda máxima entre resultados consecutivos (None = sem limite)
+
+        Returns:
+            Número de resultados a manter
+        """
+        count = 0
+        for i, similarity in enumerate(similarities[:max_k]):
+            if i >= min_k:
+                if min_similarity is not None and similarity < min_similarity:
+                    break
+                if score_gap is not None and similarities[i - 1] - similarity > score_gap:
+                    break
+            count += 1
+        return count
+
+    def search_hybrid(
+        self,
+        query: str,
+        embedding: List[float],
+        top_k: int = 5,
+        score_threshold: Optional[float] = None,
+        min_similarity: Optional[float] = None,
+        min_k: int = 1,
+        score_gap: Optional[float] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Busca combinando o índice vetorial e o índice lexical (BM25) do contexto.
+
+        Sem busca híbrida ativada, equivale a search_by_vector.
+
+        Args:
+            query: Texto da consulta (busca lexical)
+            embedding: Vetor da consulta (busca vetorial)
+            top_k: Número máximo de resultados
+            score_threshold: Threshold do score bruto dos candidatos vetoriais
+            min_similarity: Similaridade mínima normalizada (ver adaptive_cut)
+            min_k: Mínimo de resultados, mesmo abaixo de min_similarity
+            score_gap: Queda máxima de similaridade entre resultados consecutivos
+            metadata_filter: Restringe as duas buscas aos chunks que atendem ao filtro
+
+        Returns:
+            Lista de tuplas (Document, score); na busca híbrida o score é o do
+            reciprocal rank fusion (maior = mais relevante)
+        """
+        return self.search_hybrid_many(
+            [query], [embedding], top_k, score_threshold, min_similarity, min_k, score_gap, metadata_filter
+        )[0]
+
+    def search_hybrid_many(
+        self,
+        queries: List[str],
+        embeddings: List[List[float]],
+        top_k: int = 5,
+        score_threshold: Optional[float] = None,
+        min_similarity: Optional[float] = None,
+        min_k: int = 1,
+        score_gap: Optional[float] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Versão em lote de search_hybrid (uma busca vetorizada no FAISS).
+
+        O número de resultados de cada consulta é adaptativo: os candidatos
+        vetoriais são cortados por adaptive_cut (threshold e queda de
+        similaridade, entre min_k e top_k).
+
+        Na busca híbrida, cada lista de candidatos (vetorial e BM25) contribui
+        com 1 / (rrf_k + posição) para o score do chunk; chunks que aparecem
+        nas duas listas sobem no ranking. Candidatos vetoriais abaixo da
+        similaridade mínima são descartados antes da fusão, mas termos exatos
+        encontrados pelo BM25 (ex: "Art. 12") entram mesmo assim. A quantidade
+        de resultados continua sendo a definida pelo corte vetorial.
+
+        Com dedupe_distance ou mmr_lambda, a busca traz mais candidatos e as
+        vagas são preenchidas sem quase-duplicatas (SimHash gravado na
+        indexação) e/ou por MMR sobre os embeddings dos candidatos.
+
+        Com ``metadata_filter``, a busca vetorial usa um seletor de IDs do
+        FAISS (ver _search_by_vectors) e os candidatos do BM25 passam pela
+        mesma máscara de posições.
+
+        Args:
+            queries: Textos das consultas
+            embeddings: Vetores das consultas, na mesma ordem
+            top_k: Número máximo de resultados por consulta
+            score_threshold: Threshold do score bruto dos candidatos vetoriais
+            min_similarity: Similaridade mínima normalizada (ver adaptive_cut)
+            min_k: Mínimo de resultados, mesmo abaixo de min_similarity
+            score_gap: Queda máxima de similaridade entre resultados consecutivos
+            metadata_filter: Restringe as buscas aos chunks que atendem ao filtro
+
+        Returns:
+            Uma lista de tuplas (Document, score) por consulta
+        """
+        hybrid = self._hybrid_search and self._chunk_store is not None
+        diversify = self._dedupe_distance is not None or self._mmr_lambda is not None
+        candidates = top_k * self.HYBRID_CANDIDATES_FACTOR if hybrid else top_k
+        if diversify:
+            candidates = max(candidates, top_k * self.DIVERSITY_CANDIDATES_FACTOR)
+        vector_results = self.search_by_vectors(embeddings, candidates, score_threshold, metadata_filter)
+
+        lexical_k = candidates
+        selected = None
+        if hybrid and metadata_filter is not None:
+            # O BM25 não conhece o filtro: busca mais e descarta os de fora
+            selected = self._filter_mask(metadata_filter)
+            lexical_k = candidates * self.HYBRID_CANDIDATES_FACTOR
+
+        fused = []
+        missing = set()
+        for query, vector_hits in zip(queries, vector_results):
+            similarities = [self.similarity(score) for _, score in vector_hits]
+            keep = self.adaptive_cut(similarities, top_k, min_similarity, min_k, score_gap)
+            # Candidatos vetoriais acima do threshold (além dos min_k primeiros)
+            passing = sum(1 for s in similarities if min_similarity is None or s >= min_similarity)
+
+            if not hybrid:
+                if diversify:
+                    pool = vector_hits[:max(keep, passing)]
+                    fused.append(self._diversify(pool, similarities[:len(pool)], keep))
+                else:
+                    fused.append(vector_hits[:keep])
+                continue
+
+            vector_hits = vector_hits[:max(keep, passing)]
+
+            docs = {doc.id: doc for doc, _ in vector_hits}
+            scores: Dict[str, float] = {}
+            lexical_ids = [doc_id for doc_id, _ in self._chunk_store.search_lexical(query, lexical_k)]
+            if selected is not None:
+                positions = self._position_map()
+                lexical_ids = [
+                    doc_id for doc_id in lexical_ids
+                    if doc_id in positions and selected[positions[doc_id]]
+                ][:candidates]
+            ranked_ids = ([doc.id for doc, _ in vector_hits], lexical_ids)
+            for ids in ranked_ids:
+                for rank, doc_id in enumerate(ids, 1):
+                    scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self._rrf_k + rank)
+
+            limit = min(top_k, max(keep, min_k))
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            # Com diversificação, todos os candidatos concorrem pelas vagas
+            if not diversify:
+                ranked = ranked[:limit]
+            missing.update(doc_id for doc_id, _ in ranked if doc_id not in docs)
+            fused.append((ranked, docs, limit))
+
+        if not hybrid:
+            return fused
+
+        # Textos dos chunks encontrados só pelo BM25, lidos de uma vez
+        lexical_docs = self._chunk_store.get_many(missing)
+        results = []
+        for ranked, docs, limit in fused:
+            hits = [
+                (docs.get(doc_id) or lexical_docs[doc_id], score)
+                for doc_id, score in ranked
+                if doc_id in docs or doc_id in lexical_docs
+            ]
+            if diversify and hits:
+                # Relevância do MMR: score RRF relativo ao melhor resultado
+                hits = self._diversify(hits, [score / hits[0][1] for _, score in hits], limit)
+            results.append(hits)
+        return results
+
+    def _diversify(
+        self,
+        results: List[Tuple[Document, float]],
+        relevance: List[float],
+        k: int,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Remove quase-duplicatas e aplica MMR aos candidatos de uma consulta.
+
+        Args:
+            results: Candidatos (Document, score), do mais ao menos relevante
+            relevance: Relevância de cada candidato (0 a 1)
+            k: Número de resultados
+
+        Returns:
+            Até k resultados
+        """
+        keep = list(range(len(results)))
+
+        if self._dedupe_distance is not None:
+            # Assinatura gravada na indexação (calculada aqui em índices antigos)
+            signatures = [
+                doc.metadata["simhash"] if doc.metadata.get("simhash") is not None else simhash(doc.page_content)
+                for doc, _ in results
+            ]
+            keep = unique_indices(signatures, self._dedupe_distance)
+
+        if self._mmr_lambda is not None and len(keep) > 1:
+            vectors = self._vectors_for([results[i][0].id for i in keep])
+            order = mmr([relevance[i] for i in keep], vectors, k, self._mmr_lambda)
+            keep = [keep[i] for i in order]
+
+        return [results[i] for i in keep[:k]]
+
+    def _position_map(self) -> Dict[str, int]:
+        """ID do chunk -> posição no índice FAISS (refeito quando o índice muda)."""
+        mapping = self._vectorstore.index_to_docstore_id
+        key = (self._index_version, id(mapping))
+        if self._positions is None or self._positions[0] != key:
+            self._positions = (key, {doc_id: pos for pos, doc_id in mapping.items() if doc_id is not None})
+        return self._positions[1]
+
+    def _metadata_columns(self) -> MetadataIndex:
+        """
+        Colunas de metadados de todas as posições do índice (ver MetadataIndex).
+
+        Montadas na primeira busca filtrada a partir do chunk store (só os
+        metadados, sem os textos) e refeitas quando o índice muda.
+        """
+        mapping = self._vectorstore.index_to_docstore_id
+        key = (self._index_version, id(mapping))
+        if self._metadata_index is None or self._metadata_index[0] != key:
+            positions = self._position_map()
+            columns = MetadataIndex.build(
+                self._vectorstore.index.ntotal,
+                (
+                    (positions[doc_id], metadata)
+                    for doc_id, metadata in self._vectorstore.docstore.iter_metadata()
+                    if doc_id in positions
+                ),
+            )
+            self._metadata_index = (key, columns)
+        return self._metadata_index[1]
+
+    def _filter_mask(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """Máscara das posições não removidas que atendem ao filtro."""
+        return self._metadata_columns().mask(metadata_filter) & self._live_mask()
+
+    def _search_positions(
+        self,
+        queries: np.ndarray,
+        positions: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca exaustiva restrita a algumas posições (filtros muito seletivos).
+
+        Os vetores das posições são reconstruídos do índice (aproximados em
+        índices comprimidos) e comparados com a métrica do índice.
+
+        Returns:
+            (scores, posições) no formato de index.search
+        """
+        index = self._vectorstore.index
+        if index_type_of(index) == "ivfpq":
+            vectors = np.vstack([index.reconstruct(int(p)) for p in positions])
+        else:
+            vectors = index.reconstruct_batch(positions.astype(np.int64))
+
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = queries @ vectors.T
+            order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        else:
+            scores = (
+                (queries ** 2).sum(axis=1, keepdims=True)
+                - 2.0 * queries @ vectors.T
+                + (vectors ** 2).sum(axis=1)
+            )
+            order = np.argsort(scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), positions[order]
+
+    def _vectors_for(self, doc_ids: List[str]) -> np.ndarray:
+        """Embeddings dos chunks, reconstruídos do índice FAISS (zeros se ausentes)."""
+        index = self._vectorstore.index
+        positions = self._position_map()
+
+        vectors = np.zeros((len(doc_ids), index.d), dtype=np.float32)
+        for row, doc_id in enumerate(doc_ids):
+            position = positions.get(doc_id)
+            if position is not None:
+                vectors[row] = index.reconstruct(int(position))
+        return vectors
+
     def search_documents(
         self,
         query: str,
         top_k: int = 5,
+        metadata_filter: Optional[MetadataFilter] = None,
     ) -> List[Document]:
         """
         Busca documentos similares (retorna apenas Documents).
@@ -156,6 +1416,7 @@ class VectorStore:
         Args:
             query: Texto da consulta
             top_k: Número de resultados
+            metadata_filter: Restringe a busca aos chunks que atendem ao filtro
 
         Returns:
             Lista de Documents
@@ -163,7 +1424,7 @@ class VectorStore:
         if self._vectorstore is None:
             raise RuntimeError("Índice não inicializado.")
 
-        return self._vectorstore.similarity_search(query=query, k=top_k)
+        return [doc for doc, _ in self.search(query, top_k, metadata_filter=metadata_filter)]
 
     def save(self, path: Optional[str] = None, file_names: Optional[List[str]] = None) -> None:
         """
@@ -180,29 +1441,136 @@ class VectorStore:
         if save_path is None:
             raise ValueError("Caminho de salvamento não especificado")
 
-        Path(save_path).mkdir(parents=True, exist_ok=True)
-        self._vectorstore.save_local(save_path)
+        root = Path(save_path)
+        root.mkdir(parents=True, exist_ok=True)
+
+        # Todos os arquivos vão para uma geração nova; o CURRENT troca por último.
+        # Se houve alterações, a pasta da geração já tem o chunk store alterado.
+        staged = (
+            self._staging is not None
+            and self._staging.parent == root
+            and self._vectorstore.docstore.path == str(self._staging / ChunkStore.FILE_NAME)
+        )
+        if staged:
+            staging = self._staging
+            generation = staging.name[:-len(".tmp")]
+        else:
+            generation = self._next_generation(root)
+            staging = root / f"{generation}.tmp"
+            staging.mkdir()
+
+        self._save_chunks(str(staging))
+        faiss.write_index(self._vectorstore.index, str(staging / "index.faiss"))
 
         # Salva metadados (lista de arquivos)
         if file_names:
             self._indexed_files = file_names
         self._indexed_at = datetime.now().isoformat()
-        self._save_metadata(save_path)
+        self._save_metadata(str(staging))
+
+        with open(staging / self.MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(self._file_manifest, f, ensure_ascii=False)
+
+        # O chunk store passa a ser o da geração gravada (fechado durante a troca)
+        reopen = staged or (self._index_path is not None and Path(self._index_path) == root)
+        if staged:
+            self._chunk_store.close()
+            self._chunk_store = None
+            self._staging = None
+        os.replace(staging, root / generation)
+        if reopen:
+            self._vectorstore.docstore = self._open_chunk_store(str(root / generation))
+
+        tmp_current = root / f"{self.CURRENT_FILE}.tmp"
+        tmp_current.write_text(generation, encoding="utf-8")
+        os.replace(tmp_current, root / self.CURRENT_FILE)
+
+        self._remove_old_generations(root)
+
+    @classmethod
+    def index_dir(cls, path: str) -> Path:
+        """
+        Pasta com os arquivos do índice em uso (geração apontada pelo CURRENT).
+
+        Índices gravados antes das gerações têm os arquivos na própria pasta.
+        """
+        current = Path(path) / cls.CURRENT_FILE
+        if current.exists():
+            return Path(path) / current.read_text(encoding="utf-8").strip()
+        return Path(path)
+
+    @classmethod
+    def has_saved_index(cls, path: str) -> bool:
+        """Verifica se há um índice gravado na pasta."""
+        return (cls.index_dir(path) / "index.faiss").exists()
+
+    @classmethod
+    def _generations(cls, root: Path) -> List[Tuple[int, Path]]:
+        """Gerações gravadas (número, pasta), da mais antiga para a mais nova."""
+        pattern = re.compile(rf"{re.escape(cls.GENERATION_PREFIX)}(\d+)(\.tmp)?$")
+        found = []
+        for item in root.iterdir() if root.exists() else ():
+            match = pattern.match(item.name)
+            if match and item.is_dir():
+                found.append((int(match.group(1)), item))
+        return sorted(found)
+
+    def _next_generation(self, root: Path) -> str:
+        """Nome da próxima geração."""
+        generations = self._generations(root)
+        number = generations[-1][0] + 1 if generations else 1
+        return f"{self.GENERATION_PREFIX}{number:06d}"
+
+    def _remove_old_generations(self, root: Path) -> None:
+        """Remove gerações antigas, gravações interrompidas e o formato sem gerações."""
+        current = self.index_dir(str(root))
+        complete = [path for _, path in self._generations(root) if not path.name.endswith(".tmp")]
+        keep = set(complete[-self.KEEP_GENERATIONS:]) | {current}
+        if self._staging is not None:
+            keep.add(self._staging)
+        for _, path in self._generations(root):
+            if path not in keep and path.name < current.name:
+                shutil.rmtree(path, ignore_errors=True)
+
+        legacy_files = (
+            "index.faiss", self.IDS_FILE, self.METADATA_FILE, self.MANIFEST_FILE, self.LEGACY_DOCSTORE_FILE,
+            ChunkStore.FILE_NAME, f"{ChunkStore.FILE_NAME}-wal", f"{ChunkStore.FILE_NAME}-shm",
+        )
+        for name in legacy_files:
+            legacy = root / name
+            if legacy.exists():
+                legacy.unlink()
+
+    def _save_chunks(self, generation_dir: str) -> None:
+        """Grava o chunk store e o mapeamento posição -> ID (sem pickle) na geração."""
+        chunk_store = self._vectorstore.docstore
+        chunks_path = str(Path(generation_dir) / ChunkStore.FILE_NAME)
+        if chunk_store.path == chunks_path:
+            chunk_store.commit()
+        else:
+            chunk_store.save_to(chunks_path)
+
+        mapping = self._vectorstore.index_to_docstore_id
+        ids = np.array([mapping[p] or "" for p in sorted(mapping)], dtype=str)
+        np.save(Path(generation_dir) / self.IDS_FILE, ids, allow_pickle=False)
 
     def _save_metadata(self, path: str) -> None:
         """Salva metadados do índice em arquivo JSON."""
-        # Tenta obter informações do modelo de embeddings
-        embedding_info = {}
-        if hasattr(self._embeddings, 'model'):
-            embedding_info['model'] = self._embeddings.model
-        if hasattr(self._embeddings, '__class__'):
-            embedding_info['provider'] = self._embeddings.__class__.__name__
-        
         metadata = {
             "indexed_files": self._indexed_files,
             "indexed_at": self._indexed_at,
             "total_files": len(self._indexed_files),
-            "embedding_model": embedding_info,  # Salva info do modelo
+            "embedding_model": self.embedding_info,  # Salva info do modelo
+            "index_version": self._index_version,
+            "index": {
+                # Tipo, codec, dimensão armazenada, redução e bytes por vetor
+                **index_layout(self._vectorstore.index),
+                "ntotal": self._vectorstore.index.ntotal,
+                "tombstones": self._tombstones,
+                "recall_at_10": self._last_recall,
+                "failed_promotion": self._failed_promotion,
+                "settings": self._index_settings.to_dict(),
+            },
         }
         metadata_path = Path(path) / self.METADATA_FILE
         with open(metadata_path, "w", encoding="utf-8") as f:
@@ -211,16 +1579,34 @@ class VectorStore:
     def _load_metadata(self, path: str) -> None:
         """Carrega metadados do índice de arquivo JSON."""
         metadata_path = Path(path) / self.METADATA_FILE
+        self._stored_embedding_model = {}
         if metadata_path.exists():
             with open(metadata_path, "r", encoding="utf-8") as f:
                 metadata = json.load(f)
                 self._indexed_files = metadata.get("indexed_files", [])
                 self._indexed_at = metadata.get("indexed_at")
+                self._last_recall = (metadata.get("index") or {}).get("recall_at_10")
+                self._failed_promotion = (metadata.get("index") or {}).get("failed_promotion")
+                self._index_version = metadata.get("index_version") or self._index_version
+                self._stored_embedding_model = metadata.get("embedding_model") or {}
+
+        manifest_path = Path(path) / self.MANIFEST_FILE
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self._file_manifest = json.load(f)
+        else:
+            self._file_manifest = {}
 
     def load(self, path: Optional[str] = None) -> None:
         """
         Carrega um índice FAISS do disco.
 
+        Com ``index_settings.mmap`` o índice é mapeado em memória (somente
+        leitura, compartilhado entre processos); a primeira alteração faz uma
+        cópia para a memória do processo. Os textos ficam no chunk store e
+        não são carregados. Índices no formato antigo (``index.pkl``) são
+        convertidos na primeira carga.
+
         Args:
             path: Caminho para carregar (usa index_path padrão se não fornecido)
         """
@@ -228,38 +1614,131 @@ class VectorStore:
         if load_path is None:
             raise ValueError("Caminho de carregamento não especificado")
 
-        # Verifica se o arquivo index.faiss existe (não apenas o diretório)
-        index_file = Path(load_path) / "index.faiss"
+        # Geração atual (CURRENT), lida por inteiro mesmo com um save em andamento
+        index_dir = self.index_dir(load_path)
+        index_file = index_dir / "index.faiss"
         if not index_file.exists():
             raise FileNotFoundError(f"Arquivo de índice não encontrado: {index_file}")
 
+        io_flags = mmap_io_flags() if self._index_settings.mmap else 0
+        ids_file = index_dir / self.IDS_FILE
+        legacy = False
+
+        # Alterações não salvas são descartadas
+        if self._staging is not None:
+            if self._chunk_store is not None and Path(self._chunk_store.path).parent == self._staging:
+                self._chunk_store.close()
+                self._chunk_store = None
+            shutil.rmtree(self._staging, ignore_errors=True)
+            self._staging = None
+
+        if ids_file.exists() and (index_dir / ChunkStore.FILE_NAME).exists():
+            ids = np.load(ids_file, allow_pickle=False)
+            self._vectorstore = FAISS(
+                embedding_function=self._embeddings,
+                index=faiss.read_index(str(index_file), io_flags),
+                docstore=self._open_chunk_store(str(index_dir)),
+                index_to_docstore_id={
+                    position: doc_id or None for position, doc_id in enumerate(ids.tolist())
+                },
+            )
+        else:
+            self._load_legacy(load_path, io_flags)
+            legacy = True
+
+        self._memory_mapped = self._index_settings.mmap
+        prepare_index(self._vectorstore.index, self._index_settings)
+        self._tombstones = sum(
+            1 for doc_id in self._vectorstore.index_to_docstore_id.values() if doc_id is None
+        )
+
+        # Carrega metadados
+        self._load_metadata(str(index_dir))
+
+        try:
+            self._check_embedding_model()
+        except ValueError:
+            self._vectorstore = None
+            raise
+
+        if legacy:
+            # Converte para o formato com gerações (remove o index.pkl)
+            self.save(load_path)
+
+    def _load_legacy(self, path: str, io_flags: int) -> None:
+        """Carrega um índice com docstore em pickle (index.pkl) e o converte."""
         self._vectorstore = FAISS.load_local(
-            load_path,
+            path,
             self._embeddings,
             allow_dangerous_deserialization=True,
+            io_flags=io_flags,
         )
 
-        # Carrega metadados
-        self._load_metadata(load_path)
+        chunk_store = self._stage_chunk_store(path)
+        chunk_store.clear()
+        chunk_store.add(self._vectorstore.docstore._dict)
+        self._vectorstore.docstore = chunk_store
 
     def get_retriever(self, top_k: int = 5):
         """
         Retorna um retriever para uso com LangChain chains.
 
+        A busca do LangChain não conhece as posições removidas (lápides) de
+        HNSW/IVF: com lápides, chame compact() antes, com escrita exclusiva
+        no contexto (este método não altera o índice).
+
         Args:
             top_k: Número de documentos a recuperar
 
         Returns:
             Retriever do FAISS
+
+        Raises:
+            RuntimeError: Se o índice não foi inicializado ou tem lápides
         """
         if self._vectorstore is None:
             raise RuntimeError("Índice não inicializado.")
+        if self._tombstones:
+            raise RuntimeError(
+                f"Índice com {self._tombstones} posições removidas: chame compact() antes de get_retriever."
+            )
 
         return self._vectorstore.as_retriever(
             search_type="similarity",
             search_kwargs={"k": top_k},
         )
 
+    def begin_ingestion(
+        self,
+        batch_size: int = 256,
+        persist_every_files: int = 0,
+        persist_interval_seconds: float = 0,
+        on_persist: Optional[Callable[["VectorStore"], None]] = None,
+    ) -> "IngestionSession":
+        """
+        Abre uma sessão de ingestão para indexar vários arquivos de uma vez.
+
+        Os chunks ficam em buffer e o índice só é gravado em disco no commit
+        (ou ao atingir os limites configurados), em vez de a cada arquivo.
+
+        Args:
+            batch_size: Número de chunks acumulados antes de gerar embeddings
+            persist_every_files: Persiste a cada N arquivos (0 = só no commit)
+            persist_interval_seconds: Persiste se passou este tempo desde a
+                última gravação (0 = só no commit)
+            on_persist: Callback chamado após cada gravação em disco
+
+        Returns:
+            IngestionSession (use com ``with`` ou chame ``commit()``)
+        """
+        return IngestionSession(
+            vector_store=self,
+            batch_size=batch_size,
+            persist_every_files=persist_every_files,
+            persist_interval_seconds=persist_interval_seconds,
+            on_persist=on_persist,
+        )
+
     @property
     def is_initialized(self) -> bool:
         """Verifica se o índice está inicializado."""
@@ -275,15 +1754,251 @@ class VectorStore:
         """Retorna data/hora da indexação."""
         return self._indexed_at
 
+    def memory_usage_bytes(self) -> int:
+        """
+        Estima a memória ocupada pelo índice e pelo mapeamento de IDs.
+
+        Os textos ficam no chunk store em disco e não entram na conta.
+
+        Returns:
+            Bytes estimados (0 se o índice não estiver carregado)
+        """
+        if self._vectorstore is None:
+            return 0
+
+        index = self._vectorstore.index
+        # Código do vetor (float32, fp16, SQ8 ou PQ) + vizinhos do HNSW ou ID do IVF
+        per_vector = bytes_per_vector(index)
+
+        if self._memory_mapped and index_type_of(index) != "ivfpq":
+            # Vetores ficam no cache de páginas do SO (compartilhado), não na heap
+            per_vector -= code_size_of(index)
+
+        # Entrada do dicionário posição -> ID (str de 36 caracteres)
+        per_vector += 120
+        return index.ntotal * per_vector
+
     def get_stats(self) -> dict:
         """Retorna estatísticas do índice."""
         if self._vectorstore is None:
             return {"initialized": False}
 
-        return {
+        layout = index_layout(self._vectorstore.index)
+        stats = {
             "initialized": True,
-            "total_documents": len(self._vectorstore.docstore._dict),
+            "total_documents": len(self._vectorstore.docstore),
             "indexed_files": self._indexed_files,
             "total_files": len(self._indexed_files),
             "indexed_at": self._indexed_at,
+            "index_type": self.index_type,
+            "index_codec": layout["codec"],
+            "index_dimensions": layout["dimensions"],
+            "index_bytes_per_vector": layout["bytes_per_vector"],
+            "index_vectors": self._vectorstore.index.ntotal,
+            "index_tombstones": self._tombstones,
+            "index_recall_at_10": self._last_recall,
+            "index_mmap": self._memory_mapped,
+            "hybrid_search": self._hybrid_search,
+            "dedupe_distance": self._dedupe_distance,
+            "mmr_lambda": self._mmr_lambda,
+        }
+
+        if hasattr(self._embeddings, "get_cache_stats"):
+            stats["embedding_cache"] = self._embeddings.get_cache_stats()
+
+        return stats
+
+
+class IngestionSession:
+    """
+    Sessão de ingestão em lote para um VectorStore.
+
+    Acumula chunks de vários arquivos, gera embeddings em lotes de
+    ``batch_size`` e grava o índice em disco uma única vez por
+    sessão (ou por limite de arquivos/tempo), evitando regravar o índice
+    inteiro a cada arquivo. Arquivos já indexados são atualizados de forma
+    incremental: só os chunks novos recebem embedding.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        batch_size: int = 256,
+        persist_every_files: int = 0,
+        persist_interval_seconds: float = 0,
+        on_persist: Optional[Callable[[VectorStore], None]] = None,
+    ):
+        """
+        Inicializa a sessão.
+
+        Args:
+            vector_store: VectorStore que receberá os documentos
+            batch_size: Número de chunks acumulados antes de gerar embeddings
+            persist_every_files: Persiste a cada N arquivos (0 = só no commit)
+            persist_interval_seconds: Intervalo máximo entre gravações (0 = só no commit)
+            on_persist: Callback chamado após cada gravação em disco
+        """
+        self._vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.persist_every_files = persist_every_files
+        self.persist_interval_seconds = persist_interval_seconds
+        self._on_persist = on_persist
+
+        # Planos de atualização (um por arquivo) ainda não aplicados
+        self._buffer: List[dict] = []
+        self._buffered_chunks = 0
+        # Há alterações no índice em memória ainda não gravadas
+        self._dirty = False
+        self._files_since_persist = 0
+        self._last_persist = time.monotonic()
+        self._closed = False
+
+        self.added_files: List[str] = []
+        self.removed_files: List[str] = []
+        self.failed_files: Dict[str, str] = {}
+        self.chunks_added = 0
+        self.chunks_kept = 0
+        self.chunks_removed = 0
+        self.persist_count = 0
+
+    @property
+    def vector_store(self) -> VectorStore:
+        """Retorna o VectorStore de destino da sessão."""
+        return self._vector_store
+
+    def __enter__(self) -> "IngestionSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Em caso de erro, não grava um índice possivelmente inconsistente
+        if exc_type is None:
+            self.commit()
+        else:
+            self._buffer = []
+            self._buffered_chunks = 0
+            self._closed = True
+
+    def add_file(
+        self,
+        file_name: str,
+        chunks: List[Document],
+        fingerprint: Optional[dict] = None,
+    ) -> None:
+        """
+        Adiciona (ou atualiza) os chunks de um arquivo na sessão.
+
+        Args:
+            file_name: Nome do arquivo (registrado em indexed_files)
+            chunks: Chunks já divididos do arquivo
+            fingerprint: Impressão digital do arquivo (fingerprint_file)
+        """
+        if self._closed:
+            raise RuntimeError("Sessão de ingestão já finalizada.")
+        if not chunks:
+            return
+
+        # O mesmo arquivo duas vezes no buffer geraria planos conflitantes
+        if any(plan["file_name"] == file_name for plan in self._buffer):
+            self.flush()
+
+        plan = self._vector_store.plan_file_update(file_name, chunks, fingerprint)
+        self._buffer.append(plan)
+        self._buffered_chunks += len(plan["add_chunks"])
+        self._files_since_persist += 1
+
+        if self._buffered_chunks >= self.batch_size:
+            self.flush()
+
+        if self._should_persist():
+            self.persist()
+
+    def remove_file(self, file_name: str) -> None:
+        """
+        Remove um arquivo (ex: apagado da pasta) do índice.
+
+        Args:
+            file_name: Nome do arquivo no índice
+        """
+        if self._closed:
+            raise RuntimeError("Sessão de ingestão já finalizada.")
+
+        self.flush()
+        self.chunks_removed += self._vector_store.remove_file(file_name)
+        self.removed_files.append(file_name)
+        self._dirty = True
+
+    def flush(self) -> None:
+        """Gera embeddings dos chunks em buffer e os aplica ao índice em memória."""
+        if not self._buffer:
+            return
+
+        buffer = self._buffer
+        self._buffer = []
+        self._buffered_chunks = 0
+
+        try:
+            self._vector_store.apply_file_updates(buffer)
+            for plan in buffer:
+                self._mark_applied(plan)
+        except Exception:
+            # apply_file_updates desfez o lote: reprocessa arquivo a arquivo
+            # para isolar o que falhou
+            for plan in buffer:
+                try:
+                    self._vector_store.apply_file_updates([plan])
+                    self._mark_applied(plan)
+                except Exception as e:
+                    self.failed_files[plan["file_name"]] = str(e)
+
+    def persist(self) -> None:
+        """Descarrega o buffer e grava o índice em disco."""
+        self.flush()
+
+        if self._vector_store.is_initialized and self._dirty:
+            # Contextos que cresceram além do limite viram HNSW/IVF-PQ
+            self._vector_store.maybe_promote()
+            self._vector_store.save()
+            self.persist_count += 1
+
+            if self._on_persist:
+                self._on_persist(self._vector_store)
+
+        self._dirty = False
+        self._files_since_persist = 0
+        self._last_persist = time.monotonic()
+
+    def commit(self) -> None:
+        """Finaliza a sessão gravando tudo que estiver pendente."""
+        if self._closed:
+            return
+        self.persist()
+        self._closed = True
+
+    def _mark_applied(self, plan: dict) -> None:
+        """Registra um arquivo cujas alterações entraram no índice."""
+        self.added_files.append(plan["file_name"])
+        self.chunks_added += len(plan["add_chunks"])
+        self.chunks_kept += len(plan["kept"])
+        self.chunks_removed += len(plan["remove_ids"])
+        self._dirty = True
+
+    def _should_persist(self) -> bool:
+        """Verifica se algum limite de persistência foi atingido."""
+        if self.persist_every_files and self._files_since_persist >= self.persist_every_files:
+            return True
+        if self.persist_interval_seconds and self._files_since_persist:
+            return time.monotonic() - self._last_persist >= self.persist_interval_seconds
+        return False
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas da sessão."""
+        return {
+            "added_files": len(self.added_files),
+            "removed_files": len(self.removed_files),
+            "failed_files": len(self.failed_files),
+            "chunks_added": self.chunks_added,
+            "chunks_kept": self.chunks_kept,
+            "chunks_removed": self.chunks_removed,
+            "persist_count": self.persist_count,
+            "pending_chunks": self._buffered_chunks,
         }
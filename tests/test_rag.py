@@ -9,6 +9,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from src.document_loader import DocumentLoader
 from src.chunker import Chunker
 from src.toon_formatter import ToonFormatter
+from src.vector_store import VectorStore
 
 
 def test_document_loader_formats():
@@ -63,6 +64,1373 @@ def test_toon_formatter_type():
     print("✅ test_toon_formatter_type passed")
 
 
+def test_ingestion_session_persists_once(tmp_path):
+    """Testa que a sessão de ingestão grava o índice uma única vez."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    store = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=16),
+        index_path=str(tmp_path / "ctx"),
+    )
+    persisted = []
+
+    with store.begin_ingestion(batch_size=2, on_persist=persisted.append) as session:
+        for name in ["a.txt", "b.txt", "c.txt"]:
+            session.add_file(name, [Document(page_content=f"Conteúdo de {name}", metadata={"source": name})])
+
+    assert session.persist_count == 1
+    assert len(persisted) == 1
+    assert store.indexed_files == ["a.txt", "b.txt", "c.txt"]
+    assert store.get_stats()["total_documents"] == 3
+    assert VectorStore.has_saved_index(str(tmp_path / "ctx"))
+
+    print("✅ test_ingestion_session_persists_once passed")
+
+
+def test_embedding_cache_hits(tmp_path):
+    """Testa que textos repetidos não são reenviados ao provedor."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    calls = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            calls.append(list(texts))
+            return super().embed_documents(texts)
+
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    embeddings = CachedEmbeddings(CountingEmbeddings(size=8), cache, "fake", "fake-8")
+
+    first = embeddings.embed_documents(["Art. 12", "bloco  B"])
+    second = embeddings.embed_documents(["Art. 12", "bloco B", "novo"])
+
+    assert calls == [["Art. 12", "bloco  B"], ["novo"]]
+    assert second[:2] == first
+    assert embeddings.hits == 2
+    assert embeddings.misses == 3
+
+    print("✅ test_embedding_cache_hits passed")
+
+
+def test_incremental_reindex(tmp_path):
+    """Testa que só chunks novos são adicionados e arquivos apagados são removidos."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    store = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=16),
+        index_path=str(tmp_path / "ctx"),
+    )
+
+    def chunks(*texts):
+        return [Document(page_content=t, metadata={"source": "a.txt"}) for t in texts]
+
+    with store.begin_ingestion() as session:
+        session.add_file("a.txt", chunks("art. 1", "art. 2"), {"sha256": "v1"})
+        session.add_file("b.txt", chunks("outro"), {"sha256": "b1"})
+
+    assert store.is_file_unchanged("a.txt", {"sha256": "v1"})
+    assert not store.is_file_unchanged("a.txt", {"sha256": "v2"})
+
+    with store.begin_ingestion() as session:
+        session.add_file("a.txt", chunks("art. 1", "art. 3"), {"sha256": "v2"})
+        session.remove_file("b.txt")
+
+    assert session.chunks_added == 1
+    assert session.chunks_kept == 1
+    assert session.chunks_removed == 2
+    assert store.indexed_files == ["a.txt"]
+
+    contents = sorted(doc.page_content for doc in store.search_documents("art", top_k=10))
+    assert contents == ["art. 1", "art. 3"]
+
+    print("✅ test_incremental_reindex passed")
+
+
+def test_parallel_loading_isolates_errors(tmp_path):
+    """Testa carregamento paralelo com um arquivo inválido no lote."""
+    for i in range(4):
+        (tmp_path / f"doc{i}.txt").write_text(f"Documento {i}", encoding="utf-8")
+    (tmp_path / "quebrado.pdf").write_bytes(b"nao e um pdf")
+
+    loader = DocumentLoader(workers=2)
+    results = {
+        path.name: (docs, error)
+        for path, docs, error in loader.iter_load(loader.list_files(tmp_path))
+    }
+
+    assert len(results) == 5
+    assert results["quebrado.pdf"][0] == []
+    assert results["quebrado.pdf"][1]
+    assert results["doc2.txt"][0][0].page_content == "Documento 2"
+    assert results["doc2.txt"][0][0].metadata["source"] == "doc2.txt"
+
+    print("✅ test_parallel_loading_isolates_errors passed")
+
+
+def test_streaming_pipeline_sync(tmp_path):
+    """Testa o pipeline em streaming sincronizando uma pasta com o índice."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.ingestion import IngestionPipeline
+
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for i in range(3):
+        (folder / f"doc{i}.txt").write_text(f"Regulamento interno, artigo {i}. " * 30, encoding="utf-8")
+    (folder / "vazio.txt").write_text(" ", encoding="utf-8")
+
+    store = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=16),
+        index_path=str(tmp_path / "ctx"),
+    )
+    pipeline = IngestionPipeline(DocumentLoader(), Chunker(chunk_size=200, chunk_overlap=20), queue_size=1)
+    events = []
+
+    with store.begin_ingestion(batch_size=4) as session:
+        result = pipeline.sync_directory(session, folder, progress_callback=lambda *e: events.append(e))
+
+    assert sorted(result["indexed"]) == ["doc0.txt", "doc1.txt", "doc2.txt"]
+    assert [name for name, _ in result["failed"]] == ["vazio.txt"]
+    assert events[-1][:2] == (4, 4)
+
+    (folder / "doc0.txt").unlink()
+    with store.begin_ingestion() as session:
+        result = pipeline.sync_directory(session, folder)
+
+    assert result["indexed"] == []
+    assert sorted(result["unchanged"]) == ["doc1.txt", "doc2.txt"]
+    assert result["removed"] == ["doc0.txt"]
+
+    print("✅ test_streaming_pipeline_sync passed")
+
+
+def test_batched_embeddings_retry_and_order():
+    """Testa lotes concorrentes, ordem dos vetores e retry em HTTP 429."""
+    import asyncio
+    import threading
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.embeddings import BatchedEmbeddings
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    # Lotes rodam em threads: só um deles pode consumir a falha
+    failure_lock = threading.Lock()
+
+    class FlakyEmbeddings(DeterministicFakeEmbedding):
+        failures: int = 1
+
+        def embed_documents(self, texts):
+            with failure_lock:
+                failing = self.failures > 0
+                if failing:
+                    self.failures -= 1
+            if failing:
+                raise RateLimited("too many requests")
+            return super().embed_documents(texts)
+
+    base = FlakyEmbeddings(size=8)
+    batched = BatchedEmbeddings(base, batch_size=3, max_concurrency=3, retry_backoff=0)
+    texts = [f"texto {i}" for i in range(10)]
+
+    vectors = batched.embed_documents(texts)
+    assert vectors == DeterministicFakeEmbedding(size=8).embed_documents(texts)
+    assert asyncio.run(batched.aembed_documents(texts)) == vectors
+
+    stats = batched.metrics.get_stats()
+    assert stats["retries"] == 1
+    assert stats["batches"] == 8
+    assert stats["texts"] == 20
+
+    print("✅ test_batched_embeddings_retry_and_order passed")
+
+
+def test_hnsw_index_promotion_and_deletes(tmp_path):
+    """Testa promoção flat → HNSW com checagem de recall e remoções por lápide."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.faiss_index import IndexSettings
+
+    store = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=16),
+        index_path=str(tmp_path / "ctx"),
+        index_settings=IndexSettings(promote_threshold=50, hnsw_m=8, ef_search=64),
+    )
+
+    def chunks(name, count):
+        return [Document(page_content=f"{name} trecho {i}", metadata={"source": name}) for i in range(count)]
+
+    with store.begin_ingestion() as session:
+        session.add_file("a.txt", chunks("a.txt", 40), {"sha256": "a1"})
+        session.add_file("b.txt", chunks("b.txt", 40), {"sha256": "b1"})
+
+    # Ultrapassou promote_threshold: promovido para HNSW no commit
+    assert store.index_type == "hnsw"
+    assert store.evaluate_recall() >= 0.9
+
+    with store.begin_ingestion() as session:
+        session.remove_file("b.txt")
+
+    # HNSW não remove fisicamente: lápides acima de 20% compactam o índice
+    assert store.get_stats()["index_vectors"] == 40
+    results = store.search_documents("a.txt trecho 3", top_k=50)
+    assert len(results) == 40
+    assert all(doc.metadata["source"] == "a.txt" for doc in results)
+
+    reloaded = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=16),
+        index_path=str(tmp_path / "ctx"),
+    )
+    reloaded.load()
+    assert reloaded.index_type == "hnsw"
+    assert reloaded.search_documents("a.txt trecho 3", top_k=1)[0].page_content == "a.txt trecho 3"
+
+    # Poucas lápides não compactam; get_retriever não reconstrói o índice
+    import pytest
+
+    with store.begin_ingestion() as session:
+        session.add_file("c.txt", chunks("c.txt", 2), {"sha256": "c1"})
+    with store.begin_ingestion() as session:
+        session.remove_file("c.txt")
+    assert store.get_stats()["index_vectors"] == 42
+    with pytest.raises(RuntimeError):
+        store.get_retriever()
+    store.compact()
+    assert store.get_retriever(top_k=1).invoke("a.txt trecho 3")[0].metadata["source"] == "a.txt"
+
+    print("✅ test_hnsw_index_promotion_and_deletes passed")
+
+
+def test_context_pool_lru():
+    """Testa acertos, carregamentos e descarte LRU do pool de contextos."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.context_pool import ContextPool
+
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        return VectorStore(embeddings=DeterministicFakeEmbedding(size=8), context_name=name), None
+
+    pool = ContextPool(max_contexts=2)
+    pool.get_or_load("cond_1", loader)
+    pool.get_or_load("cond_2", loader)
+    pool.get_or_load("cond_1", loader)  # acerto: cond_1 vira o mais recente
+    pool.get_or_load("cond_3", loader)  # descarta cond_2 (menos recente)
+
+    assert loads == ["cond_1", "cond_2", "cond_3"]
+    assert pool.resident == ["cond_1", "cond_3"]
+
+    stats = pool.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+
+    print("✅ test_context_pool_lru passed")
+
+
+def test_mmap_load_copy_on_write(tmp_path):
+    """Testa carga mapeada em memória com cópia na primeira alteração."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.faiss_index import IndexSettings
+
+    def new_store():
+        return VectorStore(
+            embeddings=DeterministicFakeEmbedding(size=16),
+            index_path=str(tmp_path / "ctx"),
+            index_settings=IndexSettings(mmap=True),
+        )
+
+    writer = new_store()
+    writer.add_documents([Document(page_content=f"art. {i}", metadata={"source": "a.txt"}) for i in range(5)])
+    writer.save()
+
+    reader = new_store()
+    reader.load()
+    assert reader.is_memory_mapped
+    assert reader.search_documents("art. 2", top_k=1)[0].page_content == "art. 2"
+
+    # Outro processo regrava o índice: o leitor continua com a versão mapeada
+    writer.add_documents([Document(page_content="art. 9", metadata={"source": "b.txt"})])
+    writer.save()
+    assert reader.get_stats()["index_vectors"] == 5
+
+    # Alterar um índice mapeado copia-o para a memória antes
+    reader.add_documents([Document(page_content="art. 7", metadata={"source": "c.txt"})])
+    assert not reader.is_memory_mapped
+    assert reader.get_stats()["index_vectors"] == 6
+
+    print("✅ test_mmap_load_copy_on_write passed")
+
+
+def test_chunk_store_replaces_pickle(tmp_path):
+    """Testa o chunk store em SQLite e a conversão de índices com index.pkl."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.chunk_store import ChunkStore
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [
+        Document(page_content=f"art. {i}", metadata={"source": "a.txt", "chunk_index": i})
+        for i in range(3)
+    ]
+
+    # Índice no formato antigo, salvo pelo LangChain com pickle
+    FAISS.from_documents(docs, embeddings).save_local(str(tmp_path / "ctx"))
+
+    store = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"))
+    store.load()
+    assert not (tmp_path / "ctx" / "index.pkl").exists()
+    assert (VectorStore.index_dir(str(tmp_path / "ctx")) / ChunkStore.FILE_NAME).exists()
+
+    reloaded = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"))
+    reloaded.load()
+    doc = reloaded.search_documents("art. 1", top_k=1)[0]
+    assert doc.page_content == "art. 1"
+    assert doc.metadata == {"source": "a.txt", "chunk_index": 1}
+    assert reloaded.get_stats()["total_documents"] == 3
+
+    # Metadados texto iguais são gravados uma única vez
+    chunk_store = reloaded._vectorstore.docstore
+    assert chunk_store._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0] == 1
+
+    print("✅ test_chunk_store_replaces_pickle passed")
+
+
+def test_answer_cache_invalidated_by_index_change(tmp_path, monkeypatch):
+    """Testa o cache de respostas: acerto semântico e invalidação pelo índice."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeListLLM
+    from src.query_cache import AnswerCache, QueryEmbeddingCache
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    store = VectorStore(embeddings=DeterministicFakeEmbedding(size=16), index_path=str(tmp_path / "ctx"))
+    store.add_documents([Document(page_content="A piscina abre às 8h.", metadata={"source": "regras.txt"})])
+
+    chain = RAGChain(
+        vector_store=store,
+        context_name="cond_1",
+        query_cache=QueryEmbeddingCache(),
+        answer_cache=AnswerCache(similarity_threshold=0.95),
+    )
+    chain._llm = FakeListLLM(responses=["resposta 1", "resposta 2"])
+
+    first = chain.query("Horário da piscina?")
+    second = chain.query("  horário da  PISCINA? ")  # mesmo texto normalizado
+    assert not first["cached"] and second["cached"]
+    assert second["answer"] == "resposta 1"
+    assert chain.query_cache.hits == 1
+
+    # Nova versão do índice descarta a resposta armazenada
+    store.add_documents([Document(page_content="A piscina fecha às 22h.", metadata={"source": "regras.txt"})])
+    third = chain.query("Horário da piscina?")
+    assert not third["cached"] and third["answer"] == "resposta 2"
+    assert chain.answer_cache.invalidations == 1
+
+    print("✅ test_answer_cache_invalidated_by_index_change passed")
+
+
+def test_rag_chain_stream_emits_sources_first(tmp_path, monkeypatch):
+    """Testa o streaming: fontes antes dos tokens e resposta completa no cache."""
+    import asyncio
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeStreamingListLLM
+    from src.query_cache import AnswerCache, QueryEmbeddingCache
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    store = VectorStore(embeddings=DeterministicFakeEmbedding(size=16), index_path=str(tmp_path / "ctx"))
+    store.add_documents([Document(page_content="A piscina abre às 8h.", metadata={"source": "regras.txt"})])
+
+    chain = RAGChain(
+        vector_store=store,
+        context_name="cond_1",
+        query_cache=QueryEmbeddingCache(),
+        answer_cache=AnswerCache(),
+    )
+    chain._llm = FakeStreamingListLLM(responses=["Abre às 8h.", "Fecha às 22h."])
+
+    events = list(chain.stream("Horário da piscina?"))
+    assert events[0]["type"] == "sources"
+    assert events[0]["sources"][0]["file"] == "regras.txt"
+    tokens = [e["text"] for e in events if e["type"] == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == "Abre às 8h."
+    assert events[-1]["type"] == "done" and not events[-1]["cached"]
+
+    # Resposta completa foi para o cache: a mesma pergunta não chama o LLM
+    cached = chain.query("Horário da piscina?")
+    assert cached["cached"] and cached["answer"] == "Abre às 8h."
+
+    async def collect():
+        return [event async for event in chain.astream("Quando fecha?")]
+
+    async_events = asyncio.run(collect())
+    assert async_events[0]["type"] == "sources"
+    assert async_events[-1]["answer"] == "Fecha às 22h."
+
+    print("✅ test_rag_chain_stream_emits_sources_first passed")
+
+
+def test_context_locks_isolate_contexts():
+    """Testa o RWLock: indexar um contexto bloqueia só as consultas dele."""
+    import threading
+    from src.concurrency import ContextLocks
+
+    locks = ContextLocks()
+    cond_1 = locks.get("cond_1")
+    assert locks.get("cond_1") is cond_1
+
+    # Leitores simultâneos no mesmo contexto
+    assert cond_1.acquire_read(timeout=0.1)
+    assert cond_1.acquire_read(timeout=0.1)
+    assert not cond_1.acquire_write(timeout=0.05)
+    cond_1.release_read()
+    cond_1.release_read()
+
+    with cond_1.write():
+        assert locks.get_stats()["writing"] == ["cond_1"]
+        # Consultas no contexto em indexação esperam; nos demais, não
+        assert not cond_1.acquire_read(timeout=0.05)
+        assert locks.get("cond_2").acquire_read(timeout=0.05)
+        locks.get("cond_2").release_read()
+
+    # Liberação em outra thread (handlers assíncronos)
+    assert cond_1.acquire_read(timeout=0.1)
+    releaser = threading.Thread(target=cond_1.release_read)
+    releaser.start()
+    releaser.join()
+    assert cond_1.acquire_write(timeout=0.1)
+    cond_1.release_write()
+
+    print("✅ test_context_locks_isolate_contexts passed")
+
+
+def test_cancelled_read_wait_releases_lock():
+    """Testa que uma consulta cancelada enquanto espera o lock não trava o contexto."""
+    import asyncio
+    from src.concurrency import RWLock
+
+    lock = RWLock()
+
+    async def scenario():
+        assert lock.acquire_write(timeout=0.1)
+        waiting = asyncio.ensure_future(lock.acquire_read_async())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        assert waiting.cancelled()
+
+        # O escritor termina: a thread adquire a leitura abandonada e a libera
+        lock.release_write()
+        await asyncio.sleep(0.2)
+        assert lock.readers == 0
+        # O próximo escritor (ex: indexação) não fica esperando para sempre
+        assert await asyncio.to_thread(lock.acquire_write, 1.0)
+        lock.release_write()
+
+    asyncio.run(scenario())
+
+    print("✅ test_cancelled_read_wait_releases_lock passed")
+
+
+def test_http_api_query_and_stream(tmp_path, monkeypatch):
+    """Testa a API HTTP: consulta, streaming NDJSON, lote e métricas."""
+    import json
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+    from src.api import create_api
+    from src.concurrency import ContextLocks
+    from src.context_manager import ContextManager
+    from src.context_pool import ContextPool
+
+    monkeypatch.setattr(ContextManager, "CONTEXTS_DIR", tmp_path / "contexts")
+    state = SimpleNamespace(
+        context_manager=ContextManager(),
+        context_pool=ContextPool(),
+        context_locks=ContextLocks(),
+        embeddings=SimpleNamespace(get_metrics=lambda: {"texts": 0}),
+    )
+    state.context_manager.create_context("cond_1")
+    state.context_manager.create_context("vazio")
+
+    async def stream_answer(context_name, question, llm_provider, metadata_filter=None):
+        if context_name == "vazio":
+            raise LookupError("sem documentos")
+        sources = [{"file": "regras.txt", "chunk": "1/1", "content": "..."}]
+        yield {"type": "sources", "sources": sources, "cached": False}
+        for token in ["Abre ", "às 8h."]:
+            yield {"type": "token", "text": token}
+        yield {"type": "done", "answer": "Abre às 8h.", "sources": sources, "cached": False}
+
+    api = create_api(
+        state,
+        stream_answer=stream_answer,
+        index_files=lambda name, paths: {"indexed": [], "unchanged": [], "failed": []},
+        config_path=str(Path(__file__).parent.parent / "config.toml"),
+    )
+    client = TestClient(api)
+
+    assert client.get("/health").json()["status"] == "ok"
+
+    result = client.post("/contexts/cond_1/query", json={"question": "Horário?"}).json()
+    assert result["answer"] == "Abre às 8h." and result["sources"][0]["file"] == "regras.txt"
+
+    assert client.post("/contexts/nao_existe/query", json={"question": "?"}).status_code == 404
+    assert client.post("/contexts/vazio/query", json={"question": "?"}).status_code == 409
+    assert client.post("/contexts/cond_1/query", json={"question": "?", "filter": {"pagina": 1}}).status_code == 400
+
+    with client.stream("POST", "/contexts/cond_1/query/stream", json={"question": "Horário?"}) as response:
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    assert [e["type"] for e in events] == ["sources", "token", "token", "done"]
+
+    batch = client.post(
+        "/contexts/cond_1/query/batch",
+        json={"questions": ["a?", "b?"], "return_sources": False},
+    ).json()["results"]
+    assert [r["question"] for r in batch] == ["a?", "b?"]
+    assert "sources" not in batch[0]
+
+    assert client.get("/metrics").json()["http"]["requests"] >= 5
+
+    print("✅ test_http_api_query_and_stream passed")
+
+
+def test_batch_query_writes_jsonl(tmp_path, monkeypatch):
+    """Testa o batch_query: embeddings em lote, busca única e saída JSONL."""
+    import json
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeListLLM
+    from src.query_cache import AnswerCache, QueryEmbeddingCache
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"))
+    store.add_documents([
+        Document(page_content=f"Regra {i} do condomínio.", metadata={"source": "regras.txt"})
+        for i in range(6)
+    ])
+
+    embed_calls = []
+    original = store.embed_queries
+    monkeypatch.setattr(store, "embed_queries", lambda texts: embed_calls.append(texts) or original(texts))
+    single_calls = []
+    monkeypatch.setattr(store, "embed_query", lambda text: single_calls.append(text))
+
+    chain = RAGChain(
+        vector_store=store,
+        context_name="cond_1",
+        query_cache=QueryEmbeddingCache(),
+        answer_cache=AnswerCache(),
+        batch_concurrency=2,
+    )
+    chain._llm = FakeListLLM(responses=["resposta"] * 10)
+
+    questions = ["Horário da piscina?", "Pode ter pet?", "horário da  PISCINA?", "Regra da garagem?"]
+    output = tmp_path / "respostas.jsonl"
+    results = chain.batch_query(questions, output=output)
+
+    # Um único lote de embeddings com as perguntas distintas
+    assert len(embed_calls) == 1 and len(embed_calls[0]) == 3 and not single_calls
+    assert all(r["answer"] == "resposta" and r["sources"] for r in results)
+
+    lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+
+    # Segunda rodada sai toda do cache de respostas
+    again = chain.batch_query(questions, return_sources=False)
+    assert all(r["cached"] and "sources" not in r for r in again)
+
+    print("✅ test_batch_query_writes_jsonl passed")
+
+
+def test_hybrid_search_finds_exact_terms(tmp_path):
+    """Testa a busca híbrida: BM25 recupera termos exatos e acompanha o índice."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"), hybrid_search=True)
+
+    filler = [
+        Document(page_content=f"Disposição geral número {i} do regimento.", metadata={"source": "regimento.txt"})
+        for i in range(40)
+    ]
+    target = Document(page_content="Art. 12 - As vagas do bloco B são numeradas.", metadata={"source": "garagem.txt"})
+
+    with store.begin_ingestion() as session:
+        session.add_file("regimento.txt", filler)
+        session.add_file("garagem.txt", [target])
+
+    # Vetores aleatórios: só o BM25 encontra o artigo
+    top = store.search("Art. 12 bloco B", top_k=3)
+    assert any(doc.metadata["source"] == "garagem.txt" for doc, _ in top)
+    assert all(score > 0 for _, score in top)
+
+    # Índice lexical persiste junto com o chunk store
+    reloaded = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"), hybrid_search=True)
+    reloaded.load()
+    assert reloaded._chunk_store.search_lexical("bloco B")
+
+    # Remoção incremental: o chunk some também do índice lexical
+    with reloaded.begin_ingestion() as session:
+        session.remove_file("garagem.txt")
+    assert not reloaded._chunk_store.search_lexical("bloco B")
+
+    print("✅ test_hybrid_search_finds_exact_terms passed")
+
+
+def test_score_threshold_and_adaptive_top_k(tmp_path, monkeypatch):
+    """Testa o threshold de similaridade e o top-k adaptativo do RAGChain."""
+    import math
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    class KeywordEmbeddings(Embeddings):
+        """Vetores unitários fixos por palavra-chave."""
+
+        VECTORS = {
+            "horário": [0.9, math.sqrt(1 - 0.81), 0.0, 0.0],
+            "piscina": [1.0, 0.0, 0.0, 0.0],
+            "garagem": [0.0, 0.0, 1.0, 0.0],
+            "lixo": [0.0, 0.0, 0.0, 1.0],
+        }
+
+        def embed_query(self, text):
+            return next(v for key, v in self.VECTORS.items() if key in text)
+
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+    store = VectorStore(embeddings=KeywordEmbeddings(), index_path=str(tmp_path / "ctx"))
+    store.add_documents([
+        Document(page_content=text, metadata={"source": "regras.txt"})
+        for text in ["piscina", "horário da piscina", "garagem", "lixo"]
+    ])
+
+    def retrieved(**settings):
+        chain = RAGChain(vector_store=store, top_k=4, **settings)
+        return [doc.page_content for doc, _ in chain._search(["piscina?"], [store.embed_query("piscina?")])[0]]
+
+    # Distância L2 normalizada para cosseno: 1.0, 0.9, 0.0, 0.0
+    everything = retrieved()
+    assert everything[:2] == ["piscina", "horário da piscina"] and len(everything) == 4
+    assert retrieved(score_threshold=0.7) == ["piscina", "horário da piscina"]
+    assert retrieved(score_threshold=0.7, min_k=3)[:2] == ["piscina", "horário da piscina"]
+    assert len(retrieved(score_threshold=0.7, min_k=3)) == 3
+    assert retrieved(score_gap=0.05) == ["piscina"]
+
+    assert VectorStore.adaptive_cut([0.9, 0.85, 0.4], max_k=2) == 2
+
+    print("✅ test_score_threshold_and_adaptive_top_k passed")
+
+
+def test_pack_documents_merges_chunks_within_budget(monkeypatch):
+    """Testa a união de chunks vizinhos e o orçamento de tokens do contexto."""
+    from langchain_core.documents import Document
+    from src import toon_formatter
+
+    # Contagem por caracteres (independe dos arquivos do tiktoken)
+    monkeypatch.setattr(toon_formatter, "TIKTOKEN_AVAILABLE", False)
+    formatter = ToonFormatter(use_toon=False, model="modelo-teste-offline")
+
+    def chunk(text, index):
+        return Document(page_content=text, metadata={"source": "regulamento.pdf", "chunk_index": index, "total_chunks": 9})
+
+    docs = [
+        chunk("A piscina funciona das 8h às 22h, todos os dias.", 3),
+        Document(page_content="Taxa de mudança: R$ 150,00.", metadata={"source": "taxas.pdf"}),
+        chunk("todos os dias. Menores de 12 anos só acompanhados.", 4),
+        chunk("A piscina funciona das 8h às 22h, todos os dias.", 3),
+        chunk("Multas por barulho após as 22h: " + "x" * 2000, 7),
+    ]
+
+    units = formatter.merge_adjacent(docs)
+    assert len(units) == 3
+    assert units[0].page_content == (
+        "A piscina funciona das 8h às 22h, todos os dias. Menores de 12 anos só acompanhados."
+    )
+    assert units[0].metadata["chunk_range"] == "4-5"
+    assert ToonFormatter.chunk_label(units[0]) == "4-5/9"
+
+    # O chunk longo não cabe; os dois mais relevantes entram
+    packed = formatter.pack_documents(docs, token_budget=120)
+    assert [d.metadata["source"] for d in packed] == ["regulamento.pdf", "taxas.pdf"]
+    assert formatter.token_counter.count(formatter.format_documents(packed)) <= 120
+
+    # Se nem o mais relevante couber, ele é cortado
+    packed = formatter.pack_documents(docs[-1:], token_budget=60)
+    assert len(packed) == 1 and len(packed[0].page_content) < 2000
+    assert formatter.token_counter.count(formatter.format_documents(packed)) <= 60
+
+    print("✅ test_pack_documents_merges_chunks_within_budget passed")
+
+
+def test_reranker_reorders_caches_and_falls_back(tmp_path, monkeypatch):
+    """Testa a reordenação, o cache e o tempo limite do reranker."""
+    import time
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.rag_chain import RAGChain
+    from src.reranker import Reranker
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    scored = []
+
+    def keyword_score(query, texts):
+        scored.extend(texts)
+        return [float(text.count("piscina")) for text in texts]
+
+    reranker = Reranker(keyword_score, batch_size=2)
+    results = [
+        (Document(page_content=text), 0.1 * i)
+        for i, text in enumerate(["garagem", "piscina", "piscina piscina", "lixo"])
+    ]
+
+    reranked = reranker.rerank("Horário da piscina?", results, top_n=2)
+    assert [doc.page_content for doc, _ in reranked] == ["piscina piscina", "piscina"]
+    assert reranked[0][1] == 0.2  # mantém o score da busca
+
+    # Pergunta equivalente: pontuações vêm do cache
+    reranker.rerank("horário da  PISCINA?", results, top_n=2)
+    assert len(scored) == 4
+    assert reranker.get_stats()["cache_hits"] == 4
+
+    # Tempo limite esgotado: vale a ordem original
+    def slow_score(query, texts):
+        time.sleep(0.02)
+        return keyword_score(query, texts)
+
+    slow = Reranker(slow_score, batch_size=1, timeout_ms=1)
+    assert slow.rerank("piscina", results, top_n=2) == results[:2]
+    assert slow.get_stats()["fallbacks"] == 1
+
+    # No RAGChain a busca traz mais candidatos para o reranker escolher
+    store = VectorStore(embeddings=DeterministicFakeEmbedding(size=16), index_path=str(tmp_path / "ctx"))
+    store.add_documents([Document(page_content=f"regra {i}" + " piscina" * (i == 7)) for i in range(10)])
+    chain = RAGChain(vector_store=store, top_k=2, reranker=reranker, rerank_candidates=10)
+    found = chain._search(["piscina"], [store.embed_query("piscina")])[0]
+    assert len(found) == 2 and found[0][0].page_content == "regra 7 piscina"
+
+    print("✅ test_reranker_reorders_caches_and_falls_back passed")
+
+
+def test_near_duplicate_collapse_and_mmr(tmp_path):
+    """Testa a remoção de quase-duplicatas (SimHash) e o MMR na busca."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+    from src.diversity import hamming_distances, simhash
+
+    convention = (
+        "Art. 12 A piscina do condomínio funciona das 8h às 22h, todos os dias, inclusive feriados. "
+        "Menores de 12 anos apenas acompanhados de responsável. É proibido o uso de garrafas de vidro "
+        "na área da piscina. O síndico poderá interditar a piscina para manutenção mediante aviso "
+        "prévio de 48 horas aos condôminos."
+    )
+    revision = convention.replace("48 horas", "72 horas")
+    moving = (
+        "Taxa de mudança de R$ 150,00 deve ser paga com antecedência mínima de cinco dias úteis à "
+        "administração. A mudança só pode ocorrer de segunda a sábado, das 8h às 18h."
+    )
+    distances = hamming_distances([simhash(convention), simhash(revision), simhash(moving)])
+    assert distances[0, 1] <= 10 < distances[0, 2]
+
+    class FixedEmbeddings(Embeddings):
+        """A revisão fica mais perto da pergunta que o texto da mudança."""
+
+        VECTORS = {convention: [1.0, 0.0, 0.0], revision: [0.99, 0.141, 0.0], moving: [0.7, 0.0, 0.714]}
+
+        def embed_query(self, text):
+            return self.VECTORS.get(text, [1.0, 0.0, 0.0])
+
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+    docs = [Document(page_content=text, metadata={"source": name}) for text, name in (
+        (convention, "convencao.pdf"), (revision, "convencao_rev2.docx"), (moving, "mudancas.pdf"),
+    )]
+
+    def search(**settings):
+        path = tmp_path / f"ctx{len(list(tmp_path.iterdir()))}"
+        store = VectorStore(embeddings=FixedEmbeddings(), index_path=str(path), **settings)
+        store.add_documents([Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs])
+        return store, [doc.metadata["source"] for doc, _ in store.search("piscina", top_k=2)]
+
+    store, plain = search()
+    assert plain == ["convencao.pdf", "convencao_rev2.docx"]
+
+    # Assinatura gravada na indexação e preservada no chunk store
+    store.save()
+    reloaded = VectorStore(embeddings=FixedEmbeddings(), index_path=store._index_path)
+    reloaded.load()
+    assert reloaded.search("piscina", top_k=1)[0][0].metadata["simhash"] == simhash(convention)
+
+    assert search(dedupe_distance=10)[1] == ["convencao.pdf", "mudancas.pdf"]
+    assert search(mmr_lambda=0.3)[1] == ["convencao.pdf", "mudancas.pdf"]
+    assert search(mmr_lambda=1.0)[1] == plain
+
+    print("✅ test_near_duplicate_collapse_and_mmr passed")
+
+
+def test_local_onnx_embeddings_bucketed_batches():
+    """Testa os lotes por tamanho, o padding dinâmico e a saída NumPy do provider local."""
+    import threading
+
+    import numpy as np
+
+    from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from src.embeddings import BatchedEmbeddings
+    from src.local_embeddings import OnnxEmbeddings
+
+    class FakeEncoding:
+        def __init__(self, text):
+            self.ids = [1] + [len(word) + 2 for word in text.split()]
+
+    class FakeTokenizer:
+        def encode_batch(self, texts):
+            return [FakeEncoding(text) for text in texts]
+
+    class FakeSession:
+        """Saída (lote, tokens, 2): o [CLS] recebe (tokens reais, 1)."""
+
+        def __init__(self):
+            self.shapes = []
+
+        def run(self, _, inputs):
+            self.shapes.append(inputs["input_ids"].shape)
+            real = inputs["attention_mask"].sum(axis=1)
+            output = np.zeros(inputs["input_ids"].shape + (2,), dtype=np.float32)
+            output[:, 0, 0] = real
+            output[:, 0, 1] = 1.0
+            return [output]
+
+    # Modelo sem arquivo ONNX: só a lógica de lotes é exercitada
+    model = OnnxEmbeddings.__new__(OnnxEmbeddings)
+    model.tokenizer = FakeTokenizer()
+    model.session = FakeSession()
+    model.batch_size = 2
+    model.normalize = False
+    model._pad_id = 0
+    model._input_names = {"input_ids", "attention_mask"}
+    model._lock = threading.Lock()
+
+    texts = ["um dois três quatro cinco", "a", "um dois", "um dois três quatro", "b"]
+    vectors = model.embed_documents(texts)
+
+    assert isinstance(vectors, np.ndarray) and vectors.shape == (5, 2)
+    assert vectors[:, 0].tolist() == [6, 2, 3, 5, 2]  # ordem original restaurada
+    # Lotes de tamanho parecido, cada um com padding só até o maior texto dele
+    assert model.session.shapes == [(2, 2), (2, 5), (1, 6)]
+
+    # Os wrappers (lotes e cache) preservam a matriz NumPy
+    cache = EmbeddingCache(path=":memory:")
+    wrapped = CachedEmbeddings(BatchedEmbeddings(model, batch_size=3), cache, "local", "bge-m3")
+    assert isinstance(wrapped.embed_documents(texts), np.ndarray)
+    assert np.array_equal(wrapped.embed_documents(texts), vectors)
+    assert wrapped.get_cache_stats()["hits"] == 5
+
+    print("✅ test_local_onnx_embeddings_bucketed_batches passed")
+
+
+def test_embedding_model_registry_and_load_validation(tmp_path):
+    """Testa o registro de modelos (sem embedding de teste) e a validação na carga."""
+    import pytest
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.embeddings import EmbeddingsManager
+    from src.model_registry import EmbeddingModelRegistry
+
+    manager = EmbeddingsManager.__new__(EmbeddingsManager)
+    manager.model = "bge-m3:latest"
+    manager.embed_query = lambda text: pytest.fail("modelo conhecido não deve gerar embedding")
+    assert manager.get_dimensions() == 1024
+
+    probes = []
+
+    class NamedEmbeddings(DeterministicFakeEmbedding):
+        model: str = "modelo-interno-v1"
+
+        def embed_query(self, text):
+            probes.append(text)
+            return super().embed_query(text)
+
+    embeddings = NamedEmbeddings(size=12)
+    for _ in range(3):
+        info = EmbeddingModelRegistry.resolve("modelo-interno-v1", embeddings.embed_query)
+    assert info.dimensions == 12 and len(probes) == 1
+
+    # Modelo e dimensões ficam nos metadados do índice
+    store = VectorStore(embeddings=embeddings, index_path=str(tmp_path / "ctx"))
+    store.add_documents([Document(page_content="Art. 12 piscina")])
+    store.save()
+    assert store.embedding_info["dimensions"] == 12
+
+    same = VectorStore(embeddings=NamedEmbeddings(size=12), index_path=str(tmp_path / "ctx"))
+    same.load()
+    assert same.is_initialized
+
+    other = VectorStore(
+        embeddings=NamedEmbeddings(size=1024, model="bge-m3"),
+        index_path=str(tmp_path / "ctx"),
+    )
+    with pytest.raises(ValueError, match="modelo-interno-v1"):
+        other.load()
+    assert not other.is_initialized
+
+    print("✅ test_embedding_model_registry_and_load_validation passed")
+
+
+def test_compressed_codecs_and_tradeoff_report(tmp_path):
+    """Testa SQ8/fp16 e redução de dimensão, com codec gravado nos metadados."""
+    import json
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.faiss_index import IndexSettings
+
+    docs = [Document(page_content=f"cláusula {i}", metadata={"source": f"{i % 2}.txt"}) for i in range(120)]
+    store = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=32),
+        index_path=str(tmp_path / "ctx"),
+        index_settings=IndexSettings(codec="sq8", mmap=True),
+    )
+    store.create_index(docs)
+    store.save()
+
+    stats = store.get_stats()
+    assert stats["index_codec"] == "sq8" and stats["index_bytes_per_vector"] == 32
+    metadata_file = VectorStore.index_dir(str(tmp_path / "ctx")) / VectorStore.METADATA_FILE
+    metadata = json.loads(metadata_file.read_text(encoding="utf-8"))
+    assert metadata["index"]["codec"] == "sq8" and metadata["index"]["dimensions"] == 32
+
+    reloaded = VectorStore(
+        embeddings=DeterministicFakeEmbedding(size=32),
+        index_path=str(tmp_path / "ctx"),
+        index_settings=IndexSettings(codec="sq8", mmap=True),
+    )
+    reloaded.load()
+    assert reloaded.search_documents("cláusula 7", top_k=1)[0].page_content == "cláusula 7"
+    reloaded.remove_file("1.txt")
+    assert reloaded.get_stats()["index_codec"] == "sq8"
+    assert reloaded.get_stats()["index_vectors"] == 60
+
+    report = {
+        (row["codec"], row["dimensions"], row["reduction"]): row
+        for row in reloaded.compare_codecs(candidates=[
+            {"codec": "float32"}, {"codec": "fp16"}, {"codec": "sq8"},
+            {"codec": "float32", "reduce_dim": 8, "reduction": "truncate"},
+            {"codec": "float32", "reduce_dim": 8},
+        ])
+    }
+    assert report[("float32", 32, None)]["bytes_per_vector"] == 128
+    assert report[("float32", 32, None)]["recall_at_10"] == 1.0
+    assert report[("fp16", 32, None)]["bytes_per_vector"] == 64
+    assert report[("fp16", 32, None)]["recall_at_10"] >= 0.95
+    assert report[("sq8", 32, None)]["bytes_per_vector"] == 32
+    assert report[("float32", 8, "truncate")]["bytes_per_vector"] == 32
+    # PCA de 8 dimensões precisa de 80 vetores de treino (restam 60)
+    assert report[("float32", 8, "pca")]["recall_at_10"] is None
+
+    # Redução configurada no contexto: convertida quando há vetores para o treino
+    reloaded._index_settings = IndexSettings(reduce_dim=8, reduction="truncate", min_recall=0.0)
+    assert reloaded.maybe_promote() is not None
+    assert reloaded.get_stats()["index_dimensions"] == 8 and reloaded.get_stats()["index_codec"] == "float32"
+    assert reloaded.maybe_promote() is None
+
+    print("✅ test_compressed_codecs_and_tradeoff_report passed")
+
+
+def test_federated_search_embeds_once_with_quotas(tmp_path, monkeypatch):
+    """Testa a busca em vários contextos: um embedding, cotas por contexto e atribuição."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeListLLM
+    from src.concurrency import ContextLocks
+    from src.federated_search import FederatedSearch
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    queries = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_query(self, text):
+            queries.append(text)
+            return super().embed_query(text)
+
+    embeddings = CountingEmbeddings(size=16)
+    stores = {}
+    for name in ("cond_1", "cond_2", "cond_3"):
+        stores[name] = VectorStore(embeddings=embeddings, index_path=str(tmp_path / name))
+    for name in ("cond_1", "cond_2"):
+        stores[name].add_documents([
+            Document(page_content=f"{name} regra {i}", metadata={"source": "regulamento.pdf", "chunk_index": i})
+            for i in range(5)
+        ])
+    stores["cond_2"].add_documents([Document(page_content="Horário da piscina", metadata={"source": "avisos.txt"})])
+
+    federated = FederatedSearch(stores.get, per_context_k=2, top_k=3, context_locks=ContextLocks())
+    results = federated.search_many(["cond_1", "cond_2", "cond_3", "inexistente"], "Horário da piscina")
+
+    assert len(queries) == 1
+    assert len(results) == 3
+    assert results[0][0].page_content == "Horário da piscina" and results[0][0].metadata["context"] == "cond_2"
+    contexts = [doc.metadata["context"] for doc, _ in results]
+    assert contexts.count("cond_2") <= 2 and "cond_1" in contexts
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+    # Uma resposta com a origem de cada fonte; o embedding vem do cache de perguntas do chain
+    chain = RAGChain(vector_store=stores["cond_1"], top_k=3)
+    chain._llm = FakeListLLM(responses=["A piscina abre às 8h (cond_2)."])
+    result = chain.query_contexts("Horário da piscina", federated, ["cond_1", "cond_2"])
+    assert result["answer"].startswith("A piscina")
+    assert {source["context"] for source in result["sources"]} == {"cond_1", "cond_2"}
+    assert sum(result["contexts"].values()) == len(result["sources"])
+    assert len(queries) == 2
+
+    # Busca híbrida: a união usa a similaridade vetorial, não o score RRF (só de posição)
+    import pytest
+
+    for name in ("hib_1", "hib_2"):
+        stores[name] = VectorStore(embeddings=embeddings, index_path=str(tmp_path / name), hybrid_search=True)
+        stores[name].add_documents([
+            Document(page_content=f"{name} regra {i}", metadata={"source": "regulamento.pdf"}) for i in range(3)
+        ])
+    stores["hib_2"].add_documents([Document(page_content="Horário da piscina", metadata={"source": "avisos.txt"})])
+
+    results = federated.search_many(["hib_1", "hib_2"], "Horário da piscina", top_k=4)
+    assert results[0][0].page_content == "Horário da piscina"
+    embedding = embeddings.embed_query("Horário da piscina")
+    for doc, score in results:
+        store = stores[doc.metadata["context"]]
+        vector_hits = {hit.id: store.similarity(raw) for hit, raw in store.search_by_vector(embedding, 10)}
+        assert score == pytest.approx(vector_hits[doc.id], abs=1e-5)
+
+    federated.shutdown()
+    print("✅ test_federated_search_embeds_once_with_quotas passed")
+
+
+def test_metadata_prefilter_selects_before_search(tmp_path, monkeypatch):
+    """Testa filtros de metadados (arquivo, página, seção, data) aplicados dentro da busca FAISS."""
+    import pytest
+
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeListLLM
+    from src.faiss_index import IndexSettings
+    from src.metadata_filter import MetadataFilter
+    from src.query_cache import AnswerCache
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    documents = [
+        Document(
+            page_content=f"Regra {i} sobre a piscina",
+            metadata={
+                "source": f"regulamento_{i % 3}.pdf",
+                "file_type": ".pdf",
+                "page": i % 10,
+                "loaded_at": f"2024-0{1 + i % 5}-01T10:00:00",
+            },
+        )
+        for i in range(300)
+    ]
+    documents.append(Document(
+        page_content="Piscina aberta das 8h às 22h",
+        metadata={"source": "avisos.md", "file_type": ".md", "header_1": "Lazer", "loaded_at": "2025-03-01T10:00:00"},
+    ))
+
+    for index_type in ("flat", "hnsw"):
+        store = VectorStore(
+            embeddings=DeterministicFakeEmbedding(size=16),
+            index_path=str(tmp_path / index_type),
+            index_settings=IndexSettings(index_type=index_type),
+            hybrid_search=True,
+        )
+        store.create_index(documents)
+
+        pages = MetadataFilter(source="regulamento_1.pdf", page_min=2, page_max=4)
+        results = store.search("piscina", top_k=5, metadata_filter=pages)
+        assert len(results) == 5
+        assert all(doc.metadata["source"] == "regulamento_1.pdf" and 2 <= doc.metadata["page"] <= 4 for doc, _ in results)
+
+        section = MetadataFilter.from_dict({"header_1": "Lazer", "file_type": "md", "loaded_after": "2025-01-01"})
+        assert [doc.metadata["source"] for doc, _ in store.search("regra", top_k=5, metadata_filter=section)] == ["avisos.md"]
+        assert store.search("piscina", top_k=5, metadata_filter=MetadataFilter(source="outro.pdf")) == []
+
+        # Seletor de IDs do FAISS e busca exaustiva sobre as posições retornam o mesmo
+        embedding = store.embed_query("piscina")
+        exhaustive = store.search_by_vector(embedding, 8, metadata_filter=pages)
+        store.FILTER_EXACT_MAX = 0
+        assert [doc.id for doc, _ in store.search_by_vector(embedding, 8, metadata_filter=pages)] == [doc.id for doc, _ in exhaustive]
+
+        # Chunks removidos não voltam pelo filtro
+        store.remove_file("avisos.md")
+        assert store.search("piscina", top_k=5, metadata_filter=section) == []
+
+    # Respostas com filtro ficam em um escopo próprio do cache
+    chain = RAGChain(vector_store=store, top_k=3, answer_cache=AnswerCache())
+    chain._llm = FakeListLLM(responses=["Com filtro.", "Sem filtro."])
+    assert chain.query("piscina", metadata_filter=pages)["answer"] == "Com filtro."
+    assert all(source["file"] == "regulamento_1.pdf" for source in chain.query("piscina", metadata_filter=pages)["sources"])
+    assert chain.query("piscina")["answer"] == "Sem filtro."
+
+    with pytest.raises(ValueError):
+        MetadataFilter.from_dict({"pagina": 2})
+    assert MetadataFilter(file_type="PDF").matches({"file_type": ".pdf"})
+
+    print("✅ test_metadata_prefilter_selects_before_search passed")
+
+
+def test_failed_batch_rolls_back_before_retry(tmp_path, monkeypatch):
+    """Testa que um lote que falha no meio não deixa vetores órfãos e só o arquivo com erro falha."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.faiss_index import IndexSettings
+
+    def chunks(name, *texts):
+        return [Document(page_content=t, metadata={"source": name}) for t in texts]
+
+    for index_type in ("flat", "hnsw"):
+        store = VectorStore(
+            embeddings=DeterministicFakeEmbedding(size=16),
+            index_path=str(tmp_path / index_type),
+            index_settings=IndexSettings(index_type=index_type),
+        )
+        with store.begin_ingestion() as session:
+            session.add_file("a.txt", chunks("a.txt", "a1", "a2"), {"sha256": "a1"})
+            session.add_file("b.txt", chunks("b.txt", "b1", "b2"), {"sha256": "b1"})
+
+        # A remoção dos chunks antigos de b.txt falha
+        b_ids = {doc_id for _, doc_id in store._file_manifest["b.txt"]["chunks"]}
+        delete_ids = VectorStore._delete_ids
+
+        def failing_delete(self, ids):
+            if b_ids & set(ids):
+                raise RuntimeError("falha ao remover")
+            delete_ids(self, ids)
+
+        monkeypatch.setattr(VectorStore, "_delete_ids", failing_delete)
+        with store.begin_ingestion(batch_size=100) as session:
+            session.add_file("a.txt", chunks("a.txt", "a1", "a3"), {"sha256": "a2"})
+            session.add_file("b.txt", chunks("b.txt", "b3"), {"sha256": "b2"})
+        monkeypatch.undo()
+
+        assert session.added_files == ["a.txt"] and list(session.failed_files) == ["b.txt"]
+        index = store._vectorstore.index
+        assert index.ntotal == len(store._vectorstore.index_to_docstore_id)
+        contents = sorted(doc.page_content for doc in store.search_documents("x", top_k=10))
+        assert contents == ["a1", "a3", "b1", "b2"]
+        assert store.is_file_unchanged("b.txt", {"sha256": "b1"})
+
+    print("✅ test_failed_batch_rolls_back_before_retry passed")
+
+
+def test_embedding_cache_counts_incrementally_and_defers_access(tmp_path):
+    """Testa que leituras do cache não escrevem no disco e o despejo LRU usa contadores em memória."""
+    from src.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    keys = [EmbeddingCache.make_key("fake", "m", f"texto {i}") for i in range(8)]
+    cache.put_many({key: [float(i)] * 4 for i, key in enumerate(keys)})
+    cache.put_many({keys[0]: [9.0] * 4})
+    assert cache.get_stats()["entries"] == 8 and cache._count() == (8, 8 * 16)
+
+    changes = cache._conn.total_changes
+    assert len(cache.get_many(keys[:2])) == 2
+    assert cache._conn.total_changes == changes
+
+    # Os acessos pendentes entram na ordem do LRU antes do despejo
+    more = [EmbeddingCache.make_key("fake", "m", f"novo {i}") for i in range(4)]
+    cache.put_many({key: [1.0] * 4 for key in more})
+    assert cache.get_stats()["entries"] == cache._count()[0] == 9
+    assert set(cache.get_many(keys[:2])) == set(keys[:2])
+
+    print("✅ test_embedding_cache_counts_incrementally_and_defers_access passed")
+
+
+def test_rejected_promotion_restores_mmap_and_backs_off(tmp_path, monkeypatch):
+    """Testa que uma promoção recusada devolve o índice mapeado e não é repetida a cada gravação."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src import vector_store as vector_store_module
+    from src.faiss_index import IndexSettings
+
+    def new_store(min_recall):
+        return VectorStore(
+            embeddings=DeterministicFakeEmbedding(size=16),
+            index_path=str(tmp_path / "ctx"),
+            index_settings=IndexSettings(mmap=True, promote_threshold=40, hnsw_m=8, min_recall=min_recall),
+        )
+
+    def chunks(name, count):
+        return [Document(page_content=f"{name} trecho {i}", metadata={"source": name}) for i in range(count)]
+
+    writer = new_store(0.9)
+    writer.add_documents(chunks("a.txt", 30))
+    writer.save()
+
+    measured = []
+    measure_recall = vector_store_module.measure_recall
+    monkeypatch.setattr(
+        vector_store_module, "measure_recall",
+        lambda *args, **kwargs: measured.append(1) or measure_recall(*args, **kwargs),
+    )
+
+    # Recall mínimo impossível: a promoção sempre é recusada
+    reader = new_store(1.01)
+    reader.load()
+    reader._index_settings.promote_threshold = 20
+    version = reader.index_version
+    assert reader.maybe_promote() is not None
+    assert reader.is_memory_mapped and reader.index_version == version and reader.index_type == "flat"
+
+    # Sem crescimento suficiente, as próximas gravações não tentam de novo
+    with reader.begin_ingestion() as session:
+        session.add_file("b.txt", chunks("b.txt", 2))
+    assert not reader.is_memory_mapped and len(measured) == 1
+    with reader.begin_ingestion() as session:
+        session.add_file("c.txt", chunks("c.txt", 10))
+    assert len(measured) == 2
+    assert reader.get_stats()["index_vectors"] == 42
+
+    print("✅ test_rejected_promotion_restores_mmap_and_backs_off passed")
+
+
+def test_save_switches_complete_generations(tmp_path, monkeypatch):
+    """Testa que cada save grava uma geração completa e só então troca o CURRENT."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src import vector_store as vector_store_module
+
+    def new_store():
+        return VectorStore(embeddings=DeterministicFakeEmbedding(size=16), index_path=str(tmp_path / "ctx"))
+
+    writer = new_store()
+    writer.add_documents([Document(page_content=f"art. {i}", metadata={"source": "a.txt"}) for i in range(3)])
+    writer.save()
+    first = VectorStore.index_dir(str(tmp_path / "ctx"))
+    assert first.name == "gen-000001" and (first / VectorStore.IDS_FILE).exists()
+
+    # Falha no meio do save: o CURRENT continua na geração anterior, completa
+    writer.add_documents([Document(page_content="art. 9", metadata={"source": "b.txt"})])
+
+    def failing_write(index, path):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(vector_store_module.faiss, "write_index", failing_write)
+    try:
+        writer.save()
+    except OSError:
+        pass
+    monkeypatch.undo()
+    assert VectorStore.index_dir(str(tmp_path / "ctx")) == first
+    reader = new_store()
+    reader.load()
+    assert reader.get_stats()["index_vectors"] == len(reader._vectorstore.index_to_docstore_id) == 3
+
+    for _ in range(3):
+        writer.save()
+    generations = sorted(p.name for p in (tmp_path / "ctx").iterdir() if p.name.startswith("gen-"))
+    assert generations == ["gen-000003", "gen-000004"]
+    reader.load()
+    assert reader.get_stats()["index_vectors"] == 4
+
+    print("✅ test_save_switches_complete_generations passed")
+
+
+def test_chunk_store_versioned_with_generation(tmp_path):
+    """Testa que leitores da geração anterior continuam achando os chunks após um save."""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.chunk_store import ChunkStore
+
+    def new_store(**kwargs):
+        return VectorStore(
+            embeddings=DeterministicFakeEmbedding(size=16), index_path=str(tmp_path / "ctx"), **kwargs
+        )
+
+    writer = new_store()
+    writer.add_documents([Document(page_content=f"art. {i}", metadata={"source": "a.txt"}) for i in range(3)])
+    writer.save()
+
+    reader = new_store()
+    reader.load()
+    first = VectorStore.index_dir(str(tmp_path / "ctx"))
+
+    # Remoção e recriação do índice não alteram o arquivo da geração carregada
+    writer.remove_file("a.txt")
+    writer.create_index([Document(page_content="novo", metadata={"source": "b.txt"})])
+    writer.save()
+    assert VectorStore.index_dir(str(tmp_path / "ctx")) != first
+    assert reader._vectorstore.docstore.path == str(first / ChunkStore.FILE_NAME)
+    assert reader.search_documents("art. 1", top_k=1)[0].page_content == "art. 1"
+    assert len(reader.search_documents("art", top_k=3)) == 3
+
+    reader.load()
+    assert [doc.page_content for doc in reader.search_documents("art", top_k=3)] == ["novo"]
+
+    # Sem busca híbrida o FTS5 não é criado
+    plain = new_store(hybrid_search=False)
+    plain.load()
+    plain.add_documents([Document(page_content="art. 5", metadata={"source": "c.txt"})])
+    plain.save()
+    saved = ChunkStore(VectorStore.index_dir(str(tmp_path / "ctx")) / ChunkStore.FILE_NAME, lexical=False)
+    assert not saved.has_lexical_index
+    saved.close()
+
+    print("✅ test_chunk_store_versioned_with_generation passed")
+
+
+def test_query_with_scores_labels_similarity_and_rrf(monkeypatch):
+    """Testa que query_with_scores expõe a similaridade do índice e o RRF com outro nome."""
+    import pytest
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake import FakeListLLM
+    from src.rag_chain import RAGChain
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"regra {i} da piscina", metadata={"source": "regras.txt"}) for i in range(3)]
+
+    store = VectorStore(embeddings=embeddings)
+    store.add_documents(docs)
+    chain = RAGChain(vector_store=store, top_k=2, score_threshold=None)
+    chain._llm = FakeListLLM(responses=["ok"])
+    result = chain.query_with_scores("regra 1 da piscina")
+    expected = store.similarity(store.search("regra 1 da piscina", 1)[0][1])
+    assert result["sources"][0]["relevance"] == pytest.approx(expected, abs=1e-3)
+    assert all(0.0 <= source["relevance"] <= 1.0 for source in result["sources"])
+
+    hybrid = VectorStore(embeddings=embeddings, hybrid_search=True)
+    hybrid.add_documents(docs)
+    chain = RAGChain(vector_store=hybrid, top_k=2, score_threshold=None)
+    chain._llm = FakeListLLM(responses=["ok"])
+    sources = chain.query_with_scores("regra 1 da piscina")["sources"]
+    assert all("rrf_score" in source and "relevance" not in source for source in sources)
+
+    print("✅ test_query_with_scores_labels_similarity_and_rrf passed")
+
+
 if __name__ == "__main__":
     test_document_loader_formats()
     test_chunker_creation()